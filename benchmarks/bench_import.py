@@ -0,0 +1,48 @@
+"""Import time benchmark.
+
+Times ``import geosutils.files`` (and :mod:`geosutils.log` on its own)
+in fresh interpreters.  The package is byte-compiled and the standard
+library modules that it depends on are imported before the timer
+starts so that only the geosutils module code is measured::
+
+    $ PYTHONPATH=. python benchmarks/bench_import.py [runs]
+
+"""
+import os
+import sys
+import compileall
+import subprocess
+
+PRELOAD = ('import os, re, sys, stat, string, shutil, hashlib, tempfile, '
+           'fcntl, heapq, time, threading, Queue, logging')
+
+TIMER = ('%s; import time; start = time.time(); import %%s; '
+         'elapsed = time.time() - start; '
+         'assert "logging.config" not in sys.modules; '
+         'print repr(elapsed)' % PRELOAD)
+
+
+def time_import(module, runs):
+    timings = []
+    for _ in xrange(runs):
+        output = subprocess.check_output([sys.executable,
+                                          '-c',
+                                          TIMER % module])
+        timings.append(float(output))
+
+    return min(timings)
+
+
+def main(runs=10):
+    package = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           os.pardir,
+                           'geosutils')
+    compileall.compile_dir(package, quiet=True)
+
+    for module in ('geosutils.log', 'geosutils.files'):
+        elapsed = time_import(module, runs)
+        print 'import %-16s %8.1fus' % (module + ':', elapsed * 1e6)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,47 @@
+"""Cost of disabled log statements.
+
+Times log calls that are filtered by the log level with eager ``%``
+formatting, with deferred (args style) formatting, with a
+:func:`geosutils.log.lazy` argument and behind an explicit level
+check::
+
+    $ PYTHONPATH=. python benchmarks/bench_logging.py [calls]
+
+"""
+import sys
+import json
+import timeit
+import logging
+
+from geosutils.log import log, lazy
+from geosutils.utils import hashcode
+
+SETUP = '''
+from __main__ import log, lazy, json, logging, hashcode
+source = 'b4c937e3ca5c78d1f7a3fc47dc727e78'
+code = 1182110976
+big = dict(('key%d' % i, i) for i in range(100))
+'''
+
+STATEMENTS = [
+    ('eager %', "log.debug('Hash code for source %s: %d' % (source, code))"),
+    ('args', "log.debug('Hash code for source %s: %d', source, code)"),
+    ('lazy', "log.debug('Dump: %s', lazy(json.dumps, big))"),
+    ('eager dump', "log.debug('Dump: %s' % json.dumps(big))"),
+    ('guarded', "if log.isEnabledFor(logging.DEBUG): "
+                "log.debug('Dump: %s', json.dumps(big))"),
+    ('hashcode()', "hashcode(source)"),
+]
+
+
+def main(calls=100000):
+    log.setLevel(logging.INFO)
+
+    print 'DEBUG disabled, %d calls' % calls
+    for name, statement in STATEMENTS:
+        elapsed = min(timeit.repeat(statement, SETUP, number=calls, repeat=3))
+        print '%-12s %8.3fus/call' % (name + ':', elapsed / calls * 1e6)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,47 @@
+"""Row key construction benchmark.
+
+Compares per-record :meth:`geosutils.rowkey.RowKeyBuilder.build` calls
+against the batch :meth:`geosutils.rowkey.RowKeyBuilder.build_many`::
+
+    $ PYTHONPATH=. python benchmarks/bench_rowkey.py [records]
+
+"""
+import sys
+import time
+import random
+
+from geosutils.rowkey import RowKeyBuilder
+
+
+def main(records=100000):
+    random.seed(0)
+    latitudes = [random.uniform(-90, 90) for _ in xrange(records)]
+    longitudes = [random.uniform(-180, 180) for _ in xrange(records)]
+    utc_times = ['%04d%02d%02d%02d%02d%02d' %
+                 (random.randint(1990, 2030),
+                  random.randint(1, 12),
+                  random.randint(1, 28),
+                  random.randint(0, 23),
+                  random.randint(0, 59),
+                  random.randint(0, 59)) for _ in xrange(records)]
+    stripe_keys = ['item-%d' % i for i in xrange(records)]
+
+    builder = RowKeyBuilder('geohash,reverse_time,stripe', stripes=10)
+
+    start = time.time()
+    build = builder.build
+    for args in zip(latitudes, longitudes, utc_times, stripe_keys):
+        build(*args)
+    single = time.time() - start
+
+    start = time.time()
+    builder.build_many(latitudes, longitudes, utc_times, stripe_keys)
+    batch = time.time() - start
+
+    print '%d records' % records
+    print 'build:      %8.3fs (%10.0f keys/s)' % (single, records / single)
+    print 'build_many: %8.3fs (%10.0f keys/s)' % (batch, records / batch)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -3,14 +3,72 @@
 GeoUtils configuration items.
 
 """
-__all__ = ["Config"]
+__all__ = [
+    "Config",
+    "ConfigWatcher",
+    "ConfigOption",
+    "ConfigSection",
+    "ConfigSchema",
+    "MissingConfigError",
+]
 
 import sys
 import __builtin__
 import os
+import re
+import glob
+import Queue
+import marshal
+import hashlib
+import tempfile
+import threading
+import StringIO
 import ConfigParser
+import collections
+
+try:
+    import pyinotify
+except ImportError:
+    pyinotify = None
 
 from geosutils.log import log
+from geosutils.frozen import FrozenConfig
+
+SNAPSHOT_VERSION = 1
+
+# Marker for typed accessors called without a default.
+_NO_DEFAULT = object()
+
+# Marker for a lazily indexed section that has not been parsed yet.
+_UNPARSED = object()
+
+# Section header at the start of a line, as per ConfigParser.SECTCRE.
+SECTION_HEADER_RE = re.compile(r'^\[(?P<header>[^]]+)\]', re.M)
+
+DURATION_UNITS = {
+    'ms': 0.001,
+    's': 1,
+    'm': 60,
+    'h': 3600,
+    'd': 86400,
+    'w': 604800,
+}
+
+BYTE_UNITS = {
+    'b': 1,
+    'k': 1024,
+    'kb': 1024,
+    'kib': 1024,
+    'm': 1024 ** 2,
+    'mb': 1024 ** 2,
+    'mib': 1024 ** 2,
+    'g': 1024 ** 3,
+    'gb': 1024 ** 3,
+    'gib': 1024 ** 3,
+    't': 1024 ** 4,
+    'tb': 1024 ** 4,
+    'tib': 1024 ** 4,
+}
 
 
 class Config(ConfigParser.SafeConfigParser):
@@ -20,6 +78,21 @@ class Config(ConfigParser.SafeConfigParser):
 
         path to the configuration file to parse
 
+    .. attribute:: *cache_dir*
+
+        directory that holds compiled snapshots of parsed configuration
+        files.  If set, :meth:`parse_config` loads the snapshot for
+        :attr:`config_file` (rather than parsing it) while the file's
+        path, modification time and size are unchanged
+
+    .. attribute:: *lazy*
+
+        if ``True``, :meth:`parse_config` only indexes the byte offsets
+        of the section headers in :attr:`config_file`.  Each section's
+        options are parsed when the section is first accessed.
+        :meth:`sections` and :meth:`has_section` are served from the
+        index.  Takes precedence over :attr:`cache_dir`
+
     .. note::
 
         The :class:`Config` class inherits from the old-style
@@ -29,12 +102,36 @@ class Config(ConfigParser.SafeConfigParser):
     """
     _config_file = None
     _facility = None
+    _cache_dir = None
+    _lazy = False
+    _from_snapshot = False
+
+    # Fully interpolated section options.  Only populated when
+    # compiling/loading a snapshot.  Reset by any change to the parser.
+    _compiled = None
+
+    # Interpolated and typed values memoized by (section, option, type).
+    _memo = None
+
+    # snapshot_key() of the config_file contents currently loaded.
+    _loaded_key = None
+
+    # (sources, env_prefix) of a layered configuration.
+    _layers = None
 
-    def __init__(self, config_file=None):
+    def __init__(self, config_file=None, cache_dir=None, lazy=False):
         """:class:`geosutils.Config` initialisation.
         """
         self._config_file = config_file
         self._facility = self.__class__.__name__
+        self._cache_dir = cache_dir
+        self._lazy = lazy
+        self._reload_callbacks = []
+        self._reload_lock = threading.Lock()
+
+        # Guards reads of the parser state against a concurrent reload.
+        self._state_lock = threading.RLock()
+        self._memo = {}
 
         ConfigParser.SafeConfigParser.__init__(self)
 
@@ -49,28 +146,594 @@ class Config(ConfigParser.SafeConfigParser):
     def facility(self):
         return self._facility
 
+    @property
+    def cache_dir(self):
+        return self._cache_dir
+
+    def set_cache_dir(self, value):
+        self._cache_dir = value
+
+    @property
+    def lazy(self):
+        return self._lazy
+
+    @property
+    def from_snapshot(self):
+        """Boolean ``True`` if the last :meth:`parse_config` was served
+        from a compiled snapshot.
+
+        """
+        return self._from_snapshot
+
     def parse_config(self):
         """Attempt to read the contents of the :attr:`geosutils.Config`
         (unless ``None``).
 
         File contents should be as per :mod:`ConfigParser` format.
 
+        If :attr:`cache_dir` is set, a valid compiled snapshot of
+        :attr:`config_file` is loaded in place of parsing.  Otherwise,
+        the file is parsed and a new snapshot written.
+
         **Returns:**
             Boolean ``True`` upon success.  Boolean ``False`` otherwise.
 
         """
-        log.debug('Parsing config file: "%s"' % self.config_file)
+        log.debug('Parsing config file: "%s"', self.config_file)
         config_parse_status = False
+        self._from_snapshot = False
 
         if (self.config_file is None or
            not os.path.exists(self.config_file)):
-            log.error('Invalid config file: "%s"' % self.config_file)
+            log.error('Invalid config file: "%s"', self.config_file)
         else:
-            self.read(self.config_file)
+            key = self.snapshot_key()
+            if self.lazy:
+                self.read_lazy(self.config_file)
+            elif self.cache_dir is None:
+                self.read(self.config_file)
+            elif not self.load_snapshot():
+                self.read(self.config_file)
+                self.write_snapshot()
+            self._loaded_key = key
             config_parse_status = True
 
         return config_parse_status
 
+    def add_reload_callback(self, callback):
+        """Register *callback* to be invoked after :meth:`reload` swaps
+        in a changed configuration.
+
+        *callback* is called as ``callback(config, diff)`` where *diff*
+        is as per the :meth:`reload` return value.  For example, to
+        retune a worker pool under load::
+
+            def retune(config, diff):
+                if ('ingest', 'threads') in diff:
+                    config.parse_scalar_config('ingest',
+                                               'threads',
+                                               cast_type='int')
+
+            config.add_reload_callback(retune)
+
+        """
+        self._reload_callbacks.append(callback)
+
+    def remove_reload_callback(self, callback):
+        self._reload_callbacks.remove(callback)
+
+    def reload(self):
+        """Re-parse :attr:`config_file` if it has changed since it was
+        last loaded.
+
+        The new file is parsed aside, so a failed parse leaves the
+        configuration untouched.  It is then swapped in under the lock
+        that guards :meth:`get`, :meth:`items`, :meth:`sections` and
+        friends, so concurrent readers see either the old or the new
+        configuration.  Registered reload callbacks are then called
+        with the differences.
+
+        **Returns:**
+            ``None`` if the file is unchanged (or cannot be read).
+            Otherwise, a dictionary of the changed options of the form::
+
+                {(<section>, <option>): (<old raw value>, <new raw value>)}
+
+            where the old value is ``None`` for added options and the
+            new value ``None`` for removed options
+
+        """
+        with self._reload_lock:
+            key = self.snapshot_key()
+            if key is None or key == self._loaded_key:
+                return None
+
+            log.info('Reloading changed config file: "%s"', self.config_file)
+            fresh = ConfigParser.SafeConfigParser(dict_type=self._dict)
+            fresh.optionxform = self.optionxform
+            try:
+                if self._layers is not None:
+                    sources, env_prefix, workers = self._layers
+                    _read_layers(fresh,
+                                 _resolve_layers(sources),
+                                 env_prefix,
+                                 workers)
+                elif not fresh.read(self.config_file):
+                    return None
+            except ConfigParser.Error, err:
+                log.error('Config reload of "%s" failed: %s',
+                          self.config_file, err)
+                return None
+
+            diff = _diff_options(self._flatten(), _flatten(fresh))
+
+            compiled = None
+            if self.cache_dir is not None or self._layers is not None:
+                compiled = {}
+                for section in fresh.sections():
+                    try:
+                        compiled[section] = self._dict(fresh.items(section))
+                    except ConfigParser.Error:
+                        pass
+
+            with self._state_lock:
+                self._defaults = fresh._defaults
+                self._sections = fresh._sections
+                self._compiled = compiled
+                self._memo = {}
+            self._loaded_key = key
+
+        if diff:
+            log.info('Config file "%s" reload changed %d options',
+                     self.config_file, len(diff))
+            for callback in list(self._reload_callbacks):
+                try:
+                    callback(self, diff)
+                except Exception, err:
+                    log.error('Config reload callback %s failed: %s',
+                              callback, err)
+
+        return diff
+
+    def _flatten(self):
+        return _flatten(self)
+
+    def read_lazy(self, filename):
+        """Index the sections of *filename* for on-demand parsing.
+
+        The file is read once and scanned for section headers.  Its
+        contents are kept (unparsed) so that sections are parsed from
+        the file as it was when indexed, even if it is rewritten in the
+        meantime.  The ``[DEFAULT]`` section is parsed straight away as
+        it applies to every other section.
+
+        """
+        self._invalidate()
+
+        file_h = open(filename, 'rb')
+        try:
+            content = file_h.read()
+        finally:
+            file_h.close()
+        if not content:
+            return
+
+        spans = collections.OrderedDict()
+        headers = [(m.start(), m.group('header'))
+                   for m in SECTION_HEADER_RE.finditer(content)]
+        for index, (start, name) in enumerate(headers):
+            end = len(content)
+            if index + 1 < len(headers):
+                end = headers[index + 1][0]
+            spans.setdefault(name, []).append((start, end))
+
+        defaults = spans.pop(ConfigParser.DEFAULTSECT, None)
+        if defaults is not None:
+            text = ''.join(content[a:b] for a, b in defaults)
+            self._read(StringIO.StringIO(text), filename)
+
+        loader = _SectionLoader(content,
+                                spans,
+                                filename,
+                                self._dict,
+                                self.optionxform)
+        sections = _LazySections(loader)
+        for name in spans:
+            sections[name] = _UNPARSED
+        self._sections = sections
+        log.debug('Indexed %d sections in config file: "%s"',
+                  len(spans), filename)
+
+    def parse_layers(self, sources, env_prefix=None, workers=8):
+        """Build the configuration from multiple layered *sources*.
+
+        Each source is a configuration file, a directory (all of its
+        ``*.conf`` files, in name order) or a :mod:`glob` pattern.
+        Sources are listed lowest precedence first, so options in later
+        sources override the same options in earlier ones.  For
+        example::
+
+            >>> config.parse_layers(['/etc/geoingest/base.conf',
+            ...                      '/etc/geoingest/%s.conf' % host,
+            ...                      '/etc/geoingest/conf.d'],
+            ...                     env_prefix='GEOINGEST')
+
+        File contents are read concurrently across up to *workers*
+        threads and then merged in order.  Finally, environment
+        variables of the form ``<env_prefix>__<SECTION>__<OPTION>``
+        override everything else.  Section names are matched without
+        regard to case.
+
+        The merged result is compiled into a single flattened lookup
+        table.  If :attr:`cache_dir` is set, the compiled result is
+        cached as per :meth:`parse_config` and is valid while none of
+        the resolved files (or the environment overrides) change.
+
+        **Returns:**
+            Boolean ``True`` upon success.  Boolean ``False`` if none of
+            the *sources* resolve to a readable file
+
+        """
+        self._layers = (list(sources), env_prefix, workers)
+        self._from_snapshot = False
+
+        files = _resolve_layers(sources)
+        if not files:
+            log.error('No config files found in layers: %s', sources)
+            return False
+
+        key = self.snapshot_key()
+        if self.cache_dir is None or not self.load_snapshot():
+            self._invalidate()
+            _read_layers(self, files, env_prefix, workers)
+            if self.cache_dir is None:
+                self.compile()
+            else:
+                self.write_snapshot()
+        self._loaded_key = key
+
+        return True
+
+    def snapshot_key(self):
+        """Identify the current version of :attr:`config_file` (or of
+        all of the files and environment overrides of a layered
+        configuration).
+
+        **Returns:**
+            tuple of (absolute path, modification time, size) or ``None``
+            if the file cannot be accessed (or there is no
+            :attr:`config_file`)
+
+        """
+        if self._layers is not None:
+            sources, env_prefix, _ = self._layers
+            keys = [_file_key(f) for f in _resolve_layers(sources)]
+            if None in keys:
+                return None
+            return (tuple(keys), tuple(_env_overrides(env_prefix)))
+
+        if self.config_file is None:
+            return None
+
+        return _file_key(self.config_file)
+
+    def snapshot_file(self):
+        """Location of the compiled snapshot for :attr:`config_file`
+        within :attr:`cache_dir`.
+
+        """
+        if self._layers is not None:
+            sources, env_prefix, _ = self._layers
+            identity = repr(([os.path.abspath(s) for s in sources],
+                             env_prefix))
+        else:
+            identity = os.path.abspath(self.config_file)
+        digest = hashlib.md5(identity).hexdigest()
+
+        return os.path.join(self.cache_dir, '%s.snapshot' % digest)
+
+    def load_snapshot(self):
+        """Load the compiled snapshot of :attr:`config_file`.
+
+        **Returns:**
+            Boolean ``True`` if a snapshot matching the current
+            :meth:`snapshot_key` was loaded.  Boolean ``False`` otherwise
+
+        """
+        snapshot = None
+        try:
+            file_h = open(self.snapshot_file(), 'rb')
+            try:
+                snapshot = marshal.load(file_h)
+            finally:
+                file_h.close()
+        except (IOError, EOFError, ValueError, TypeError):
+            pass
+
+        if (not isinstance(snapshot, dict) or
+           snapshot.get('version') != SNAPSHOT_VERSION or
+           snapshot.get('key') != self.snapshot_key()):
+            log.debug('No valid snapshot for config file: "%s"',
+                      self.config_file)
+            return False
+
+        self._defaults = self._dict(snapshot['defaults'])
+        self._sections = self._dict()
+        for section, options in snapshot['sections']:
+            self._sections[section] = self._dict(options)
+        compiled = {}
+        for section, options in snapshot['compiled']:
+            compiled[section] = self._dict(options)
+        self._compiled = compiled
+        self._memo = {}
+        self._from_snapshot = True
+        log.debug('Loaded snapshot for config file: "%s"', self.config_file)
+
+        return True
+
+    def write_snapshot(self):
+        """Compile the parsed configuration and write it atomically as
+        the snapshot of :attr:`config_file`.
+
+        Sections that cannot be fully interpolated are not compiled and
+        continue to be resolved by the parser at lookup time.
+
+        **Returns:**
+            Boolean ``True`` if the snapshot was written.  Boolean
+            ``False`` otherwise
+
+        """
+        key = self.snapshot_key()
+        if key is None:
+            return False
+
+        self.compile()
+        snapshot = {
+            'version': SNAPSHOT_VERSION,
+            'key': key,
+            'defaults': self._defaults.items(),
+            'sections': [(k, v.items()) for k, v in self._sections.items()],
+            'compiled': [(k, v.items()) for k, v in self._compiled.items()],
+        }
+
+        status = False
+        tmp_name = None
+        try:
+            if not os.path.isdir(self.cache_dir):
+                os.makedirs(self.cache_dir)
+            tmp_fh = tempfile.NamedTemporaryFile(dir=self.cache_dir,
+                                                 delete=False)
+            tmp_name = tmp_fh.name
+            tmp_fh.write(marshal.dumps(snapshot))
+            tmp_fh.close()
+            os.rename(tmp_name, self.snapshot_file())
+            status = True
+        except (IOError, OSError, ValueError), err:
+            log.warn('Config snapshot write to "%s" failed: %s',
+                     self.cache_dir, err)
+            if tmp_name is not None and os.path.exists(tmp_name):
+                os.remove(tmp_name)
+
+        return status
+
+    def compile(self):
+        """Pre-interpolate every option in every section so that
+        :meth:`get` and :meth:`items` are plain dictionary lookups.
+
+        """
+        compiled = {}
+        for section in self._sections:
+            try:
+                compiled[section] = self._dict(
+                    ConfigParser.SafeConfigParser.items(self, section))
+            except ConfigParser.Error, err:
+                log.debug('Config section "%s" not compiled: %s', section, err)
+        self._compiled = compiled
+        self._memo = {}
+
+    def get(self, section, option, raw=False, vars=None):
+        """Override :meth:`ConfigParser.SafeConfigParser.get` to serve
+        memoized or compiled values where available.
+
+        """
+        if raw or vars:
+            with self._state_lock:
+                return ConfigParser.SafeConfigParser.get(self,
+                                                         section,
+                                                         option,
+                                                         raw,
+                                                         vars)
+
+        # Each reload replaces the memo, so a hit is never a mix of old
+        # and new values and needs no lock.
+        memo = self._memo
+        key = (section, option, None)
+        try:
+            return memo[key]
+        except KeyError:
+            pass
+
+        with self._state_lock:
+            value = self
+            if self._compiled is not None:
+                options = self._compiled.get(section)
+                if options is not None:
+                    value = options.get(self.optionxform(option), self)
+
+            if value is self:
+                value = ConfigParser.SafeConfigParser.get(self,
+                                                          section,
+                                                          option)
+        memo[key] = value
+
+        return value
+
+    def get_int(self, section, option, default=_NO_DEFAULT):
+        """Memoized *section*.*option* value as an ``int``.
+
+        Like all of the typed accessors, the converted value is cached
+        until the configuration changes (via :meth:`set`,
+        :meth:`reload`, etc).  If the option is missing, *default* is
+        returned if given.  Otherwise, the
+        :class:`ConfigParser.NoSectionError` or
+        :class:`ConfigParser.NoOptionError` is raised.
+
+        """
+        return self._get_typed(section, option, 'int', int, default)
+
+    def get_float(self, section, option, default=_NO_DEFAULT):
+        """Memoized *section*.*option* value as a ``float``.
+        """
+        return self._get_typed(section, option, 'float', float, default)
+
+    def get_bool(self, section, option, default=_NO_DEFAULT):
+        """Memoized *section*.*option* value as a ``bool`` as per
+        :meth:`ConfigParser.RawConfigParser.getboolean`.
+
+        """
+        return self._get_typed(section, option, 'bool', _to_bool, default)
+
+    def get_list(self, section, option, default=_NO_DEFAULT):
+        """Memoized *section*.*option* value split on commas.  A new
+        list is returned on each call.
+
+        """
+        value = self._get_typed(section,
+                                option,
+                                'list',
+                                lambda x: tuple(x.split(',')),
+                                default)
+        if isinstance(value, tuple):
+            value = list(value)
+
+        return value
+
+    def get_duration(self, section, option, default=_NO_DEFAULT):
+        """Memoized *section*.*option* duration in seconds as a
+        ``float``.  Values are a number with an optional unit of ``ms``,
+        ``s`` (the default), ``m``, ``h``, ``d`` or ``w``.  For example,
+        ``500ms`` or ``1.5h``.
+
+        """
+        return self._get_typed(section,
+                               option,
+                               'duration',
+                               _to_duration,
+                               default)
+
+    def get_bytes(self, section, option, default=_NO_DEFAULT):
+        """Memoized *section*.*option* size in bytes as an ``int``.
+        Values are a number with an optional binary unit of ``B``,
+        ``K``/``KB``/``KiB``, ``M``, ``G`` or ``T``.  For example,
+        ``512`` or ``1.5GB``.
+
+        """
+        return self._get_typed(section,
+                               option,
+                               'bytes',
+                               _to_bytes,
+                               default)
+
+    def _get_typed(self, section, option, kind, converter, default):
+        memo = self._memo
+        key = (section, option, kind)
+        try:
+            return memo[key]
+        except KeyError:
+            pass
+
+        try:
+            value = converter(self.get(section, option))
+        except (ConfigParser.NoSectionError, ConfigParser.NoOptionError):
+            if default is _NO_DEFAULT:
+                raise
+            return default
+        memo[key] = value
+
+        return value
+
+    def freeze(self):
+        """Freeze the current, fully interpolated configuration.
+
+        **Returns:**
+            an immutable :class:`geosutils.frozen.FrozenConfig`
+
+        """
+        return FrozenConfig.from_config(self)
+
+    def _invalidate(self):
+        """Drop the compiled and memoized values after a change.
+        """
+        self._compiled = None
+        self._memo = {}
+
+    def items(self, section, raw=False, vars=None):
+        """Override :meth:`ConfigParser.SafeConfigParser.items` to serve
+        compiled values where available.
+
+        """
+        with self._state_lock:
+            if self._compiled is not None and not raw and not vars:
+                options = self._compiled.get(section)
+                if options is not None:
+                    return options.items()
+
+            return ConfigParser.SafeConfigParser.items(self,
+                                                       section,
+                                                       raw,
+                                                       vars)
+
+    def defaults(self):
+        with self._state_lock:
+            return ConfigParser.SafeConfigParser.defaults(self)
+
+    def sections(self):
+        with self._state_lock:
+            return ConfigParser.SafeConfigParser.sections(self)
+
+    def has_section(self, section):
+        with self._state_lock:
+            return ConfigParser.SafeConfigParser.has_section(self, section)
+
+    def options(self, section):
+        with self._state_lock:
+            return ConfigParser.SafeConfigParser.options(self, section)
+
+    def has_option(self, section, option):
+        with self._state_lock:
+            return ConfigParser.SafeConfigParser.has_option(self,
+                                                            section,
+                                                            option)
+
+    def read(self, filenames):
+        self._invalidate()
+
+        return ConfigParser.SafeConfigParser.read(self, filenames)
+
+    def readfp(self, fp, filename=None):
+        self._invalidate()
+        ConfigParser.SafeConfigParser.readfp(self, fp, filename)
+
+    def add_section(self, section):
+        self._invalidate()
+        ConfigParser.SafeConfigParser.add_section(self, section)
+
+    def set(self, section, option, value=None):
+        self._invalidate()
+        ConfigParser.SafeConfigParser.set(self, section, option, value)
+
+    def remove_option(self, section, option):
+        self._invalidate()
+
+        return ConfigParser.SafeConfigParser.remove_option(self,
+                                                           section,
+                                                           option)
+
+    def remove_section(self, section):
+        self._invalidate()
+
+        return ConfigParser.SafeConfigParser.remove_section(self, section)
+
     def parse_scalar_config(self,
                             section,
                             option,
@@ -126,7 +789,7 @@ class Config(ConfigParser.SafeConfigParser):
         except (ConfigParser.NoOptionError,
                 ConfigParser.NoSectionError), err:
             if is_required:
-                log.critical('Missing required config: %s' % err)
+                log.critical('Missing required config: %s', err)
                 sys.exit(1)
 
             try:
@@ -134,12 +797,12 @@ class Config(ConfigParser.SafeConfigParser):
                 msg = ('%s %s.%s not defined. Using' %
                        (self.facility, section, option))
                 if isinstance(getter, (int, long, float, complex)):
-                    log.debug('%s %d' % (msg, getter))
+                    log.debug('%s %d', msg, getter)
                 else:
-                    log.debug('%s "%s"' % (msg, getter))
+                    log.debug('%s "%s"', msg, getter)
             except AttributeError, err:
-                log.debug('%s %s.%s not defined: %s.' %
-                          (self.facility, section, option, err))
+                log.debug('%s %s.%s not defined: %s.',
+                          self.facility, section, option, err)
 
         return value
 
@@ -228,7 +891,7 @@ class Config(ConfigParser.SafeConfigParser):
         except (ConfigParser.NoOptionError,
                 ConfigParser.NoSectionError), err:
             if is_required:
-                log.critical('Missing required config: %s' % err)
+                log.critical('Missing required config: %s', err)
                 sys.exit(1)
 
             try:
@@ -236,11 +899,547 @@ class Config(ConfigParser.SafeConfigParser):
                 msg = ('%s %s not defined.  Using' %
                        (self.facility, section))
                 if isinstance(getter, (int, long, float, complex)):
-                    log.debug('%s %d' % (msg, getter))
+                    log.debug('%s %d', msg, getter)
                 else:
-                    log.debug('%s "%s"' % (msg, getter))
+                    log.debug('%s "%s"', msg, getter)
             except AttributeError, err:
-                log.debug('%s %s not defined: %s.' %
-                          (self.facility, section, err))
+                log.debug('%s %s not defined: %s.',
+                          self.facility, section, err)
+
+        return value
+
+    def parse_schema(self, schema=None, apply=True):
+        """Parse every option declared in *schema* in a single pass.
+
+        Missing options that are not required take their declared
+        default.  Missing required options are collected and reported
+        together.
+
+        **Kwargs:**
+            *schema*: the :class:`ConfigSchema` to parse against.
+            Defaults to the class level ``schema`` attribute
+
+            *apply*: set each parsed value via the ``set_<var>`` setter
+            of the same name (as per :meth:`parse_scalar_config`)
+
+        **Returns:**
+            dictionary of the typed values keyed by target attribute
+            name
+
+        **Raises:**
+            :class:`MissingConfigError` listing every missing required
+            option
+
+        """
+        if schema is None:
+            schema = getattr(self, 'schema', None)
+        if schema is None:
+            raise ValueError('%s has no config schema' % self.facility)
+
+        values, missing = schema.parse(self)
+        if missing:
+            raise MissingConfigError(missing)
+
+        if apply:
+            for var, value in values.iteritems():
+                setter = getattr(self, 'set_%s' % var, None)
+                if setter is not None:
+                    setter(value)
+
+        return values
+
+
+class MissingConfigError(ConfigParser.Error):
+    """Raised when one or more required options are missing.
+
+    .. attribute:: *missing*
+
+        list of (*section*, *option*) tuples that are missing.  *option*
+        is ``None`` for a missing required section
+
+    """
+    def __init__(self, missing):
+        self.missing = missing
+        names = ['%s.%s' % m if m[1] is not None else m[0]
+                 for m in missing]
+        ConfigParser.Error.__init__(self,
+                                    'Missing required config: %s' %
+                                    ', '.join(names))
+
+
+class ConfigOption(object):
+    """Declaration of a scalar option for a :class:`ConfigSchema`.
+
+    Arguments are as per :meth:`Config.parse_scalar_config`, plus
+    *default*, which is the value used if the option is missing.
+
+    """
+    __slots__ = ['section', 'option', 'var', 'cast', 'default',
+                 'is_list', 'is_required']
+
+    def __init__(self,
+                 section,
+                 option,
+                 var=None,
+                 cast_type=None,
+                 default=None,
+                 is_list=False,
+                 is_required=False):
+        """:class:`ConfigOption` initialisation.
+        """
+        self.section = section
+        self.option = option
+        self.var = var if var is not None else option
+        self.cast = _caster(cast_type)
+        self.default = default
+        self.is_list = is_list
+        self.is_required = is_required
+
+    def convert(self, value):
+        if self.is_list:
+            value = value.split(',')
+            if self.cast is not None:
+                value = [self.cast(x) for x in value]
+        elif self.cast is not None:
+            value = self.cast(value)
+
+        return value
+
+
+class ConfigSection(object):
+    """Declaration of a whole section parsed as a dictionary for a
+    :class:`ConfigSchema`.
+
+    Arguments are as per :meth:`Config.parse_dict_config`, plus
+    *default*, which is the value used if the section is missing.
+
+    """
+    __slots__ = ['section', 'var', 'cast', 'key_cast', 'key_case',
+                 'default', 'is_list', 'is_required']
+
+    def __init__(self,
+                 section,
+                 var=None,
+                 cast_type=None,
+                 key_cast_type=None,
+                 key_case=None,
+                 default=None,
+                 is_list=False,
+                 is_required=False):
+        """:class:`ConfigSection` initialisation.
+        """
+        self.section = section
+        self.var = var if var is not None else section
+        self.cast = _caster(cast_type)
+        self.key_cast = _caster(key_cast_type)
+        self.key_case = key_case
+        self.default = default
+        self.is_list = is_list
+        self.is_required = is_required
+
+    def convert(self, items):
+        value = {}
+        for k, v in items:
+            if self.key_cast is not None:
+                k = self.key_cast(k)
+            if self.key_case == 'upper':
+                k = k.upper()
+            elif self.key_case == 'lower':
+                k = k.lower()
+
+            if self.is_list:
+                v = v.split(',')
+                if self.cast is not None:
+                    v = [self.cast(x) for x in v]
+            elif self.cast is not None:
+                v = self.cast(v)
+            value[k] = v
+
+        return value
+
+
+class ConfigSchema(object):
+    """Declarative set of :class:`ConfigOption` and
+    :class:`ConfigSection` items that a :class:`Config` can parse in
+    a single pass via :meth:`Config.parse_schema`.
+
+    Type casts are resolved once, when the schema is declared.  For
+    example::
+
+        class IngestConfig(Config):
+            schema = ConfigSchema([
+                ConfigOption('ingest', 'threads', cast_type='int',
+                             default=10),
+                ConfigOption('ingest', 'thread_sleep', cast_type='float',
+                             default=0.5),
+                ConfigOption('spatial', 'order', is_list=True,
+                             is_required=True),
+                ConfigSection('hdfs_namenode', is_required=True),
+            ])
+
+    """
+    def __init__(self, items=None):
+        """:class:`ConfigSchema` initialisation.
+        """
+        self._items = []
+        for item in items or []:
+            self.add(item)
+
+    @property
+    def items(self):
+        return list(self._items)
+
+    def add(self, item):
+        self._items.append(item)
+
+    def parse(self, config):
+        """Parse *config* against the schema.
+
+        **Returns:**
+            tuple of the dictionary of values keyed by target attribute
+            name and the list of missing required (*section*, *option*)
+            tuples
+
+        """
+        values = {}
+        missing = []
+        sections = {}
+
+        for item in self._items:
+            # Presence is checked against the raw options so that an
+            # undeclared option that cannot be interpolated is ignored.
+            section = item.section
+            if section not in sections:
+                sections[section] = (dict(config.items(section, raw=True))
+                                     if config.has_section(section)
+                                     else None)
+            options = sections[section]
+
+            if isinstance(item, ConfigSection):
+                if options is None:
+                    if item.is_required:
+                        missing.append((section, None))
+                    elif item.default is not None:
+                        values[item.var] = item.default
+                else:
+                    values[item.var] = item.convert(config.items(section))
+                continue
+
+            key = config.optionxform(item.option)
+            if options is None or key not in options:
+                if item.is_required:
+                    missing.append((section, item.option))
+                elif item.default is not None:
+                    values[item.var] = item.default
+            else:
+                values[item.var] = item.convert(config.get(section,
+                                                           item.option))
+
+        return values, missing
+
+
+def _caster(cast_type):
+    """Resolve the builtin type named *cast_type* (or ``None``).
+    """
+    caster = None
+    if cast_type is not None:
+        caster = getattr(__builtin__, cast_type)
+
+    return caster
+
+
+class ConfigWatcher(threading.Thread):
+    """Background thread that calls :meth:`Config.reload` when the
+    :attr:`Config.config_file` changes on disk.
+
+    Uses inotify (via the optional :mod:`pyinotify` package) to wait for
+    changes to the directory holding the config file, which also catches
+    editors that replace the file via rename.  Falls back to polling the
+    file's modification time every *interval* seconds if :mod:`pyinotify`
+    is unavailable.
+
+    Typical usage::
+
+        >>> from geosutils.config import ConfigWatcher
+        >>> watcher = ConfigWatcher(config)
+        >>> watcher.start()
+        ...
+        >>> watcher.stop()
+
+    """
+    def __init__(self, config, interval=1.0, use_inotify=True):
+        """:class:`ConfigWatcher` initialisation.
+        """
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self._config = config
+        self._interval = interval
+        self._use_inotify = use_inotify and pyinotify is not None
+        self._stop_event = threading.Event()
+
+    @property
+    def config(self):
+        return self._config
+
+    @property
+    def interval(self):
+        return self._interval
+
+    @property
+    def use_inotify(self):
+        return self._use_inotify
+
+    def stop(self):
+        """Signal the watcher to stop and wait for it to finish.
+        """
+        self._stop_event.set()
+        if self.is_alive():
+            self.join()
+
+    def run(self):
+        if self.use_inotify:
+            self._run_inotify()
+        else:
+            self._run_polling()
+
+    def _run_polling(self):
+        while not self._stop_event.is_set():
+            self._reload()
+            self._stop_event.wait(self.interval)
+
+    def _run_inotify(self):
+        watch_manager = pyinotify.WatchManager()
+        notifier = pyinotify.Notifier(watch_manager)
+        mask = (pyinotify.IN_CLOSE_WRITE |
+                pyinotify.IN_MOVED_TO |
+                pyinotify.IN_CREATE |
+                pyinotify.IN_ATTRIB)
+        directory = os.path.dirname(os.path.abspath(self.config.config_file))
+        watch_manager.add_watch(directory, mask)
+        try:
+            while not self._stop_event.is_set():
+                if notifier.check_events(timeout=int(self.interval * 1000)):
+                    notifier.read_events()
+                    notifier.process_events()
+                    self._reload()
+        finally:
+            notifier.stop()
+
+    def _reload(self):
+        try:
+            self.config.reload()
+        except Exception, err:
+            log.error('Config watcher reload failed: %s', err)
+
+
+class _SectionLoader(object):
+    """Parses the options of a single lazily indexed section from the
+    config file *content*.
+
+    """
+    def __init__(self, content, spans, filename, dict_type, optionxform):
+        self._content = content
+        self._spans = spans
+        self._filename = filename
+        self._dict_type = dict_type
+        self._optionxform = optionxform
+
+    def __call__(self, section):
+        text = ''.join(self._content[a:b] for a, b in self._spans[section])
+        parser = ConfigParser.RawConfigParser(dict_type=self._dict_type)
+        parser.optionxform = self._optionxform
+        parser._read(StringIO.StringIO(text), self._filename)
+
+        return parser._sections[section]
+
+
+class _LazySections(collections.OrderedDict):
+    """Ordered section dictionary whose values are parsed by *loader*
+    on first access.
+
+    """
+    def __init__(self, loader):
+        collections.OrderedDict.__init__(self)
+        self._loader = loader
+
+    def __getitem__(self, key):
+        value = collections.OrderedDict.__getitem__(self, key)
+        if value is _UNPARSED:
+            value = self._loader(key)
+            collections.OrderedDict.__setitem__(self, key, value)
 
         return value
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def loaded(self):
+        """Names of the sections that have been parsed.
+        """
+        return [k for k in self
+                if collections.OrderedDict.__getitem__(self, k)
+                is not _UNPARSED]
+
+
+def _to_bool(value):
+    try:
+        return ConfigParser.RawConfigParser._boolean_states[value.lower()]
+    except KeyError:
+        raise ValueError('Not a boolean: %s' % value)
+
+
+def _split_unit(value):
+    value = value.strip()
+    index = len(value)
+    while index and value[index - 1].isalpha():
+        index -= 1
+
+    return value[:index].strip(), value[index:].lower()
+
+
+def _to_duration(value):
+    number, unit = _split_unit(value)
+    if not unit:
+        unit = 's'
+    if unit not in DURATION_UNITS:
+        raise ValueError('Unknown duration unit: %s' % value)
+
+    return float(number) * DURATION_UNITS[unit]
+
+
+def _to_bytes(value):
+    number, unit = _split_unit(value)
+    if not unit:
+        unit = 'b'
+    if unit not in BYTE_UNITS:
+        raise ValueError('Unknown byte size unit: %s' % value)
+
+    return int(float(number) * BYTE_UNITS[unit])
+
+
+def _resolve_layers(sources):
+    """Expand layered configuration *sources* into the ordered list of
+    files to read.  Directories contribute their ``*.conf`` files and
+    patterns their :mod:`glob` matches, both in name order.
+
+    """
+    files = []
+    for source in sources:
+        if os.path.isdir(source):
+            files.extend(sorted(glob.glob(os.path.join(source, '*.conf'))))
+        elif os.path.isfile(source):
+            files.append(source)
+        else:
+            files.extend(sorted(f for f in glob.glob(source)
+                                if os.path.isfile(f)))
+
+    return files
+
+
+def _read_layers(parser, files, env_prefix=None, workers=8):
+    """Read *files* concurrently and merge them into *parser* in order,
+    followed by the *env_prefix* environment overrides.
+
+    """
+    contents = [None] * len(files)
+    work = Queue.Queue()
+    for index, filename in enumerate(files):
+        work.put((index, filename))
+
+    def reader():
+        while True:
+            try:
+                index, filename = work.get_nowait()
+            except Queue.Empty:
+                break
+            try:
+                file_h = open(filename)
+                try:
+                    contents[index] = file_h.read()
+                finally:
+                    file_h.close()
+            except IOError, err:
+                log.warn('Config layer "%s" read failed: %s', filename, err)
+
+    threads = [threading.Thread(target=reader)
+               for _ in range(max(1, min(workers, len(files))))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for filename, content in zip(files, contents):
+        if content is not None:
+            parser._read(StringIO.StringIO(content), filename)
+
+    sections = dict((s.lower(), s) for s in parser.sections())
+    for (section, option), value in _env_overrides(env_prefix):
+        section = sections.get(section.lower(), section.lower())
+        if not parser.has_section(section):
+            parser.add_section(section)
+            sections[section] = section
+        ConfigParser.RawConfigParser.set(parser, section, option, value)
+
+
+def _env_overrides(env_prefix):
+    """Environment variables of the form
+    ``<env_prefix>__<SECTION>__<OPTION>``.
+
+    **Returns:**
+        sorted list of ((*section*, *option*), *value*) tuples
+
+    """
+    overrides = []
+    if env_prefix is not None:
+        prefix = '%s__' % env_prefix
+        for name, value in os.environ.iteritems():
+            if not name.startswith(prefix):
+                continue
+            parts = name[len(prefix):].split('__', 1)
+            if len(parts) == 2 and all(parts):
+                overrides.append(((parts[0], parts[1].lower()), value))
+
+    return sorted(overrides)
+
+
+def _file_key(filename):
+    """(absolute path, modification time, size) of *filename* or
+    ``None`` if the file cannot be accessed.
+
+    """
+    path = os.path.abspath(filename)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+
+    return (path, stat.st_mtime, stat.st_size)
+
+
+def _flatten(parser):
+    """Raw (uninterpolated) options of *parser* keyed by
+    (section, option).
+
+    """
+    options = {}
+    for section in parser.sections():
+        for option in parser.options(section):
+            options[(section, option)] = parser.get(section,
+                                                    option,
+                                                    raw=True)
+
+    return options
+
+
+def _diff_options(old, new):
+    diff = {}
+    for key in set(old) | set(new):
+        old_value = old.get(key)
+        new_value = new.get(key)
+        if old_value != new_value:
+            diff[key] = (old_value, new_value)
+
+    return diff
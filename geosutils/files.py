@@ -14,16 +14,23 @@ __all__ = [
     "gen_digest_path",
     "templater",
     "lock_file",
+    "RetentionManager",
 ]
 import os
 import re
+import stat
 import string
 import shutil
 import hashlib
 import tempfile
 import fcntl
+import heapq
+import time
+import threading
+import Queue
 
-from geosutils.log import log
+from geosutils.log import (log,
+                           metrics)
 
 
 def create_dir(directory):
@@ -43,15 +50,14 @@ def create_dir(directory):
 
     if directory is not None:
         if not os.path.exists(directory):
-            log.info('Creating directory "%s"' % directory)
+            log.info('Creating directory "%s"', directory)
             try:
                 os.makedirs(directory)
             except OSError, err:
                 status = False
-                log.error('Directory create error: %s' % err)
+                log.error('Directory create error: %s', err)
     else:
-        log.error('Create directory failed - invalid name "%s"' %
-                  directory)
+        log.error('Create directory failed - invalid name "%s"', directory)
 
     return status
 
@@ -80,7 +86,7 @@ def get_directory_files(path, file_filter=None):
     try:
         directory_files = os.listdir(path)
     except (TypeError, OSError), err:
-        log.error('Directory listing error for %s: %s' % (path, err))
+        log.error('Directory listing error for %s: %s', path, err)
 
     for this_file in directory_files:
         this_file = os.path.join(path, this_file)
@@ -104,7 +110,7 @@ def get_directory_files_list(path, file_filter=None):
     return list(get_directory_files(path, file_filter))
 
 
-def move_file(source, target, err=False, dry=False):
+def move_file(source, target, err=False, dry=False, throttle=None):
     """Attempts to move *source* to *target*.
 
     Checks if the *target* directory exists.  If not, will attempt to
@@ -123,17 +129,23 @@ def move_file(source, target, err=False, dry=False):
         *dry*: only report, do not execute (but will create the target
         directory if it is missing)
 
+        *throttle*: :class:`geosutils.throttle.IOThrottle` that the
+        move is accounted against (as one operation)
+
     **Returns:**
         boolean ``True`` if move was successful
 
         boolean ``False`` if move failed
 
     """
-    log.info('Moving "%s" to "%s"' % (source, target))
+    start = time.time()
     status = True
 
-    if not os.path.exists(source):
-        log.warn('Source file "%s" does not exist' % str(source))
+    try:
+        size = os.stat(source).st_size
+    except OSError:
+        log.warn('Source file "%s" does not exist', source,
+                 extra=metrics('move', source, target=target))
         status = False
     else:
         dir_status = True
@@ -142,18 +154,28 @@ def move_file(source, target, err=False, dry=False):
             dir_status = create_dir(directory)
 
         if not dry and dir_status:
+            if throttle is not None:
+                throttle.throttle(target, ops=1)
             try:
                 os.rename(source, target)
             except OSError as error:
                 status = False
-                log.error('%s move to %s failed -- %s' % (source,
-                                                          target,
-                                                          error))
+                log.error('%s move to %s failed -- %s', source, target, error,
+                          extra=metrics('move', source, target=target))
+
+        if status:
+            log.info('Moving "%s" to "%s"', source, target,
+                     extra=metrics('move',
+                                   source,
+                                   nbytes=size,
+                                   duration=time.time() - start,
+                                   target=target,
+                                   dry=dry))
 
     return status
 
 
-def copy_file(source, target):
+def copy_file(source, target, throttle=None):
     """Attempts to copy *source* to *target*.
 
     Guarantees an atomic copy.  In other word, *target* will not present
@@ -167,35 +189,74 @@ def copy_file(source, target):
 
         *target*: filename of where to copy *source* to
 
+    **Kwargs:**
+        *throttle*: :class:`geosutils.throttle.IOThrottle` that the
+        copy is accounted against (one operation plus the bytes copied)
+
     **Returns:**
         boolean ``True`` if move was successful
 
         boolean ``False`` if move failed
 
     """
-    log.info('Copying "%s" to "%s"' % (source, target))
+    start = time.time()
     status = False
 
-    if os.path.exists(source):
+    try:
+        size = os.stat(source).st_size
+    except OSError:
+        log.warn('Source file "%s" does not exist', source,
+                 extra=metrics('copy', source, target=target))
+    else:
         if create_dir(os.path.dirname(target)):
             try:
                 tmp_dir = os.path.dirname(target)
                 tmp_target_fh = tempfile.NamedTemporaryFile(dir=tmp_dir)
                 tmp_target = tmp_target_fh.name
                 tmp_target_fh.close()
-                shutil.copyfile(source, tmp_target)
+                if throttle is None:
+                    shutil.copyfile(source, tmp_target)
+                else:
+                    _throttled_copyfile(source, tmp_target, throttle)
                 os.rename(tmp_target, target)
                 status = True
+                log.info('Copying "%s" to "%s"', source, target,
+                         extra=metrics('copy',
+                                       source,
+                                       nbytes=size,
+                                       duration=time.time() - start,
+                                       target=target))
             except (OSError, IOError), err:
-                log.error('%s copy to %s failed -- %s' % (source,
-                                                          target,
-                                                          err))
-    else:
-        log.warn('Source file "%s" does not exist' % str(source))
+                log.error('%s copy to %s failed -- %s', source, target, err,
+                          extra=metrics('copy', source, target=target))
 
     return status
 
 
+def _throttled_copyfile(source, target, throttle):
+    """Variant of :func:`shutil.copyfile` that paces its reads and
+    writes through *throttle*.
+
+    """
+    throttle.throttle(target, ops=1)
+    chunk_size = throttle.chunk_size(target)
+
+    source_fh = open(source, 'rb')
+    try:
+        target_fh = open(target, 'wb')
+        try:
+            while True:
+                chunk = source_fh.read(chunk_size)
+                if not chunk:
+                    break
+                throttle.throttle(target, nbytes=len(chunk))
+                target_fh.write(chunk)
+        finally:
+            target_fh.close()
+    finally:
+        source_fh.close()
+
+
 def load_template(template, base_dir=None, **kwargs):
     """Load file *template* and substitute with *kwargs*.
 
@@ -214,13 +275,12 @@ def load_template(template, base_dir=None, **kwargs):
 
     query = None
     query_file = os.path.join(directory, template)
-    log.debug('Extracting SQL from template: "%s"' % query_file)
+    log.debug('Extracting SQL from template: "%s"', query_file)
     file_h = None
     try:
         file_h = open(query_file)
     except IOError, err:
-        log.error('Unable to open SQL template "%s": %s' %
-                    (query_file, err))
+        log.error('Unable to open SQL template "%s": %s', query_file, err)
 
     if file_h is not None:
         query_t = file_h.read()
@@ -247,12 +307,17 @@ def remove_files(files):
 
     files_removed = []
     for file_to_remove in files:
+        start = time.time()
         try:
-            log.info('Removing file "%s"' % file_to_remove)
             os.remove(file_to_remove)
             files_removed.append(file_to_remove)
+            log.info('Removing file "%s"', file_to_remove,
+                     extra=metrics('remove',
+                                   file_to_remove,
+                                   duration=time.time() - start))
         except OSError, err:
-            log.error('"%s" remove failed: %s' % (file_to_remove, err))
+            log.error('"%s" remove failed: %s', file_to_remove, err,
+                      extra=metrics('remove', file_to_remove))
 
     return files_removed
 
@@ -278,10 +343,9 @@ def check_filename(filename, re_format):
     reg_match = reg_c.match(os.path.basename(filename))
     if reg_match:
         status = True
-        log.debug('File "%s" matches filter "%s"' % (filename, re_format))
+        log.debug('File "%s" matches filter "%s"', filename, re_format)
     else:
-        log.debug('File "%s" did not match filter "%s"' %(filename,
-                                                          re_format))
+        log.debug('File "%s" did not match filter "%s"', filename, re_format)
 
     return status
 
@@ -308,7 +372,7 @@ def gen_digest(value):
         md5.update(value)
         digest = md5.hexdigest()[0:8]
     else:
-        log.error('Cannot generate digest against value: %s' % str(value))
+        log.error('Cannot generate digest against value: %s', value)
 
     return digest
 
@@ -368,7 +432,7 @@ def templater(template_file, **kwargs):
         ``KeyError`` if the template substitution fails
 
     """
-    log.debug('Processing template: "%s"' % template_file)
+    log.debug('Processing template: "%s"', template_file)
 
     template_src = None
     try:
@@ -376,7 +440,7 @@ def templater(template_file, **kwargs):
         template_src = file_h.read()
         file_h.close()
     except IOError, err:
-        log.error('Unable to source template file "%s"' % template_file)
+        log.error('Unable to source template file "%s"', template_file)
 
     template_sub = None
     if template_src is not None:
@@ -384,14 +448,14 @@ def templater(template_file, **kwargs):
         try:
             template_sub = template.substitute(kwargs)
         except KeyError, err:
-            log.error('Template "%s" substitute failed: %s' %
-                      (template_file, err))
+            log.error('Template "%s" substitute failed: %s',
+                      template_file, err)
 
     if template_sub is not None:
         template_sub = template_sub.rstrip('\n')
 
-    log.debug('Template substitution (%s|%s) produced: "%s"' %
-              (template_file, str(kwargs), template_sub))
+    log.debug('Template substitution (%s|%s) produced: "%s"',
+              template_file, kwargs, template_sub)
 
     return template_sub
 
@@ -410,17 +474,16 @@ def lock_file(file_to_lock):
     """
     file_desc = None
     if not os.path.exists(file_to_lock):
-        log.warn('File to lock "%s" does not exist' % file_to_lock)
+        log.warn('File to lock "%s" does not exist', file_to_lock)
     else:
         file_desc = open(file_to_lock, 'r+')
         try:
             fcntl.lockf(file_desc, fcntl.LOCK_EX|fcntl.LOCK_NB)
-            log.debug('Obtained exclusive lock on file "%s"' %
-                      file_desc.name)
+            log.debug('Obtained exclusive lock on file "%s"', file_desc.name)
         except IOError:
             file_desc.close()
             file_desc = None
-            log.warn('Unable to obtain exclusive lock on file "%s"' %
+            log.warn('Unable to obtain exclusive lock on file "%s"',
                      file_desc.name)
 
     return file_desc
@@ -429,6 +492,375 @@ def unlock_file(file_desc):
     """Release file lock on *file_desc*.
 
     """
-    log.debug('Releasing lock on file "%s"' % file_desc.name)
+    log.debug('Releasing lock on file "%s"', file_desc.name)
     fcntl.lockf(file_desc, fcntl.LOCK_UN)
     file_desc.close()
+
+
+class RetentionManager(object):
+    """Age, size and count based retention against the files under the
+    directory tree *path*.
+
+    Rather than walking every file on every sweep, the
+    :class:`RetentionManager` keeps an incremental index of the files
+    under *path* ordered by modification time.  Each sweep only lists the
+    directories whose own modification time has changed since the last
+    sweep (a file create/delete/rename always updates the parent
+    directory) and then only inspects the files at the old end of the
+    index -- those that are near expiry.
+
+    Typical usage::
+
+        >>> from geosutils.files import RetentionManager
+        >>> manager = RetentionManager('/var/tmp/geoingest/archive',
+        ...                            max_age=7 * 86400,
+        ...                            max_bytes=500 * 1024 ** 3)
+        >>> stats = manager.sweep()
+        >>> stats['files'], stats['bytes'], stats['duration']
+        (1024, 73400320, 0.84)
+
+    .. attribute:: *path*
+
+        root of the directory tree to manage
+
+    .. attribute:: *max_age*
+
+        files with a modification time older than *max_age* seconds
+        are removed (``None`` disables the age policy)
+
+    .. attribute:: *max_bytes*
+
+        oldest files are removed until the total size of the tree is
+        no greater than *max_bytes* (``None`` disables the size policy)
+
+    .. attribute:: *max_files*
+
+        oldest files are removed until the tree contains no more than
+        *max_files* files (``None`` disables the count policy)
+
+    .. attribute:: *file_filter*
+
+        :mod:`re` pattern that limits the files under management (as per
+        :func:`get_directory_files`)
+
+    .. attribute:: *batch_size*
+
+        number of files passed to :func:`remove_files` in one batch
+
+    .. attribute:: *workers*
+
+        maximum number of batches that are removed in parallel
+
+    """
+    _path = None
+    _max_age = None
+    _max_bytes = None
+    _max_files = None
+    _file_filter = None
+    _batch_size = 100
+    _workers = 4
+
+    def __init__(self,
+                 path,
+                 max_age=None,
+                 max_bytes=None,
+                 max_files=None,
+                 file_filter=None,
+                 batch_size=100,
+                 workers=4):
+        """:class:`RetentionManager` initialisation.
+        """
+        self._path = path
+        self._max_age = max_age
+        self._max_bytes = max_bytes
+        self._max_files = max_files
+        self._file_filter = file_filter
+        self._batch_size = batch_size
+        self._workers = workers
+
+        # Heap of (mtime, path) tuples.  Entries are invalidated lazily
+        # by checking against the authoritative _files index.
+        self._heap = []
+        self._files = {}
+        self._dirs = {}
+        self._dir_files = {}
+        self._dir_children = {}
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    @property
+    def path(self):
+        return self._path
+
+    @property
+    def max_age(self):
+        return self._max_age
+
+    @property
+    def max_bytes(self):
+        return self._max_bytes
+
+    @property
+    def max_files(self):
+        return self._max_files
+
+    @property
+    def file_filter(self):
+        return self._file_filter
+
+    @property
+    def batch_size(self):
+        return self._batch_size
+
+    @property
+    def workers(self):
+        return self._workers
+
+    @property
+    def total_bytes(self):
+        return self._total_bytes
+
+    @property
+    def total_files(self):
+        return len(self._files)
+
+    def refresh(self):
+        """Bring the file index up to date with the filesystem.
+
+        Only the directories whose modification time has changed since
+        the previous refresh are listed.
+
+        """
+        if not self._dirs:
+            self._dirs[self.path] = None
+
+        reg_c = None
+        if self.file_filter is not None:
+            reg_c = re.compile(self.file_filter)
+
+        to_check = list(self._dirs.keys())
+        while to_check:
+            directory = to_check.pop()
+            try:
+                dir_mtime = os.stat(directory).st_mtime
+            except OSError:
+                self._drop_dir(directory)
+                continue
+
+            if self._dirs.get(directory) == dir_mtime:
+                continue
+            self._dirs[directory] = dir_mtime
+
+            try:
+                entries = os.listdir(directory)
+            except OSError as err:
+                log.error('Directory listing error for %s: %s', directory, err)
+                continue
+
+            seen = set()
+            subdirs = set()
+            for entry in entries:
+                entry_path = os.path.join(directory, entry)
+                try:
+                    entry_stat = os.lstat(entry_path)
+                except OSError:
+                    continue
+
+                if stat.S_ISDIR(entry_stat.st_mode):
+                    subdirs.add(entry_path)
+                    if entry_path not in self._dirs:
+                        self._dirs[entry_path] = None
+                        to_check.append(entry_path)
+                elif stat.S_ISREG(entry_stat.st_mode):
+                    if reg_c is not None and not reg_c.match(entry):
+                        continue
+                    seen.add(entry_path)
+                    self._index_file(entry_path,
+                                     entry_stat.st_mtime,
+                                     entry_stat.st_size)
+
+            # Forget files and directories that have gone from here.
+            for gone in self._dir_files.get(directory, set()) - seen:
+                self._forget_file(gone)
+            self._dir_files[directory] = seen
+
+            for gone in self._dir_children.get(directory, set()) - subdirs:
+                self._drop_dir(gone)
+            self._dir_children[directory] = subdirs
+
+    def sweep(self, now=None, dry=False):
+        """Apply the retention policies to the directory tree.
+
+        **Kwargs:**
+            *now*: reference time in seconds since epoch that the
+            *max_age* policy is measured against (defaults to the
+            current time)
+
+            *dry*: only report, do not remove any files
+
+        **Returns:**
+            dictionary of the form::
+
+                {'files': <number of files removed>,
+                 'bytes': <number of bytes reclaimed>,
+                 'duration': <sweep time in seconds>,
+                 'removed': <list of files removed>}
+
+        """
+        start = time.time()
+        if now is None:
+            now = start
+
+        self.refresh()
+        candidates = self._expired(now)
+
+        if not dry:
+            removed = self._remove(candidates)
+            for file_removed in removed:
+                self._forget_file(file_removed)
+            retained = set(c for c, _ in candidates) - set(removed)
+        else:
+            removed = [c for c, _ in candidates]
+            retained = removed
+
+        # Files that were kept (or failed to be removed) are still
+        # indexed and must remain candidates for the next sweep.
+        for path in retained:
+            heapq.heappush(self._heap, (self._files[path][0], path))
+
+        sizes = dict(candidates)
+        reclaimed = sum(sizes[f] for f in removed)
+
+        duration = time.time() - start
+        log.info('Retention sweep of "%s" removed %d files (%d bytes) '
+                 'in %.3f sec', self.path, len(removed), reclaimed, duration,
+                 extra=metrics('sweep',
+                               self.path,
+                               nbytes=reclaimed,
+                               duration=duration,
+                               files=len(removed),
+                               dry=dry))
+
+        return {'files': len(removed),
+                'bytes': reclaimed,
+                'duration': duration,
+                'removed': removed}
+
+    def _expired(self, now):
+        """Pop the files that violate a retention policy from the old
+        end of the index.
+
+        **Returns:**
+            list of (*path*, *size*) tuples in oldest-first order
+
+        """
+        candidates = []
+        total_bytes = self._total_bytes
+        total_files = len(self._files)
+
+        cutoff = None
+        if self.max_age is not None:
+            cutoff = now - self.max_age
+
+        while self._heap:
+            mtime, path = self._heap[0]
+            if self._files.get(path, (None,))[0] != mtime:
+                # Stale entry -- file was removed or re-indexed.
+                heapq.heappop(self._heap)
+                continue
+
+            if not ((cutoff is not None and mtime < cutoff) or
+                    (self.max_bytes is not None and
+                     total_bytes > self.max_bytes) or
+                    (self.max_files is not None and
+                     total_files > self.max_files)):
+                break
+
+            heapq.heappop(self._heap)
+
+            # The file may have been rewritten in place since it was
+            # indexed, which does not touch the parent directory.
+            try:
+                file_stat = os.stat(path)
+            except OSError:
+                self._forget_file(path)
+                continue
+
+            if file_stat.st_mtime != mtime:
+                self._index_file(path,
+                                 file_stat.st_mtime,
+                                 file_stat.st_size)
+                continue
+
+            size = self._files[path][1]
+            candidates.append((path, size))
+            total_bytes -= size
+            total_files -= 1
+
+        return candidates
+
+    def _remove(self, candidates):
+        """Remove *candidates* in batches of :attr:`batch_size` across
+        at most :attr:`workers` threads.
+
+        **Returns:**
+            list of files successfully removed from filesystem
+
+        """
+        files = [c for c, _ in candidates]
+        batches = [files[i:i + self.batch_size]
+                   for i in range(0, len(files), self.batch_size)]
+
+        removed = []
+        if not batches:
+            return removed
+
+        batch_queue = Queue.Queue()
+        for batch in batches:
+            batch_queue.put(batch)
+
+        def worker():
+            while True:
+                try:
+                    batch = batch_queue.get_nowait()
+                except Queue.Empty:
+                    break
+                files_removed = remove_files(batch)
+                with self._lock:
+                    removed.extend(files_removed)
+
+        threads = []
+        for _ in range(max(1, min(self.workers, len(batches)))):
+            thread = threading.Thread(target=worker)
+            thread.start()
+            threads.append(thread)
+
+        for thread in threads:
+            thread.join()
+
+        return removed
+
+    def _index_file(self, path, mtime, size):
+        old = self._files.get(path)
+        if old is not None:
+            if old == (mtime, size):
+                return
+            self._total_bytes -= old[1]
+
+        self._files[path] = (mtime, size)
+        self._total_bytes += size
+        heapq.heappush(self._heap, (mtime, path))
+
+    def _forget_file(self, path):
+        old = self._files.pop(path, None)
+        if old is not None:
+            self._total_bytes -= old[1]
+
+    def _drop_dir(self, directory):
+        to_drop = [directory]
+        while to_drop:
+            dir_name = to_drop.pop()
+            self._dirs.pop(dir_name, None)
+            to_drop.extend(self._dir_children.pop(dir_name, set()))
+            for path in self._dir_files.pop(dir_name, set()):
+                self._forget_file(path)
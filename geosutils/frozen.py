@@ -0,0 +1,314 @@
+"""Immutable, fork-shareable snapshots of a parsed
+:class:`geosutils.config.Config`.
+
+A :class:`FrozenConfig` is a compact, hashable, read-only copy of the
+fully interpolated configuration.  Reads are plain dictionary lookups
+that return the stored value without allocating.
+
+For process pools, a :class:`FrozenConfig` can be saved to a file that
+every worker attaches to as a :class:`SharedConfig`.  The file is
+memory-mapped read-only, so all workers share the same page cache pages
+and no per-worker copy of the configuration is made up front::
+
+    >>> frozen = config.freeze()
+    >>> frozen.save('/dev/shm/geoingest.frozen')
+    ...
+    >>> # In each worker.
+    >>> from geosutils.frozen import SharedConfig
+    >>> shared = SharedConfig('/dev/shm/geoingest.frozen')
+    >>> shared.get('ingest', 'threads')
+    '10'
+
+"""
+__all__ = [
+    "FrozenConfig",
+    "SharedConfig",
+]
+import os
+import mmap
+import struct
+import tempfile
+import ConfigParser
+
+MAGIC = 'GSFC'
+HEADER = struct.Struct('<4sI')
+ENTRY = struct.Struct('<IIII')
+
+# Separates the section and option within a packed key.  A key with an
+# empty option marks the start of a section.
+KEY_SEP = '\x00'
+
+
+class FrozenConfig(object):
+    """Immutable snapshot of a configuration.
+
+    Exposes the read-only subset of the :mod:`ConfigParser` interface:
+    :meth:`get`, :meth:`items`, :meth:`sections`, :meth:`options`,
+    :meth:`has_section` and :meth:`has_option`.
+
+    """
+    __slots__ = ['_sections', '_options', '_index', '_hash']
+
+    def __init__(self, sections):
+        """:class:`FrozenConfig` initialisation.
+
+        **Args:**
+            *sections*: iterable of (*section*, *items*) pairs, where
+            *items* is an iterable of (*option*, *value*) pairs
+
+        """
+        section_names = []
+        options = {}
+        index = {}
+        for section, items in sections:
+            section_names.append(section)
+            names = []
+            for option, value in items:
+                names.append(option)
+                index[(section, option)] = value
+            options[section] = tuple(names)
+
+        set_attr = object.__setattr__
+        set_attr(self, '_sections', tuple(section_names))
+        set_attr(self, '_options', options)
+        set_attr(self, '_index', index)
+        set_attr(self, '_hash', hash(self._key()))
+
+    @classmethod
+    def from_config(cls, config):
+        """Freeze the interpolated values of *config*.  Options that
+        cannot be interpolated are frozen with their raw value.
+
+        """
+        sections = []
+        for section in config.sections():
+            try:
+                items = config.items(section)
+            except ConfigParser.Error:
+                items = config.items(section, raw=True)
+            sections.append((section, items))
+
+        return cls(sections)
+
+    def __setattr__(self, name, value):
+        raise TypeError('%s is immutable' % self.__class__.__name__)
+
+    def __delattr__(self, name):
+        raise TypeError('%s is immutable' % self.__class__.__name__)
+
+    def __hash__(self):
+        return self._hash
+
+    def __eq__(self, other):
+        if not isinstance(other, FrozenConfig):
+            return NotImplemented
+
+        return self._key() == other._key()
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        if result is NotImplemented:
+            return result
+
+        return not result
+
+    def __reduce__(self):
+        return (self.__class__,
+                ([(s, self.items(s)) for s in self._sections],))
+
+    def _key(self):
+        return (self._sections,
+                tuple(sorted(self._index.iteritems())))
+
+    def sections(self):
+        return list(self._sections)
+
+    def has_section(self, section):
+        return section in self._options
+
+    def options(self, section):
+        try:
+            return list(self._options[section])
+        except KeyError:
+            raise ConfigParser.NoSectionError(section)
+
+    def has_option(self, section, option):
+        index = self._index
+
+        return ((section, option) in index or
+                (section, option.lower()) in index)
+
+    def get(self, section, option):
+        try:
+            return self._index[(section, option)]
+        except KeyError:
+            pass
+
+        try:
+            return self._index[(section, option.lower())]
+        except KeyError:
+            if section not in self._options:
+                raise ConfigParser.NoSectionError(section)
+            raise ConfigParser.NoOptionError(option, section)
+
+    def items(self, section):
+        index = self._index
+
+        return [(o, index[(section, o)]) for o in self.options(section)]
+
+    def save(self, path):
+        """Atomically write the snapshot to *path* in the packed format
+        read by :class:`SharedConfig`.
+
+        """
+        entries = []
+        for section in self._sections:
+            entries.append((_encode(section) + KEY_SEP, ''))
+            for option in self._options[section]:
+                entries.append((_encode(section) + KEY_SEP + _encode(option),
+                                _encode(self._index[(section, option)])))
+        entries.sort()
+
+        offset = HEADER.size + ENTRY.size * len(entries)
+        table = []
+        data = []
+        for key, value in entries:
+            table.append(ENTRY.pack(offset, len(key),
+                                    offset + len(key), len(value)))
+            data.append(key)
+            data.append(value)
+            offset += len(key) + len(value)
+
+        directory = os.path.dirname(os.path.abspath(path))
+        tmp_fh = tempfile.NamedTemporaryFile(dir=directory, delete=False)
+        try:
+            tmp_fh.write(HEADER.pack(MAGIC, len(entries)))
+            tmp_fh.write(''.join(table))
+            tmp_fh.write(''.join(data))
+            tmp_fh.close()
+            os.rename(tmp_fh.name, path)
+        except (IOError, OSError):
+            tmp_fh.close()
+            if os.path.exists(tmp_fh.name):
+                os.remove(tmp_fh.name)
+            raise
+
+
+class SharedConfig(object):
+    """Read-only view of a :meth:`FrozenConfig.save` file that is
+    memory-mapped rather than loaded.
+
+    Lookups binary search the packed, sorted key table in place and only
+    the requested value is materialised.  Reads use slicing rather than
+    file position, so a :class:`SharedConfig` is safe to share between
+    threads.
+
+    """
+    def __init__(self, path):
+        """:class:`SharedConfig` initialisation.
+        """
+        file_h = open(path, 'rb')
+        try:
+            self._mm = mmap.mmap(file_h.fileno(), 0, access=mmap.ACCESS_READ)
+        finally:
+            file_h.close()
+
+        magic, self._count = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            self._mm.close()
+            raise ValueError('"%s" is not a frozen config file' % path)
+
+    def close(self):
+        self._mm.close()
+
+    def _entry(self, index):
+        return ENTRY.unpack_from(self._mm,
+                                 HEADER.size + ENTRY.size * index)
+
+    def _key_at(self, index):
+        key_offset, key_len, _, _ = self._entry(index)
+
+        return self._mm[key_offset:key_offset + key_len]
+
+    def _find(self, key):
+        """Index of the first entry with a key not less than *key*.
+        """
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            if self._key_at(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+
+        return low
+
+    def _lookup_option(self, section, option):
+        """Value of *option* as is, or else as a lower case (default
+        :meth:`ConfigParser.RawConfigParser.optionxform`) option.
+
+        """
+        value = self._lookup(section, option)
+        if value is None and option.lower() != option:
+            value = self._lookup(section, option.lower())
+
+        return value
+
+    def _lookup(self, section, option):
+        key = _encode(section) + KEY_SEP + _encode(option)
+        index = self._find(key)
+        if index < self._count:
+            key_offset, key_len, value_offset, value_len = self._entry(index)
+            if self._mm[key_offset:key_offset + key_len] == key:
+                return self._mm[value_offset:value_offset + value_len]
+
+        return None
+
+    def sections(self):
+        sections = []
+        for index in range(self._count):
+            section, option = self._key_at(index).split(KEY_SEP, 1)
+            if not option:
+                sections.append(section)
+
+        return sections
+
+    def has_section(self, section):
+        return self._lookup(section, '') is not None
+
+    def options(self, section):
+        prefix = _encode(section) + KEY_SEP
+        index = self._find(prefix)
+        if index >= self._count or self._key_at(index) != prefix:
+            raise ConfigParser.NoSectionError(section)
+
+        options = []
+        for index in range(index + 1, self._count):
+            key = self._key_at(index)
+            if not key.startswith(prefix):
+                break
+            options.append(key[len(prefix):])
+
+        return options
+
+    def has_option(self, section, option):
+        return self._lookup_option(section, option) is not None
+
+    def get(self, section, option):
+        value = self._lookup_option(section, option)
+        if value is None:
+            if not self.has_section(section):
+                raise ConfigParser.NoSectionError(section)
+            raise ConfigParser.NoOptionError(option, section)
+
+        return value
+
+    def items(self, section):
+        return [(o, self.get(section, o)) for o in self.options(section)]
+
+
+def _encode(value):
+    if isinstance(value, unicode):
+        value = value.encode('utf-8')
+
+    return str(value)
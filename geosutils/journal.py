@@ -0,0 +1,427 @@
+"""Crash-safe, journaled batches of file operations.
+
+The :class:`Journal` is a write-ahead log that records the intent of
+every operation in a batch of :func:`geosutils.files.move_file` and
+:func:`geosutils.files.copy_file` calls before any of them are executed.
+Should the process die part way through a batch, :meth:`Journal.open`
+will either replay or roll back the incomplete batch on the next
+startup.  Recovery only has to read the journal, never the archive.
+
+Typical usage::
+
+    >>> from geosutils.journal import Journal
+    >>> journal = Journal('/var/tmp/geoingest/archive.journal')
+    >>> journal.open()
+    >>> with journal.batch() as batch:
+    ...     batch.move_file('/var/tmp/geoingest/a.dat',
+    ...                     '/var/tmp/geoingest/archive/a.dat')
+    ...     batch.copy_file('/var/tmp/geoingest/b.dat',
+    ...                     '/var/tmp/geoingest/archive/b.dat')
+    >>> journal.close()
+
+"""
+__all__ = [
+    "Journal",
+    "JournalBatch",
+]
+import os
+import json
+import threading
+import itertools
+
+from geosutils.log import log
+from geosutils.files import (move_file,
+                             copy_file,
+                             remove_files)
+
+
+class Journal(object):
+    """Write-ahead journal of file operation batches.
+
+    Journal records are newline-delimited JSON.  A batch is written as
+    a ``begin`` record followed by one ``intent`` record per operation
+    and made durable with a single ``fsync`` before the first operation
+    executes.  Per-operation ``done`` records are group committed --
+    they are flushed every *group_size* operations, and concurrent
+    writers that need a flush share a single ``fsync``.  Finally, a
+    ``commit`` record closes the batch.
+
+    Replaying an operation is idempotent, so a lost ``done`` record
+    only costs a redundant check during recovery.
+
+    .. attribute:: *path*
+
+        location of the journal file
+
+    .. attribute:: *group_size*
+
+        number of completed operations to buffer before the ``done``
+        records are made durable
+
+    .. attribute:: *recovery_mode*
+
+        ``replay`` (default) completes incomplete batches on
+        :meth:`open`.  ``rollback`` reverses them
+
+    .. attribute:: *checkpoint_records*
+
+        once the journal holds at least this many records and no
+        batches are in flight, it is truncated
+
+    """
+    _path = None
+    _group_size = 64
+    _recovery_mode = 'replay'
+    _checkpoint_records = 10000
+
+    def __init__(self,
+                 path,
+                 group_size=64,
+                 recovery_mode='replay',
+                 checkpoint_records=10000):
+        """:class:`Journal` initialisation.
+        """
+        if recovery_mode not in ('replay', 'rollback'):
+            raise ValueError('Unsupported recovery mode "%s"' %
+                             recovery_mode)
+
+        self._path = path
+        self._group_size = group_size
+        self._recovery_mode = recovery_mode
+        self._checkpoint_records = checkpoint_records
+
+        self._fh = None
+        self._batch_ids = itertools.count(1)
+        self._open_batches = set()
+
+        # Group commit state.  _written is the sequence number of the
+        # last record appended, _synced the last one known durable.
+        self._lock = threading.Lock()
+        self._sync_cond = threading.Condition(self._lock)
+        self._syncing = False
+        self._written = 0
+        self._synced = 0
+        self._checkpointed = 0
+
+    @property
+    def path(self):
+        return self._path
+
+    @property
+    def group_size(self):
+        return self._group_size
+
+    @property
+    def recovery_mode(self):
+        return self._recovery_mode
+
+    @property
+    def checkpoint_records(self):
+        return self._checkpoint_records
+
+    def open(self):
+        """Recover any incomplete batches left in the journal and
+        open the journal for new batches.
+
+        **Returns:**
+            the recovery summary as per :meth:`recover`
+
+        """
+        stats = self.recover()
+        self._fh = open(self.path, 'a')
+
+        return stats
+
+    def close(self):
+        """Flush and close the journal.  If no batches are in flight,
+        the journal is truncated as all of its batches are committed.
+
+        """
+        if self._fh is None:
+            return
+
+        self._sync(self._written)
+        self._fh.close()
+        self._fh = None
+
+        if not self._open_batches:
+            self._truncate()
+
+    def batch(self):
+        """Start a new batch of file operations.
+
+        **Returns:**
+            a :class:`JournalBatch` that executes on exit of a ``with``
+            block (or via :meth:`JournalBatch.execute`)
+
+        """
+        if self._fh is None:
+            raise IOError('Journal "%s" is not open' % self.path)
+
+        return JournalBatch(self, self._batch_ids.next())
+
+    def recover(self):
+        """Replay or roll back (as per :attr:`recovery_mode`) any
+        batches in the journal that did not commit.
+
+        Cost is proportional to the size of the journal.
+
+        **Returns:**
+            dictionary of the form::
+
+                {'batches': <number of incomplete batches>,
+                 'operations': <number of operations recovered>}
+
+        """
+        stats = {'batches': 0, 'operations': 0}
+        if not os.path.exists(self.path):
+            return stats
+
+        batches = {}
+        committed = set()
+        for record in self._read():
+            batch_id = record.get('batch')
+            kind = record.get('kind')
+            if kind == 'begin':
+                batches[batch_id] = {}
+            elif kind == 'intent':
+                batches.setdefault(batch_id, {})[record['seq']] = record
+            elif kind == 'done':
+                intent = batches.get(batch_id, {}).get(record['seq'])
+                if intent is not None:
+                    intent['done'] = True
+            elif kind == 'commit':
+                committed.add(batch_id)
+
+        for batch_id in sorted(batches):
+            if batch_id in committed:
+                continue
+
+            stats['batches'] += 1
+            intents = [batches[batch_id][s]
+                       for s in sorted(batches[batch_id])]
+            log.warn('Journal "%s" %s of incomplete batch %s (%d ops)',
+                     self.path, self.recovery_mode, batch_id, len(intents))
+            if self.recovery_mode == 'replay':
+                for intent in intents:
+                    _replay(intent)
+            else:
+                for intent in reversed(intents):
+                    _rollback(intent)
+            stats['operations'] += len(intents)
+
+        self._truncate()
+
+        return stats
+
+    def _read(self):
+        """Generator over the well-formed records in the journal.  A
+        torn record at the tail (crash mid-write) is ignored.
+
+        """
+        file_h = open(self.path)
+        try:
+            for line in file_h:
+                if not line.endswith('\n'):
+                    break
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    break
+        finally:
+            file_h.close()
+
+    def _append(self, records):
+        """Append *records* to the journal (not yet durable).
+
+        **Returns:**
+            the sequence number of the last record appended
+
+        """
+        data = ''.join(json.dumps(r, sort_keys=True) + '\n'
+                       for r in records)
+        with self._lock:
+            self._fh.write(data)
+            self._written += len(records)
+
+            return self._written
+
+    def _sync(self, seq):
+        """Ensure that all records up to and including *seq* are
+        durable.
+
+        Concurrent callers are coalesced: while one thread performs the
+        ``fsync``, others wait and are released if that ``fsync``
+        covered their records.
+
+        """
+        with self._lock:
+            while self._synced < seq:
+                if self._syncing:
+                    self._sync_cond.wait()
+                    continue
+
+                self._syncing = True
+                target = self._written
+                self._fh.flush()
+                self._lock.release()
+                try:
+                    os.fsync(self._fh.fileno())
+                finally:
+                    self._lock.acquire()
+                    self._syncing = False
+                    self._synced = max(self._synced, target)
+                    self._sync_cond.notify_all()
+
+    def _begin(self, batch_id, records):
+        with self._lock:
+            self._open_batches.add(batch_id)
+
+        return self._append(records)
+
+    def _commit(self, batch_id):
+        """Durably commit *batch_id* and checkpoint the journal if it
+        has grown past :attr:`checkpoint_records`.
+
+        """
+        self._sync(self._append([{'kind': 'commit', 'batch': batch_id}]))
+
+        with self._lock:
+            self._open_batches.discard(batch_id)
+            if (not self._open_batches and
+               not self._syncing and
+               self._written - self._checkpointed >=
+               self.checkpoint_records):
+                self._fh.flush()
+                self._fh.truncate(0)
+                os.fsync(self._fh.fileno())
+                self._checkpointed = self._written
+
+    def _truncate(self):
+        file_h = open(self.path, 'w')
+        file_h.close()
+
+
+class JournalBatch(object):
+    """A batch of file operations against a :class:`Journal`.
+
+    Operations are queued by :meth:`move_file` and :meth:`copy_file`
+    and executed in order by :meth:`execute`, which is called
+    automatically on exit from a ``with`` block that did not raise.
+
+    """
+    def __init__(self, journal, batch_id):
+        self._journal = journal
+        self._batch_id = batch_id
+        self._intents = []
+        self._statuses = None
+
+    @property
+    def batch_id(self):
+        return self._batch_id
+
+    @property
+    def statuses(self):
+        """List of boolean operation statuses once executed.
+        """
+        return self._statuses
+
+    def move_file(self, source, target):
+        self._queue('move', source, target)
+
+    def copy_file(self, source, target):
+        self._queue('copy', source, target)
+
+    def _queue(self, operation, source, target):
+        if self._statuses is not None:
+            raise IOError('Batch %s has already executed' % self.batch_id)
+
+        self._intents.append({'kind': 'intent',
+                              'batch': self.batch_id,
+                              'seq': len(self._intents),
+                              'op': operation,
+                              'source': source,
+                              'target': target,
+                              'existed': os.path.exists(target)})
+
+    def execute(self):
+        """Write the batch intent to the journal and execute each
+        operation.
+
+        **Returns:**
+            list of boolean statuses, one per operation
+
+        """
+        journal = self._journal
+
+        begin = {'kind': 'begin', 'batch': self.batch_id}
+        journal._sync(journal._begin(self.batch_id,
+                                     [begin] + self._intents))
+
+        statuses = []
+        pending = 0
+        seq = None
+        for intent in self._intents:
+            if intent['op'] == 'move':
+                status = move_file(intent['source'], intent['target'])
+            else:
+                status = copy_file(intent['source'], intent['target'])
+            statuses.append(status)
+
+            seq = journal._append([{'kind': 'done',
+                                    'batch': self.batch_id,
+                                    'seq': intent['seq']}])
+            pending += 1
+            if pending >= journal.group_size:
+                journal._sync(seq)
+                pending = 0
+
+        journal._commit(self.batch_id)
+
+        self._statuses = statuses
+
+        return statuses
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.execute()
+
+        return False
+
+
+def _replay(intent):
+    """Idempotently complete the operation described by *intent*.
+    """
+    source = intent['source']
+    target = intent['target']
+
+    if intent['op'] == 'move':
+        if os.path.exists(source):
+            move_file(source, target)
+    elif intent['op'] == 'copy':
+        if os.path.exists(source) and (intent.get('done') is None or
+                                       not os.path.exists(target)):
+            copy_file(source, target)
+
+
+def _rollback(intent):
+    """Reverse the operation described by *intent* if it was applied.
+
+    .. note::
+
+        A copy that overwrote an existing *target* cannot be reversed
+        and is left in place.
+
+    """
+    source = intent['source']
+    target = intent['target']
+
+    if intent['op'] == 'move':
+        if os.path.exists(target) and not os.path.exists(source):
+            move_file(target, source)
+    elif intent['op'] == 'copy':
+        if os.path.exists(target) and not intent['existed']:
+            remove_files(target)
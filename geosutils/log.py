@@ -1,17 +1,34 @@
 __all__ = [
     "log",
+    "configure",
     "set_console",
     "set_log_level",
     "suppress_logging",
     "enable_logging",
     "autolog",
+    "set_autolog_sampling",
+    "lazy",
+    "LazyMessage",
+    "metrics",
+    "JSONFormatter",
+    "BufferedJSONHandler",
+    "RateLimitFilter",
+    "enable_rate_limiting",
+    "disable_rate_limiting",
+    "QueueHandler",
+    "QueueListener",
+    "enable_async_logging",
+    "disable_async_logging",
 ]
 
 import logging
-import logging.config
 import os
+import sys
+import time
+import Queue
+import atexit
 import datetime
-import inspect
+import threading
 
 
 """Configuration file for the logging module can be provided in the
@@ -23,57 +40,196 @@ following locations:
 
 This arrangement is analogous to "rc" files.  for example, "bashrc",
 "vimrc", etc.
-"""
 
-locations = [
-    os.environ.get("LOG_CONF"),
-    os.curdir,
-    os.path.expanduser("~"),
-]
+Nothing is read at import time.  The logging configuration is loaded
+on the first use of :data:`log` or by an explicit :func:`configure`
+call.
+"""
 
+# Set by configure().
 found_log_config = False
-for loc in locations:
-    if loc is None:
-        continue
-
-    try:
-        source = open(os.path.join(loc, 'log.conf'))
-    except IOError as err:
-        # Not a bad thing if the open failed.  Just means that the log
-        # source does not exist.
-        continue
-
-    try:
-        logging.config.fileConfig(source)
-        source.close()
-        found_log_config = True
-        break
-    except Exception as err:
-        pass
-
-# Holy crap!  Some black magic to identify logger handlers ...
-# The calling script will be the outermost call in the stack.  Parse the
-# resulting frame to get the name of the script.
 logger_name = None
-if found_log_config:
-    s = inspect.stack()
-    logger_name = os.path.basename(s[-1][1])
-    if logger_name == 'nosetests' or logger_name == '<stdin>':
+
+_configured = False
+_configure_lock = threading.RLock()
+
+
+def configure(force=False):
+    """Load the logging configuration and bind :data:`log` to the
+    resulting logger.
+
+    Called automatically on the first use of :data:`log`.  Subsequent
+    calls are no-ops unless *force* is set, for example, after changing
+    the ``LOG_CONF`` environment variable.
+
+    **Returns:**
+        the configured :class:`logging.Logger`
+
+    """
+    global found_log_config, logger_name, _configured
+
+    with _configure_lock:
+        if _configured and not force:
+            return log._logger
+
+        # Deferred as it pulls in a raft of modules that are not
+        # needed unless there is a log.conf to read.
+        import logging.config
+
+        locations = [
+            os.environ.get("LOG_CONF"),
+            os.curdir,
+            os.path.expanduser("~"),
+        ]
+
+        found_log_config = False
+        for loc in locations:
+            if loc is None:
+                continue
+
+            try:
+                source = open(os.path.join(loc, 'log.conf'))
+            except IOError as err:
+                # Not a bad thing if the open failed.  Just means that
+                # the log source does not exist.
+                continue
+
+            try:
+                logging.config.fileConfig(source)
+                source.close()
+                found_log_config = True
+                break
+            except Exception as err:
+                pass
+
+        # Identify logger handlers by the name of the calling script.
         logger_name = None
+        if found_log_config:
+            logger_name = _script_name()
 
+        logger = logging.getLogger(logger_name)
+        if logger_name is not None:
+            # Contain logging to the configured handler only (not console).
+            logger.propagate = False
 
-log = logging.getLogger(logger_name)
-if logger_name is not None:
-    # Contain logging to the configured handler only (not console).
-    log.propagate = False
+        if not found_log_config and not getattr(logger,
+                                                '_geosutils_console',
+                                                False):
+            # If no config, just dump a basic log message to console.
+            ch = logging.StreamHandler()
+            formatter = logging.Formatter("%(asctime)s %(levelname)s:: "
+                                          "%(message)s")
+            ch.setFormatter(formatter)
+            logger.addHandler(ch)
+            logger.level = logging.NOTSET
+            logger._geosutils_console = True
 
-if not found_log_config:
-    # If no config, just dump a basic log message to console.
-    ch = logging.StreamHandler()
-    formatter = logging.Formatter("%(asctime)s %(levelname)s:: %(message)s")
-    ch.setFormatter(formatter)
-    log.addHandler(ch)
-    log.level = logging.NOTSET
+        log._bind(logger)
+        _configured = True
+
+        return logger
+
+
+def _script_name():
+    """Name of the calling script, or ``None`` if there is not one
+    (interactive sessions, ``python -c`` and test runners).
+
+    """
+    argv = getattr(sys, 'argv', None)
+    if not argv:
+        return None
+
+    name = os.path.basename(argv[0])
+    if name in ('', '-c', '<stdin>', 'nosetests'):
+        name = None
+
+    return name
+
+
+class _LazyLogger(object):
+    """Stands in for the :class:`logging.Logger` until the logging
+    configuration is loaded on first use.
+
+    Logger methods are cached on the instance once resolved, so calls
+    such as ``log.debug`` cost no more than on the logger itself.
+
+    """
+    def __init__(self):
+        object.__setattr__(self, '_logger', None)
+
+    def _bind(self, logger):
+        self.__dict__.clear()
+        object.__setattr__(self, '_logger', logger)
+
+    def __getattr__(self, name):
+        logger = self._logger
+        if logger is None:
+            logger = configure()
+
+        value = getattr(logger, name)
+        if callable(value):
+            object.__setattr__(self, name, value)
+
+        return value
+
+    def __setattr__(self, name, value):
+        logger = self._logger
+        if logger is None:
+            logger = configure()
+
+        self.__dict__.pop(name, None)
+        setattr(logger, name, value)
+
+    def __repr__(self):
+        return '<%s %r>' % (self.__class__.__name__, self._logger)
+
+
+log = _LazyLogger()
+
+
+class LazyMessage(object):
+    """Log message (or message argument) that is only built if a
+    handler formats the record.
+
+    Log calls should pass their arguments separately rather than
+    formatting the message up front, so that nothing is built when the
+    level is filtered::
+
+        >>> log.debug('Moving "%s" to "%s"', source, target)
+
+    Where an argument is itself expensive to produce, wrap the function
+    that produces it with :func:`lazy`::
+
+        >>> log.debug('Template produced: %s', lazy(json.dumps, big_dict))
+
+    The value is built once, on first use, and then remembered.
+
+    """
+    __slots__ = ['_func', '_args', '_kwargs', '_value']
+
+    _unset = object()
+
+    def __init__(self, func, *args, **kwargs):
+        """:class:`LazyMessage` initialisation.
+        """
+        self._func = func
+        self._args = args
+        self._kwargs = kwargs
+        self._value = self._unset
+
+    def __str__(self):
+        if self._value is self._unset:
+            self._value = str(self._func(*self._args, **self._kwargs))
+
+        return self._value
+
+
+def lazy(func, *args, **kwargs):
+    """Defer ``func(*args, **kwargs)`` until the log record is
+    formatted.  See :class:`LazyMessage`.
+
+    """
+    return LazyMessage(func, *args, **kwargs)
 
 
 def set_console():
@@ -174,7 +330,23 @@ def enable_logging():
     logging.disable(logging.NOTSET)
 
 
-def autolog(message):
+# Call site details keyed by (code object, line number).  Each value is
+# a [<"function in file:line" string>, <call count>] pair.
+_call_sites = {}
+_autolog_sample = 1
+
+
+def set_autolog_sampling(every=1):
+    """Only log every *every*'th :func:`autolog` call from each call
+    site.  The default of ``1`` logs every call.
+
+    """
+    global _autolog_sample
+
+    _autolog_sample = max(1, int(every))
+
+
+def autolog(message, sample=None):
     """Automatically log the current function details.
 
     Used interchangeably with the ``log`` handler object.  Handy for
@@ -190,18 +362,638 @@ def autolog(message):
         >>> autolog('DEBUG message')
         2014-06-30 13:15:41,760 DEBUG:: DEBUG message: <module> in <stdin>:1
 
+    The call site string is built once per calling line and cached.
+
     **Args:**
         *message*: the log message to display
 
+    **Kwargs:**
+        *sample*: only log every *sample*'th call from this call site.
+        Defaults to the :func:`set_autolog_sampling` setting
+
     """
     if log.isEnabledFor(logging.DEBUG):
         # Get the previous frame in the stack.
         # Otherwise it would be this function!!!
-        f = inspect.currentframe().f_back.f_code
-        lineno = inspect.currentframe().f_back.f_lineno
+        frame = sys._getframe(1)
+        key = (frame.f_code, frame.f_lineno)
+        del frame
+
+        site = _call_sites.get(key)
+        if site is None:
+            code, lineno = key
+            site = ['%s in %s:%i' % (code.co_name, code.co_filename, lineno),
+                    0]
+            _call_sites[key] = site
+
+        if sample is None:
+            sample = _autolog_sample
+        if sample > 1:
+            site[1] += 1
+            if (site[1] - 1) % sample:
+                return
 
         # Dump the message function details to the log.
-        log.debug("%s: %s in %s:%i" % (message,
-                                       f.co_name,
-                                       f.co_filename,
-                                       lineno))
+        log.debug("%s: %s", message, site[0])
+
+
+class QueueHandler(logging.Handler):
+    """Handler that puts log records on a queue rather than formatting
+    and writing them.
+
+    Records are consumed by a :class:`QueueListener`.  Formatting is
+    deferred to the listener, so message arguments should not be
+    mutated after the log call.
+
+    .. attribute:: *policy*
+
+        what to do when a bounded queue is full.  ``block`` (default)
+        waits for space.  ``drop`` discards the record
+
+    .. attribute:: *dropped*
+
+        number of records discarded under the ``drop`` policy
+
+    """
+    def __init__(self, queue, policy='block'):
+        """:class:`QueueHandler` initialisation.
+        """
+        if policy not in ('block', 'drop'):
+            raise ValueError('Unsupported queue policy "%s"' % policy)
+
+        logging.Handler.__init__(self)
+        self.queue = queue
+        self.policy = policy
+        self.dropped = 0
+
+    def emit(self, record):
+        if self.policy == 'drop':
+            try:
+                self.queue.put_nowait(record)
+            except Queue.Full:
+                self.dropped += 1
+        else:
+            self.queue.put(record)
+
+
+class QueueListener(object):
+    """Background thread that takes records off a queue filled by a
+    :class:`QueueHandler` and passes them to the target *handlers*.
+
+    """
+    _sentinel = None
+
+    def __init__(self, queue, *handlers):
+        """:class:`QueueListener` initialisation.
+        """
+        self.queue = queue
+        self.handlers = handlers
+        self._thread = None
+
+    def start(self):
+        """Start the listener thread.
+        """
+        self._thread = threading.Thread(target=self._monitor,
+                                        name='geosutils-log-listener')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Process all of the queued records, flush the target handlers
+        and stop the listener thread.
+
+        """
+        if self._thread is None:
+            return
+
+        self.queue.put(self._sentinel)
+        self._thread.join()
+        self._thread = None
+
+    def handle(self, record):
+        for handler in self.handlers:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+    def flush(self):
+        for handler in self.handlers:
+            handler.flush()
+
+    def _monitor(self):
+        get = self.queue.get
+        get_nowait = self.queue.get_nowait
+        while True:
+            record = get()
+            # Drain whatever else is queued before flushing.
+            while True:
+                if record is self._sentinel:
+                    self.flush()
+                    return
+                self.handle(record)
+                try:
+                    record = get_nowait()
+                except Queue.Empty:
+                    break
+            self.flush()
+
+
+_async = {}
+_async_lock = threading.Lock()
+
+
+def enable_async_logging(maxsize=10000, policy='block', logger=None):
+    """Take log record formatting and I/O off the calling thread.
+
+    The handlers of *logger* (defaults to :data:`log`) are moved to a
+    :class:`QueueListener` thread and replaced with a
+    :class:`QueueHandler`.  Queued records are flushed by
+    :func:`disable_async_logging`, which is also called at exit::
+
+        >>> from geosutils.log import log, enable_async_logging
+        >>> enable_async_logging(maxsize=50000, policy='drop')
+        >>> log.info('Written by the listener thread')
+
+    **Kwargs:**
+        *maxsize*: maximum number of queued records.  ``0`` means
+        unbounded
+
+        *policy*: ``block`` or ``drop`` records when the queue is full
+
+        *logger*: the :class:`logging.Logger` to make asynchronous
+
+    **Returns:**
+        the :class:`QueueHandler`
+
+    """
+    if logger is None:
+        logger = configure()
+
+    with _async_lock:
+        if logger in _async:
+            return _async[logger][0]
+
+        queue = Queue.Queue(maxsize)
+        handlers = list(logger.handlers)
+        handler = QueueHandler(queue, policy=policy)
+        listener = QueueListener(queue, *handlers)
+        listener.start()
+
+        for hdlr in handlers:
+            logger.removeHandler(hdlr)
+        logger.addHandler(handler)
+        _async[logger] = (handler, listener)
+
+    return handler
+
+
+def disable_async_logging(logger=None):
+    """Flush any queued records and restore the synchronous handlers
+    of *logger* (defaults to :data:`log`).
+
+    """
+    if logger is None:
+        logger = configure()
+
+    with _async_lock:
+        handler, listener = _async.pop(logger, (None, None))
+        if handler is None:
+            return
+
+        # Restore the handlers before stopping the listener so that no
+        # records are lost in between.
+        for hdlr in listener.handlers:
+            logger.addHandler(hdlr)
+        logger.removeHandler(handler)
+        listener.stop()
+
+    if handler.dropped:
+        logger.warn('Async logging dropped %d records' % handler.dropped)
+
+
+def _shutdown_async_logging():
+    for logger in list(_async):
+        disable_async_logging(logger)
+
+
+atexit.register(_shutdown_async_logging)
+
+
+class RateLimitFilter(logging.Filter):
+    """Filter that caps the number of records logged from each call
+    site (or message template) per interval.
+
+    Records are grouped by call site -- the source file and line of the
+    log call.  A limit set via :meth:`set_limit` for a message template
+    (for example, ``'Moving "%s" to "%s"'``) or a (*pathname*,
+    *lineno*) call site overrides the defaults for those records.
+
+    When records have been suppressed, a summary line reporting the
+    count is logged by the first record (from any call site) after the
+    interval ends and by :meth:`flush`.
+
+    .. attribute:: *rate*
+
+        maximum number of records per interval.  ``None`` for no limit
+
+    .. attribute:: *per*
+
+        the interval, in seconds
+
+    .. attribute:: *sample*
+
+        only consider every *sample*'th record (``1`` for every record)
+
+    .. attribute:: *max_level*
+
+        records above this level are never limited
+
+    """
+    def __init__(self,
+                 rate=100,
+                 per=60.0,
+                 sample=1,
+                 max_level=logging.INFO,
+                 logger=None):
+        """:class:`RateLimitFilter` initialisation.
+
+        **Kwargs:**
+            *logger*: the :class:`logging.Logger` that summary lines
+            are logged to.  Defaults to the logger of the suppressed
+            records
+
+        """
+        logging.Filter.__init__(self)
+        self.rate = rate
+        self.per = per
+        self.sample = sample
+        self.max_level = max_level
+        self._logger = logger
+        self._limits = {}
+
+        # Per key state of [<interval start>, <emitted in interval>,
+        # <seen>, <suppressed in interval>, <last record>, <interval>].
+        self._state = {}
+
+        # Earliest end of an interval with suppressed records.
+        self._next_due = None
+        self._lock = threading.Lock()
+
+    def set_limit(self, key, rate=100, per=60.0, sample=1):
+        """Override the limits for the message template or (*pathname*,
+        *lineno*) call site *key*.
+
+        """
+        with self._lock:
+            self._limits[key] = (rate, per, sample)
+
+    def filter(self, record):
+        if (record.levelno > self.max_level or
+           getattr(record, 'rate_limit_summary', False)):
+            return True
+
+        key = (record.pathname, record.lineno)
+        limit = self._limits.get(key)
+        if limit is None and self._limits:
+            try:
+                limit = self._limits.get(record.msg)
+            except TypeError:
+                pass
+            else:
+                if limit is not None:
+                    key = record.msg
+        if limit is None:
+            limit = (self.rate, self.per, self.sample)
+        rate, per, sample = limit
+
+        now = record.created
+        summaries = []
+        with self._lock:
+            if self._next_due is not None and now >= self._next_due:
+                summaries = self._due(now)
+
+            state = self._state.get(key)
+            if state is None:
+                state = [now, 0, 0, 0, record, per]
+                self._state[key] = state
+            elif now - state[0] >= per:
+                state[0] = now
+                state[1] = 0
+                state[3] = 0
+
+            state[2] += 1
+            allowed = ((state[2] - 1) % sample == 0 and
+                       (rate is None or state[1] < rate))
+            if allowed:
+                state[1] += 1
+            else:
+                state[3] += 1
+                due = state[0] + per
+                if self._next_due is None or due < self._next_due:
+                    self._next_due = due
+            state[4] = record
+            state[5] = per
+
+        for summary in summaries:
+            self._summarise(*summary)
+
+        return allowed
+
+    def _due(self, now):
+        """Start a new interval for every call site whose interval with
+        suppressed records has ended by *now*.
+
+        Must be called with :attr:`_lock` held.
+
+        **Returns:**
+            list of (*record*, *suppressed*, *elapsed*) summaries
+
+        """
+        summaries = []
+        next_due = None
+        for state in self._state.itervalues():
+            if not state[3]:
+                continue
+            if now - state[0] >= state[5]:
+                summaries.append((state[4], state[3], now - state[0]))
+                state[0] = now
+                state[1] = 0
+                state[3] = 0
+            elif next_due is None or state[0] + state[5] < next_due:
+                next_due = state[0] + state[5]
+        self._next_due = next_due
+
+        return summaries
+
+    def flush(self):
+        """Log the summary lines of all records suppressed in the
+        current intervals.
+
+        """
+        summaries = []
+        now = time.time()
+        with self._lock:
+            for state in self._state.itervalues():
+                if state[3]:
+                    summaries.append((state[4], state[3], now - state[0]))
+                    state[3] = 0
+            self._next_due = None
+
+        for summary in summaries:
+            self._summarise(*summary)
+
+    def _summarise(self, record, suppressed, elapsed):
+        summary = logging.LogRecord(record.name,
+                                    record.levelno,
+                                    record.pathname,
+                                    record.lineno,
+                                    'Suppressed %d messages like "%s" '
+                                    'in the last %.1f sec',
+                                    (suppressed, record.msg, elapsed),
+                                    None)
+        summary.rate_limit_summary = True
+
+        logger = self._logger
+        if logger is None:
+            name = record.name
+            logger = logging.getLogger(None if name == 'root' else name)
+        logger.handle(summary)
+
+
+_rate_limits = {}
+
+
+def enable_rate_limiting(rate=100,
+                         per=60.0,
+                         sample=1,
+                         max_level=logging.INFO,
+                         logger=None):
+    """Limit each call site of *logger* (defaults to :data:`log`) to
+    *rate* records every *per* seconds, sampling every *sample*'th
+    record.  Records above *max_level* are not limited::
+
+        >>> from geosutils.log import enable_rate_limiting
+        >>> limiter = enable_rate_limiting(rate=10, per=60.0)
+        >>> # Sample the per file lines of bulk moves instead.
+        >>> limiter.set_limit('Moving "%s" to "%s"', rate=None, sample=1000)
+
+    **Returns:**
+        the :class:`RateLimitFilter`, which can be used to set limits
+        for specific message templates or call sites
+
+    """
+    if logger is None:
+        logger = configure()
+
+    with _async_lock:
+        limiter = _rate_limits.get(logger)
+        if limiter is None:
+            limiter = RateLimitFilter(rate=rate,
+                                      per=per,
+                                      sample=sample,
+                                      max_level=max_level,
+                                      logger=logger)
+            logger.addFilter(limiter)
+            _rate_limits[logger] = limiter
+
+    return limiter
+
+
+def disable_rate_limiting(logger=None):
+    """Log any outstanding suppressed record summaries and remove the
+    rate limit from *logger* (defaults to :data:`log`).
+
+    """
+    if logger is None:
+        logger = configure()
+
+    with _async_lock:
+        limiter = _rate_limits.pop(logger, None)
+
+    if limiter is not None:
+        logger.removeFilter(limiter)
+        limiter.flush()
+
+
+def _flush_rate_limits():
+    for limiter in list(_rate_limits.values()):
+        limiter.flush()
+
+
+# Registered after _shutdown_async_logging so that it runs first.
+atexit.register(_flush_rate_limits)
+
+
+# Imported on first use to keep the import of this module cheap.
+json = None
+
+
+def metrics(op, path=None, nbytes=None, duration=None, **fields):
+    """Build the ``extra`` argument of a log call that attaches
+    structured fields to the record for the :class:`JSONFormatter`::
+
+        >>> log.info('Moving "%s" to "%s"', source, target,
+        ...          extra=metrics('move', source, nbytes=size,
+        ...                        duration=elapsed, target=target))
+
+    Other formatters ignore the fields.
+
+    **Args:**
+        *op*: name of the operation
+
+    **Kwargs:**
+        *path*: the file path operated on
+
+        *nbytes*: number of bytes processed (the ``bytes`` field)
+
+        *duration*: elapsed time of the operation in seconds (the
+        ``duration_ms`` field)
+
+        *fields*: any other fields to include
+
+    """
+    values = {'op': op}
+    if path is not None:
+        values['path'] = path
+    if nbytes is not None:
+        values['bytes'] = int(nbytes)
+    if duration is not None:
+        values['duration_ms'] = round(duration * 1000.0, 3)
+    values.update(fields)
+
+    return {'fields': values}
+
+
+class JSONFormatter(logging.Formatter):
+    """Formats each record as a single line JSON object.
+
+    Every object has the ``time`` (ISO 8601, UTC), ``level``,
+    ``logger`` and ``message`` keys, along with any fields attached to
+    the record via :func:`metrics` and ``exc`` for exception details.
+
+    """
+    def format(self, record):
+        global json
+        if json is None:
+            import json
+
+        data = {
+            'time': datetime.datetime.utcfromtimestamp(
+                record.created).isoformat() + 'Z',
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+
+        fields = getattr(record, 'fields', None)
+        if fields:
+            data.update(fields)
+
+        if record.exc_info:
+            data['exc'] = self.formatException(record.exc_info)
+
+        return json.dumps(data, sort_keys=True, default=str)
+
+
+class BufferedJSONHandler(logging.Handler):
+    """Handler that writes newline-delimited JSON records in batches.
+
+    Formatted records are buffered and written in a single write once
+    *capacity* records are buffered or *flush_interval* seconds have
+    passed since the last write, whichever comes first.  The buffer is
+    also flushed on :meth:`close` (and so at exit).
+
+    Can be set up in ``log.conf``::
+
+        [handler_json]
+        class=geosutils.log.BufferedJSONHandler
+        args=('/var/log/geoingest.json', 1000, 1.0)
+
+    """
+    def __init__(self,
+                 filename=None,
+                 capacity=1000,
+                 flush_interval=1.0,
+                 stream=None):
+        """:class:`BufferedJSONHandler` initialisation.
+
+        **Kwargs:**
+            *filename*: file to append records to
+
+            *capacity*: number of records to buffer before writing
+
+            *flush_interval*: maximum number of seconds to hold a
+            record before writing.  ``None`` to only flush on capacity
+
+            *stream*: file-like object to write to instead of
+            *filename*
+
+        """
+        logging.Handler.__init__(self)
+        self.setFormatter(JSONFormatter())
+
+        self._own_stream = stream is None
+        if stream is None:
+            stream = open(filename, 'a')
+        self.stream = stream
+        self.capacity = capacity
+        self.flush_interval = flush_interval
+
+        self._buffer = []
+        self._last_flush = time.time()
+        self._closed = threading.Event()
+        self._flusher = None
+        if flush_interval is not None:
+            self._flusher = threading.Thread(target=self._flush_timer,
+                                             name='geosutils-json-flush')
+            self._flusher.daemon = True
+            self._flusher.start()
+
+    def emit(self, record):
+        try:
+            self._buffer.append(self.format(record))
+        except Exception:
+            self.handleError(record)
+            return
+
+        if (len(self._buffer) >= self.capacity or
+           (self.flush_interval is not None and
+            time.time() - self._last_flush >= self.flush_interval)):
+            self.flush()
+
+    def flush(self):
+        self.acquire()
+        try:
+            if self._buffer:
+                lines = self._buffer
+                self._buffer = []
+                try:
+                    self.stream.write('\n'.join(lines) + '\n')
+                    self.stream.flush()
+                except (IOError, ValueError):
+                    # As per logging.Handler.handleError, which needs a
+                    # record.
+                    if logging.raiseExceptions:
+                        import traceback
+                        traceback.print_exc()
+            self._last_flush = time.time()
+        finally:
+            self.release()
+
+    def close(self):
+        if not self._closed.is_set():
+            self._closed.set()
+            if self._flusher is not None:
+                self._flusher.join()
+            self.flush()
+            if self._own_stream:
+                self.stream.close()
+
+        logging.Handler.close(self)
+
+    def _flush_timer(self):
+        while True:
+            self._closed.wait(self.flush_interval)
+            if self._closed.is_set():
+                break
+            if time.time() - self._last_flush >= self.flush_interval:
+                self.flush()
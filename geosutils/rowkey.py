@@ -0,0 +1,295 @@
+"""Composite spatial row key construction.
+
+Row keys are assembled from the components named in the
+``[spatial] order`` configuration option:
+
+* **geohash** -- base32 geohash of the record's latitude/longitude
+* **reverse_time** -- :func:`geosutils.utils.get_reverse_timestamp` of
+  the record's UTC time
+* **stripe** -- :func:`geosutils.utils.hashcode` based salt in the range
+  ``[0, stripes)``, zero padded to a fixed width
+
+Every component is fixed width so keys sort lexicographically by
+component.  For example::
+
+    >>> from geosutils.rowkey import RowKeyBuilder
+    >>> builder = RowKeyBuilder('geohash,reverse_time,stripe', stripes=10)
+    >>> builder.build(-37.8136, 144.9631, '19961217102630', 'item-1')
+    'r1r0fsnzv41c092225212184647758079'
+
+"""
+__all__ = [
+    "RowKeyBuilder",
+    "geohash_encode",
+    "geohash_encode_many",
+]
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from geosutils.log import log
+from geosutils.utils import (hashcodes,
+                             get_reverse_timestamps,
+                             _hashcode,
+                             _reverse_timestamp)
+
+GEOHASH_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+COMPONENTS = ('geohash', 'reverse_time', 'stripe')
+
+
+def geohash_encode(latitude, longitude, precision=12):
+    """Encode *latitude*/*longitude* as a geohash of *precision*
+    characters.
+
+    The coordinates are quantised to the geohash grid and the bits
+    interleaved in one go rather than bisecting per bit.
+
+    """
+    lon_bits, lat_bits = _geohash_bits(precision)
+    lat_code = _quantise(latitude, -90.0, 180.0, lat_bits)
+    lon_code = _quantise(longitude, -180.0, 360.0, lon_bits)
+
+    code = 0
+    for bit in range(lon_bits + lat_bits):
+        # Bits alternate from longitude, starting at the most
+        # significant.
+        if bit % 2 == 0:
+            value = (lon_code >> (lon_bits - 1 - bit // 2)) & 1
+        else:
+            value = (lat_code >> (lat_bits - 1 - bit // 2)) & 1
+        code = (code << 1) | value
+
+    chars = []
+    for index in range(precision - 1, -1, -1):
+        chars.append(GEOHASH_BASE32[(code >> (index * 5)) & 0x1F])
+
+    return ''.join(chars)
+
+
+def geohash_encode_many(latitudes, longitudes, precision=12):
+    """Batch variant of :func:`geohash_encode`.
+
+    Vectorised if :mod:`numpy` is available.
+
+    **Returns:**
+        list of geohash strings
+
+    """
+    if numpy is None:
+        return [geohash_encode(lat, lon, precision)
+                for lat, lon in zip(latitudes, longitudes)]
+
+    lon_bits, lat_bits = _geohash_bits(precision)
+    lat_code = _quantise_array(latitudes, -90.0, 180.0, lat_bits)
+    lon_code = _quantise_array(longitudes, -180.0, 360.0, lon_bits)
+
+    code = numpy.zeros(len(lat_code), dtype=numpy.uint64)
+    one = numpy.uint64(1)
+    for bit in range(lon_bits + lat_bits):
+        if bit % 2 == 0:
+            shift = numpy.uint64(lon_bits - 1 - bit // 2)
+            value = (lon_code >> shift) & one
+        else:
+            shift = numpy.uint64(lat_bits - 1 - bit // 2)
+            value = (lat_code >> shift) & one
+        code = (code << one) | value
+
+    alphabet = numpy.frombuffer(GEOHASH_BASE32, dtype=numpy.uint8)
+    chars = numpy.empty((len(code), precision), dtype=numpy.uint8)
+    mask = numpy.uint64(0x1F)
+    for index in range(precision):
+        shift = numpy.uint64((precision - 1 - index) * 5)
+        chars[:, index] = alphabet[((code >> shift) & mask).astype(int)]
+
+    return chars.view('S%d' % precision).ravel().tolist()
+
+
+class RowKeyBuilder(object):
+    """Compiles a row key component ordering into a key assembly
+    function.
+
+    .. attribute:: *order*
+
+        tuple of the component names in key order
+
+    .. attribute:: *stripes*
+
+        number of stripes to salt keys across
+
+    .. attribute:: *precision*
+
+        number of geohash characters
+
+    """
+    def __init__(self,
+                 order='geohash,reverse_time,stripe',
+                 stripes=10,
+                 precision=12,
+                 separator=''):
+        """:class:`RowKeyBuilder` initialisation.
+
+        **Kwargs:**
+            *order*: comma separated string (or sequence) of the
+            component names
+
+            *stripes*: number of stripes
+
+            *precision*: number of geohash characters
+
+            *separator*: string placed between components
+
+        """
+        if isinstance(order, basestring):
+            order = order.split(',')
+        order = tuple(c.strip() for c in order)
+        for component in order:
+            if component not in COMPONENTS:
+                raise ValueError('Unknown row key component "%s"' %
+                                 component)
+
+        self._order = order
+        self._stripes = stripes
+        self._precision = precision
+        self._separator = separator
+        self._stripe_width = len(str(max(stripes - 1, 0)))
+        self._template = separator.join(['%s'] * len(order))
+        self.build = self._compile()
+
+    @classmethod
+    def from_config(cls, config, section='spatial', **kwargs):
+        """Create a :class:`RowKeyBuilder` from the ``order`` and
+        ``stripes`` options of *section* in the
+        :class:`geosutils.config.Config` *config*.
+
+        """
+        order = config.get_list(section, 'order', default=COMPONENTS)
+        stripes = config.get_int(section, 'stripes', default=10)
+        log.debug('Row key order %s across %d stripes', order, stripes)
+
+        return cls(order=order, stripes=stripes, **kwargs)
+
+    @property
+    def order(self):
+        return self._order
+
+    @property
+    def stripes(self):
+        return self._stripes
+
+    @property
+    def precision(self):
+        return self._precision
+
+    def _compile(self):
+        """Generate the function that assembles a single key.
+
+        **Returns:**
+            function of (*latitude*, *longitude*, *utc_time*,
+            *stripe_key*) that returns the row key, or ``None`` if
+            *utc_time* cannot be converted.  *stripe_key* is the
+            string hashed into the stripe (defaults to the geohash).
+            No logging is performed per key
+
+        """
+        template = self._template
+        precision = self._precision
+        stripes = self._stripes
+        stripe_format = '%%0%dd' % self._stripe_width
+        order = self._order
+
+        def build(latitude, longitude, utc_time, stripe_key=None):
+            geohash = geohash_encode(latitude, longitude, precision)
+            parts = {'geohash': geohash}
+            if 'reverse_time' in order:
+                reverse_ts = _reverse_timestamp(utc_time)
+                if reverse_ts is None:
+                    return None
+                parts['reverse_time'] = reverse_ts
+            if 'stripe' in order:
+                if stripe_key is None:
+                    stripe_key = geohash
+                parts['stripe'] = stripe_format % (_hashcode(stripe_key) %
+                                                   stripes)
+
+            return template % tuple(parts[c] for c in order)
+
+        # Specialise the common, fully populated ordering to avoid the
+        # intermediate dictionary.
+        if order == COMPONENTS:
+            sep = self._separator
+
+            def build(latitude, longitude, utc_time, stripe_key=None):
+                reverse_ts = _reverse_timestamp(utc_time)
+                if reverse_ts is None:
+                    return None
+                geohash = geohash_encode(latitude, longitude, precision)
+                if stripe_key is None:
+                    stripe_key = geohash
+                return (geohash + sep +
+                        reverse_ts + sep +
+                        stripe_format % (_hashcode(stripe_key) % stripes))
+
+        return build
+
+    def build_many(self, latitudes, longitudes, utc_times, stripe_keys=None):
+        """Batch variant of :meth:`build` for large record sets.
+
+        Each component is generated for the whole batch at once via
+        :func:`geohash_encode_many`,
+        :func:`geosutils.utils.get_reverse_timestamps` and
+        :func:`geosutils.utils.hashcodes`.
+
+        **Returns:**
+            list of row keys.  Records with a *utc_time* that cannot be
+            converted have a key of ``None``
+
+        """
+        geohashes = geohash_encode_many(latitudes,
+                                        longitudes,
+                                        self._precision)
+        columns = {'geohash': geohashes}
+
+        if 'reverse_time' in self._order:
+            columns['reverse_time'] = get_reverse_timestamps(utc_times)
+
+        if 'stripe' in self._order:
+            if stripe_keys is None:
+                stripe_keys = geohashes
+            stripe_format = '%%0%dd' % self._stripe_width
+            columns['stripe'] = [stripe_format % (code % self._stripes)
+                                 for code in hashcodes(stripe_keys)]
+
+        template = self._template
+        keys = [template % parts
+                for parts in zip(*[columns[c] for c in self._order])]
+
+        reverse_ts = columns.get('reverse_time')
+        if reverse_ts is not None:
+            keys = [None if r is None else k
+                    for k, r in zip(keys, reverse_ts)]
+
+        return keys
+
+
+def _geohash_bits(precision):
+    total = precision * 5
+    lat_bits = total // 2
+
+    return total - lat_bits, lat_bits
+
+
+def _quantise(value, minimum, span, bits):
+    cells = 1 << bits
+    code = int((value - minimum) / span * cells)
+
+    return min(max(code, 0), cells - 1)
+
+
+def _quantise_array(values, minimum, span, bits):
+    cells = 1 << bits
+    values = numpy.asarray(values, dtype=numpy.float64)
+    code = numpy.floor((values - minimum) / span * cells)
+
+    return numpy.clip(code, 0, cells - 1).astype(numpy.uint64)
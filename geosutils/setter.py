@@ -8,13 +8,53 @@ __all__ = [
     "set_date",
     "set_list",
     "set_dict",
+    "TypedAttribute",
+    "ScalarAttribute",
+    "DateAttribute",
+    "TupleAttribute",
+    "ListAttribute",
+    "DictAttribute",
+    "parse_date",
+    "parse_dates",
+    "set_date_policy",
+    "assign",
 ]
-import inspect
 import time
+import logging
 import datetime
+import threading
+import collections
 
 from geosutils.log import log
 
+TYPE_CHECKS = {
+    'scalar': lambda v: not isinstance(v, (list, dict)),
+    'date': lambda v: not isinstance(v, (list, dict)),
+    'tuple': lambda v: isinstance(v, tuple),
+    'list': lambda v: isinstance(v, list),
+    'dict': lambda v: isinstance(v, dict),
+}
+
+# Value substituted for a None assignment.
+EMPTY_VALUES = {
+    'tuple': tuple,
+    'list': list,
+    'dict': dict,
+}
+
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# How a parsed date string is interpreted:
+#   local -- local time, normalised through the system clock (default)
+#   naive -- the date fields as is, independent of the local timezone
+#   utc -- local time, converted to a naive UTC datetime
+DATE_POLICIES = ('local', 'naive', 'utc')
+DATE_CACHE_SIZE = 4096
+
+_date_policy = 'local'
+_date_cache = collections.OrderedDict()
+_date_cache_lock = threading.Lock()
+
 
 def setter(f, attr_type):
     """Decorator to be used in a context that sets an attribute value.
@@ -44,52 +84,47 @@ def setter(f, attr_type):
             pass
 
     """
+    # Resolve everything that does not depend on the call up front.
+    attr_name = f.__name__.replace('set_', '')
+    private_name = '_%s' % attr_name
+    is_valid = TYPE_CHECKS[attr_type]
+    empty = EMPTY_VALUES.get(attr_type)
+    verified_classes = set()
+
     def wrapped(self, *args):
-        # Test that the value is a scalar.
         value = args[0]
-        if attr_type == 'tuple' and value is None:
-            value = ()
-        elif attr_type == 'list' and value is None:
-            value = []
-        elif attr_type == 'dict' and value is None:
-            value = {}
-
-        type_check = False
-        if ((not isinstance(value, (list, dict)) and
-            (attr_type == 'scalar' or attr_type == 'date')) or
-           (type(value) is datetime.datetime and attr_type == 'date') or
-           (isinstance(value, tuple) and attr_type == 'tuple') or
-           (isinstance(value, list) and attr_type == 'list') or
-           (isinstance(value, dict) and attr_type == 'dict')):
-            type_check = True
-
-        if not type_check:
+        if value is None and empty is not None:
+            value = empty()
+
+        if not is_valid(value):
             raise TypeError('"%s" is not a %s' % (str(value), attr_type))
-        else:
-            method_name = f.__name__
-            method_name = method_name.replace('set_', '')
 
-            # Special processing for dates.
-            if (attr_type == 'date' and value is not None):
-                if type(value) is not datetime.datetime:
-                    tmp_t = time.strptime(value, "%Y-%m-%d %H:%M:%S")
-                    value = datetime.datetime.fromtimestamp(time.mktime(tmp_t))
+        # Special processing for dates.
+        if attr_type == 'date':
+            value = parse_date(value)
 
-            try:
-                getattr(self, '_%s' % method_name)
-                setattr(self, '_%s' % method_name, value)
-            except AttributeError:
-                raise
+        # Only set attributes that already exist.  Classes that declare
+        # the attribute need only be checked once.
+        cls = self.__class__
+        if cls not in verified_classes:
+            if hasattr(cls, private_name):
+                verified_classes.add(cls)
+            else:
+                getattr(self, private_name)
+        setattr(self, private_name, value)
 
+        if log.isEnabledFor(logging.DEBUG):
             if isinstance(value, (int, long, float, complex)):
-                log.debug('%s.%s set to %s' %
-                          (class_name(), method_name, str(value)))
+                log.debug('%s.%s set to %s', cls.__name__, attr_name, value)
             else:
-                log.debug('%s.%s set to "%s"' %
-                          (class_name(), method_name, value))
+                log.debug('%s.%s set to "%s"', cls.__name__, attr_name, value)
 
         return(f(self, *args))
 
+    # Metadata for the bulk assign() path.
+    wrapped.typed_attribute = TypedAttribute(attr_name, attr_type)
+    wrapped.setter_body = None if _is_noop(f) else f
+
     return wrapped
 
 
@@ -113,6 +148,386 @@ def set_dict(f):
     return(setter(f, attr_type='dict'))
 
 
-def class_name():
-    stack = inspect.stack()
-    return stack[1][0].f_locals['self'].__class__.__name__
+def set_date_policy(policy='local', cache_size=None):
+    """Set how :func:`parse_date` interprets date strings.
+
+    **Kwargs:**
+        *policy*: one of ``local`` (the default -- local time,
+        normalised via :func:`time.mktime`), ``naive`` (the date
+        fields as is, independent of the timezone) or ``utc`` (local
+        time, converted to a naive UTC datetime)
+
+        *cache_size*: maximum number of parsed values to remember
+
+    """
+    global _date_policy, DATE_CACHE_SIZE
+
+    if policy not in DATE_POLICIES:
+        raise ValueError('Unknown date policy "%s"' % policy)
+
+    with _date_cache_lock:
+        _date_policy = policy
+        if cache_size is not None:
+            DATE_CACHE_SIZE = cache_size
+        _date_cache.clear()
+
+
+def parse_date(value):
+    """Convert the ``%Y-%m-%d %H:%M:%S`` string *value* into a
+    :class:`datetime.datetime` as per the :func:`set_date_policy`
+    policy.  ``None`` and :class:`datetime.datetime` values are
+    returned as is.
+
+    The fixed format is sliced directly rather than via
+    :func:`time.strptime`, and the most recently parsed values are
+    memoised.
+
+    """
+    if value is None or type(value) is datetime.datetime:
+        return value
+
+    try:
+        with _date_cache_lock:
+            result = _date_cache.pop(value)
+            _date_cache[value] = result
+        return result
+    except KeyError:
+        pass
+    except TypeError:
+        # Unhashable, so let the parser reject it.
+        return _parse_date(value, _date_policy)
+
+    result = _parse_date(value, _date_policy)
+    with _date_cache_lock:
+        _date_cache[value] = result
+        while len(_date_cache) > DATE_CACHE_SIZE:
+            _date_cache.popitem(last=False)
+
+    return result
+
+
+def parse_dates(values):
+    """Batch variant of :func:`parse_date` for lists of date strings.
+
+    Repeated values within *values* are only parsed once.
+
+    **Returns:**
+        list of :class:`datetime.datetime` objects
+
+    """
+    policy = _date_policy
+    parsed = {None: None}
+    results = []
+    for value in values:
+        try:
+            result = parsed[value]
+        except KeyError:
+            if type(value) is datetime.datetime:
+                result = value
+            else:
+                result = _parse_date(value, policy)
+            parsed[value] = result
+        results.append(result)
+
+    return results
+
+
+def _parse_date(value, policy):
+    tmp_t = None
+    if (isinstance(value, basestring) and
+       len(value) == 19 and
+       value[4] == '-' and value[7] == '-' and value[10] == ' ' and
+       value[13] == ':' and value[16] == ':' and
+       (value[0:4] + value[5:7] + value[8:10] +
+        value[11:13] + value[14:16] + value[17:19]).isdigit()):
+        try:
+            result = datetime.datetime(int(value[0:4]),
+                                       int(value[5:7]),
+                                       int(value[8:10]),
+                                       int(value[11:13]),
+                                       int(value[14:16]),
+                                       int(value[17:19]))
+        except ValueError:
+            # Leave fields datetime rejects (such as a leap second) to
+            # time.strptime.
+            result = None
+
+        if result is not None:
+            if policy == 'naive':
+                return result
+            tmp_t = result.timetuple()
+
+    if tmp_t is None:
+        tmp_t = time.strptime(value, DATE_FORMAT)
+        if policy == 'naive':
+            # Roll leap seconds into the next minute, as mktime does.
+            return (datetime.datetime(*tmp_t[:5]) +
+                    datetime.timedelta(seconds=tmp_t[5]))
+
+    if policy == 'utc':
+        return datetime.datetime.utcfromtimestamp(time.mktime(tmp_t))
+
+    return datetime.datetime.fromtimestamp(time.mktime(tmp_t))
+
+
+class TypedAttribute(object):
+    """Data descriptor alternative to the ``@property``/``@set_*``
+    decorator pairs, with the same type semantics.
+
+    The value is stored in the attribute named ``_<name>``, so the
+    descriptor can be used with ``__slots__`` classes to avoid the
+    per-instance ``__dict__``::
+
+        from geosutils.setter import ScalarAttribute, ListAttribute
+
+        class Record(object):
+            __slots__ = ['_id', '_tags']
+
+            id = ScalarAttribute('id')
+            tags = ListAttribute('tags')
+
+        record = Record()
+        record.id = 1
+        record.tags = None  # record.tags == []
+
+    Reading an attribute that has not been set returns *default*.
+
+    .. attribute:: *name*
+
+        public attribute name
+
+    .. attribute:: *attr_type*
+
+        one of ``scalar``, ``date``, ``tuple``, ``list`` or ``dict``
+
+    .. attribute:: *validate*
+
+        if ``False``, assignments are stored without type checks or
+        conversion.  Intended for trusted, bulk construction
+
+    """
+    __slots__ = ['_name', '_private_name', '_attr_type', '_default',
+                 '_validate', '_is_valid', '_empty']
+
+    def __init__(self, name, attr_type, default=None, validate=True):
+        """:class:`TypedAttribute` initialisation.
+        """
+        self._name = name
+        self._private_name = '_%s' % name
+        self._attr_type = attr_type
+        self._default = default
+        self._validate = validate
+        self._is_valid = TYPE_CHECKS[attr_type]
+        self._empty = EMPTY_VALUES.get(attr_type)
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def attr_type(self):
+        return self._attr_type
+
+    @property
+    def validate(self):
+        return self._validate
+
+    def __get__(self, obj, cls=None):
+        if obj is None:
+            return self
+
+        try:
+            return getattr(obj, self._private_name)
+        except AttributeError:
+            return self._default
+
+    def __set__(self, obj, value):
+        if self._validate:
+            value = self.convert(value)
+
+        setattr(obj, self._private_name, value)
+
+    def __delete__(self, obj):
+        delattr(obj, self._private_name)
+
+    def convert(self, value):
+        """Type check *value* and convert it to the stored form.
+
+        **Raises:**
+            :class:`TypeError` if *value* is not of the attribute type
+
+        """
+        if value is None and self._empty is not None:
+            value = self._empty()
+
+        if not self._is_valid(value):
+            raise TypeError('"%s" is not a %s' %
+                            (str(value), self._attr_type))
+
+        if self._attr_type == 'date':
+            value = parse_date(value)
+
+        return value
+
+
+class ScalarAttribute(TypedAttribute):
+    __slots__ = []
+
+    def __init__(self, name, default=None, validate=True):
+        TypedAttribute.__init__(self, name, 'scalar', default, validate)
+
+
+class DateAttribute(TypedAttribute):
+    __slots__ = []
+
+    def __init__(self, name, default=None, validate=True):
+        TypedAttribute.__init__(self, name, 'date', default, validate)
+
+
+class TupleAttribute(TypedAttribute):
+    __slots__ = []
+
+    def __init__(self, name, default=(), validate=True):
+        TypedAttribute.__init__(self, name, 'tuple', default, validate)
+
+
+class ListAttribute(TypedAttribute):
+    __slots__ = []
+
+    def __init__(self, name, default=None, validate=True):
+        TypedAttribute.__init__(self, name, 'list', default, validate)
+
+
+class DictAttribute(TypedAttribute):
+    __slots__ = []
+
+    def __init__(self, name, default=None, validate=True):
+        TypedAttribute.__init__(self, name, 'dict', default, validate)
+
+
+_assign_specs = {}
+_MISSING = object()
+
+
+def assign(obj, values, validate=True):
+    """Set many typed attributes of *obj* in a single pass.
+
+    *values* maps attribute names to values.  An attribute can be
+    backed either by a ``set_<name>`` decorated setter or by a
+    :class:`TypedAttribute` descriptor.  Every value is type checked
+    and converted before any attribute is changed, so a failure leaves
+    *obj* untouched.
+
+    The setter metadata of each class is gathered once and cached.
+    Bodies of decorated setters that do more than ``pass`` are still
+    called with the original value after assignment.
+
+    **Args:**
+        *obj*: the object to update
+
+        *values*: dictionary of attribute name/value pairs
+
+    **Kwargs:**
+        *validate*: set to ``False`` to skip the type checks and
+        conversion for trusted values
+
+    **Raises:**
+        :class:`AttributeError` if an attribute has no typed setter and
+        :class:`TypeError` if a value is not of the attribute type
+
+    """
+    cls = obj.__class__
+    specs = _assign_specs.get(cls)
+    if specs is None:
+        specs = _build_assign_specs(cls)
+        _assign_specs[cls] = specs
+
+    # Validate and convert everything up front.
+    pending = []
+    for name, value in values.iteritems():
+        try:
+            private_name, convert, setter_body, probe = specs[name]
+        except KeyError:
+            raise AttributeError("'%s' object has no typed attribute '%s'" %
+                                 (cls.__name__, name))
+
+        # As per the set_* decorators, attributes that the class does
+        # not declare must already exist on the instance.
+        if probe:
+            getattr(obj, private_name)
+
+        if validate:
+            pending.append((private_name, convert(value), value, setter_body))
+        else:
+            pending.append((private_name, value, value, setter_body))
+
+    # Apply, restoring the original values should anything fail.
+    applied = []
+    try:
+        for private_name, converted, value, setter_body in pending:
+            applied.append((private_name,
+                            getattr(obj, private_name, _MISSING)))
+            setattr(obj, private_name, converted)
+            if setter_body is not None:
+                setter_body(obj, value)
+    except Exception:
+        for private_name, old_value in reversed(applied):
+            if old_value is _MISSING:
+                if hasattr(obj, private_name):
+                    delattr(obj, private_name)
+            else:
+                setattr(obj, private_name, old_value)
+        raise
+
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug('%s assigned %d attributes', cls.__name__, len(pending))
+
+
+def _build_assign_specs(cls):
+    """Map the typed attribute names of *cls* to (*private_name*,
+    *convert*, *setter_body*, *probe*) tuples, where *probe* flags
+    setter backed attributes that *cls* does not declare.
+
+    """
+    specs = {}
+    for name in dir(cls):
+        member = getattr(cls, name, None)
+        if isinstance(member, TypedAttribute):
+            specs[name] = (member._private_name, member.convert, None, False)
+        else:
+            attribute = getattr(member, 'typed_attribute', None)
+            if (isinstance(attribute, TypedAttribute) and
+               attribute.name not in specs):
+                private_name = attribute._private_name
+                specs[attribute.name] = (private_name,
+                                         attribute.convert,
+                                         member.setter_body,
+                                         not hasattr(cls, private_name))
+
+    return specs
+
+
+def _is_noop(f):
+    """``True`` if the body of function *f* is only ``pass`` (and,
+    optionally, a docstring).
+
+    A docstring moves the implicit ``return None`` to a different
+    constant index, so the ``LOAD_CONST`` operand is checked against
+    the constants rather than comparing the bytecode outright.
+
+    """
+    code = f.func_code
+    noop = _noop.func_code.co_code
+
+    # LOAD_CONST <index>; RETURN_VALUE
+    if (len(code.co_code) != len(noop) or
+       code.co_code[0] != noop[0] or code.co_code[3:] != noop[3:]):
+        return False
+
+    index = ord(code.co_code[1]) | ord(code.co_code[2]) << 8
+
+    return code.co_consts[index] is None
+
+
+def _noop(*args):
+    pass
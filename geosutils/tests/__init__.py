@@ -2,3 +2,8 @@ from test_files import TestFiles
 from test_setter import TestSetter
 from test_utils import TestUtils
 from test_config import TestConfig
+from test_journal import TestJournal
+from test_throttle import TestThrottle
+from test_frozen import TestFrozen
+from test_rowkey import TestRowKey
+from test_log import TestLog
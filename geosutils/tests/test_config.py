@@ -3,6 +3,11 @@
 
 """
 import unittest2
+import StringIO
+import tempfile
+import threading
+import shutil
+import time
 import os
 
 import geosutils.config
@@ -23,8 +28,8 @@ class DummyConfig(geosutils.config.Config):
     _dummy_dict_key_as_lower = {}
     _dummy_dict_as_list = {}
 
-    def __init__(self, config_file):
-        geosutils.config.Config.__init__(self, config_file)
+    def __init__(self, config_file, cache_dir=None, lazy=False):
+        geosutils.config.Config.__init__(self, config_file, cache_dir, lazy)
 
     @property
     def dummy_key(self):
@@ -107,6 +112,11 @@ class DummyConfig(geosutils.config.Config):
         pass
 
 
+class CaseConfig(geosutils.config.Config):
+    def optionxform(self, option):
+        return option
+
+
 class TestConfig(unittest2.TestCase):
 
     @classmethod
@@ -408,6 +418,592 @@ class TestConfig(unittest2.TestCase):
         conf = None
         del conf
 
+    def test_parse_config_snapshot(self):
+        """Read config -- compiled snapshot cache.
+        """
+        cache_dir = tempfile.mkdtemp()
+        conf_dir = tempfile.mkdtemp()
+        conf_file = os.path.join(conf_dir, 'interpolate.conf')
+        shutil.copyfile(self._file, conf_file)
+        fh = open(conf_file, 'a')
+        fh.write('\n[interpolate]\n'
+                 'base: /var/tmp\n'
+                 'path: %(base)s/geoingest\n')
+        fh.close()
+
+        conf = geosutils.config.Config(conf_file, cache_dir=cache_dir)
+        received = conf.parse_config()
+        msg = 'Config read (snapshot write) did not return True'
+        self.assertTrue(received, msg)
+        msg = 'First config read should not come from a snapshot'
+        self.assertFalse(conf.from_snapshot, msg)
+        msg = 'Config snapshot file was not written'
+        self.assertTrue(os.path.exists(conf.snapshot_file()), msg)
+
+        conf = geosutils.config.Config(conf_file, cache_dir=cache_dir)
+        conf.parse_config()
+        msg = 'Second config read should come from the snapshot'
+        self.assertTrue(conf.from_snapshot, msg)
+
+        received = conf.get('interpolate', 'path')
+        expected = '/var/tmp/geoingest'
+        msg = 'Snapshot interpolated value error'
+        self.assertEqual(received, expected, msg)
+
+        received = dict(conf.items('dummy_dict_section'))
+        expected = {'dict_1': 'dict 1 value', 'dict_2': 'dict 2 value'}
+        msg = 'Snapshot section items error'
+        self.assertDictEqual(received, expected, msg)
+
+        received = conf.get('interpolate', 'path', raw=True)
+        expected = '%(base)s/geoingest'
+        msg = 'Snapshot raw value error'
+        self.assertEqual(received, expected, msg)
+
+        # Changes via set() are seen straight away.
+        conf.set('interpolate', 'base', '/data')
+        received = conf.get('interpolate', 'path')
+        expected = '/data/geoingest'
+        msg = 'Snapshot value after set error'
+        self.assertEqual(received, expected, msg)
+
+        # A change to the source file invalidates the snapshot.
+        fh = open(conf_file, 'a')
+        fh.write('extra: value\n')
+        fh.close()
+        conf = geosutils.config.Config(conf_file, cache_dir=cache_dir)
+        conf.parse_config()
+        msg = 'Changed config file should not come from the snapshot'
+        self.assertFalse(conf.from_snapshot, msg)
+        received = conf.get('interpolate', 'extra')
+        msg = 'Changed config file value error'
+        self.assertEqual(received, 'value', msg)
+
+        # Clean up.
+        shutil.rmtree(cache_dir)
+        shutil.rmtree(conf_dir)
+
+    def test_parse_config_snapshot_scalar_config(self):
+        """Parse a scalar from a snapshot-loaded configuration file.
+        """
+        cache_dir = tempfile.mkdtemp()
+        DummyConfig(self._file, cache_dir=cache_dir).parse_config()
+
+        conf = DummyConfig(self._file, cache_dir=cache_dir)
+        conf.parse_config()
+        received = conf.parse_scalar_config('int_section',
+                                            'int_key',
+                                            cast_type='int')
+        expected = 1234
+        msg = 'Parsed snapshot config scalar error: cast to int'
+        self.assertEqual(received, expected, msg)
+
+        kwargs = {'section': 'dummy_section',
+                  'option': 'missing_option',
+                  'is_required': True}
+        self.assertRaises(SystemExit, conf.parse_scalar_config, **kwargs)
+
+        # Clean up.
+        shutil.rmtree(cache_dir)
+
+    def test_reload(self):
+        """Reload a changed configuration file.
+        """
+        conf_dir = tempfile.mkdtemp()
+        conf_file = os.path.join(conf_dir, 'reload.conf')
+        fh = open(conf_file, 'w')
+        fh.write('[ingest]\nthreads: 10\nthread_sleep: 0.5\n')
+        fh.close()
+
+        conf = geosutils.config.Config(conf_file)
+        conf.parse_config()
+        diffs = []
+        conf.add_reload_callback(lambda c, d: diffs.append(d))
+
+        received = conf.reload()
+        msg = 'Reload of an unchanged config file should return None'
+        self.assertIsNone(received, msg)
+
+        fh = open(conf_file, 'w')
+        fh.write('[ingest]\nthreads: 20\nshards: 4\n')
+        fh.close()
+
+        received = conf.reload()
+        expected = {('ingest', 'threads'): ('10', '20'),
+                    ('ingest', 'thread_sleep'): ('0.5', None),
+                    ('ingest', 'shards'): (None, '4')}
+        msg = 'Config reload diff error'
+        self.assertDictEqual(received, expected, msg)
+        msg = 'Config reload callback diff error'
+        self.assertListEqual(diffs, [expected], msg)
+
+        received = conf.get('ingest', 'threads')
+        msg = 'Config reload new value error'
+        self.assertEqual(received, '20', msg)
+        msg = 'Config reload removed option error'
+        self.assertFalse(conf.has_option('ingest', 'thread_sleep'), msg)
+
+        # Clean up.
+        shutil.rmtree(conf_dir)
+
+    def test_reload_is_atomic(self):
+        """Reload a changed configuration file -- concurrent readers.
+        """
+        conf_dir = tempfile.mkdtemp()
+        conf_file = os.path.join(conf_dir, 'reload.conf')
+        contents = ('[DEFAULT]\nbase: a\n[ingest]\ndir: %(base)s1\n',
+                    '[DEFAULT]\nbase: bb\n[ingest]\ndir: %(base)s2\n')
+        fh = open(conf_file, 'w')
+        fh.write(contents[0])
+        fh.close()
+
+        conf = geosutils.config.Config(conf_file)
+        conf.parse_config()
+
+        received = set()
+        done = threading.Event()
+
+        def reader():
+            while not done.is_set():
+                received.add(conf.items('ingest')[-1][1])
+                received.add(conf.get('ingest', 'dir', raw=False))
+
+        readers = [threading.Thread(target=reader) for _ in range(4)]
+        for thread in readers:
+            thread.start()
+        try:
+            for index in range(50):
+                fh = open(conf_file, 'w')
+                fh.write(contents[(index + 1) % 2])
+                fh.close()
+                conf.reload()
+        finally:
+            done.set()
+            for thread in readers:
+                thread.join()
+
+        msg = 'Concurrent readers should not see mixed old/new config'
+        self.assertTrue(received.issubset(set(['a1', 'bb2'])), msg)
+
+        # Clean up.
+        shutil.rmtree(conf_dir)
+
+    def test_reload_no_config_file(self):
+        """Reload a configuration without a config file.
+        """
+        conf = geosutils.config.Config()
+        conf.readfp(StringIO.StringIO('[ingest]\nthreads: 10\n'))
+
+        received = conf.reload()
+        msg = 'Reload without a config file should return None'
+        self.assertIsNone(received, msg)
+
+    def test_reload_optionxform(self):
+        """Reload a changed configuration file -- case preserving options.
+        """
+        conf_dir = tempfile.mkdtemp()
+        conf_file = os.path.join(conf_dir, 'reload.conf')
+        fh = open(conf_file, 'w')
+        fh.write('[ingest]\nThreads: 10\n')
+        fh.close()
+
+        for mtime, layered in enumerate((False, True)):
+            conf = CaseConfig(conf_file)
+            if layered:
+                conf.parse_layers([conf_file])
+            else:
+                conf.parse_config()
+
+            os.utime(conf_file, (mtime, mtime))
+            received = conf.reload()
+            msg = 'Unchanged case preserved options should not differ'
+            self.assertDictEqual(received, {}, msg)
+
+            received = conf.get('ingest', 'Threads')
+            msg = 'Case preserved option after reload error'
+            self.assertEqual(received, '10', msg)
+
+        # Clean up.
+        shutil.rmtree(conf_dir)
+
+    def test_config_watcher_polling(self):
+        """Watch a configuration file for changes -- polling.
+        """
+        conf_dir = tempfile.mkdtemp()
+        conf_file = os.path.join(conf_dir, 'watch.conf')
+        fh = open(conf_file, 'w')
+        fh.write('[ingest]\nthreads: 10\n')
+        fh.close()
+
+        conf = geosutils.config.Config(conf_file)
+        conf.parse_config()
+        reloaded = threading.Event()
+        conf.add_reload_callback(lambda c, d: reloaded.set())
+
+        watcher = geosutils.config.ConfigWatcher(conf,
+                                                 interval=0.01,
+                                                 use_inotify=False)
+        watcher.start()
+        time.sleep(0.05)
+        fh = open(conf_file, 'w')
+        fh.write('[ingest]\nthreads: 12\n')
+        fh.close()
+
+        msg = 'Config watcher did not reload the changed file'
+        self.assertTrue(reloaded.wait(5), msg)
+        watcher.stop()
+        received = conf.get('ingest', 'threads')
+        msg = 'Config watcher reloaded value error'
+        self.assertEqual(received, '12', msg)
+
+        # Clean up.
+        shutil.rmtree(conf_dir)
+
+    def test_parse_schema(self):
+        """Parse a declarative config schema.
+        """
+        conf = DummyConfig(self._file)
+        conf.parse_config()
+
+        schema = geosutils.config.ConfigSchema([
+            geosutils.config.ConfigOption('dummy_section', 'dummy_key'),
+            geosutils.config.ConfigOption('int_section',
+                                          'int_key',
+                                          cast_type='int'),
+            geosutils.config.ConfigOption('dummy_section',
+                                          'dummy_list',
+                                          is_list=True),
+            geosutils.config.ConfigOption('ingest',
+                                          'missing_option',
+                                          var='empty_key',
+                                          default='banana'),
+            geosutils.config.ConfigSection('dummy_dict_key_as_int',
+                                           key_cast_type='int'),
+            geosutils.config.ConfigSection('dummy_dict_as_list',
+                                           is_list=True),
+        ])
+        received = conf.parse_schema(schema)
+        expected = {
+            'dummy_key': 'dummy_value',
+            'int_key': 1234,
+            'dummy_list': ['list 1', 'list 2'],
+            'empty_key': 'banana',
+            'dummy_dict_key_as_int': {1234: 'int_key_value'},
+            'dummy_dict_as_list': {
+                'dict_1': ['list item 1', 'list item 2'],
+                'dict_2': ['list item 3', 'list item 4']},
+        }
+        msg = 'Parsed config schema error'
+        self.assertDictEqual(received, expected, msg)
+
+        # ... and check that the variables are set.
+        msg = 'Parsed config schema set variable error'
+        self.assertEqual(conf.int_key, 1234, msg)
+        self.assertEqual(conf.empty_key, 'banana', msg)
+        self.assertDictEqual(conf.dummy_dict_key_as_int,
+                             {1234: 'int_key_value'},
+                             msg)
+
+    def test_parse_schema_missing_required(self):
+        """Parse a declarative config schema -- missing required items.
+        """
+        conf = DummyConfig(self._file)
+        conf.parse_config()
+
+        schema = geosutils.config.ConfigSchema([
+            geosutils.config.ConfigOption('dummy_section',
+                                          'missing_option',
+                                          is_required=True),
+            geosutils.config.ConfigOption('dummy_section',
+                                          'dummy_key',
+                                          is_required=True),
+            geosutils.config.ConfigOption('missing_section',
+                                          'option',
+                                          is_required=True),
+            geosutils.config.ConfigSection('missing_dict_section',
+                                           is_required=True),
+        ])
+
+        try:
+            conf.parse_schema(schema)
+            self.fail('MissingConfigError not raised')
+        except geosutils.config.MissingConfigError, err:
+            received = err.missing
+        expected = [('dummy_section', 'missing_option'),
+                    ('missing_section', 'option'),
+                    ('missing_dict_section', None)]
+        msg = 'Config schema missing required options error'
+        self.assertListEqual(received, expected, msg)
+
+        msg = 'Failed config schema should not set variables'
+        self.assertIsNone(conf.dummy_key, msg)
+
+    def test_parse_schema_bad_interpolation(self):
+        """Parse a declarative config schema -- undeclared option with a
+        bad interpolation.
+        """
+        conf = geosutils.config.Config()
+        conf.readfp(StringIO.StringIO('[DEFAULT]\nbase: /var/tmp\n'
+                                      '[ingest]\n'
+                                      'inbound_dir: %(base)s/geoingest\n'
+                                      'broken: %(banana)s\n'))
+        schema = geosutils.config.ConfigSchema([
+            geosutils.config.ConfigOption('ingest',
+                                          'inbound_dir',
+                                          var='inbound_dir'),
+            geosutils.config.ConfigOption('ingest',
+                                          'threads',
+                                          is_required=True),
+        ])
+
+        values, missing = schema.parse(conf)
+        received = (values, missing)
+        expected = ({'inbound_dir': '/var/tmp/geoingest'},
+                    [('ingest', 'threads')])
+        msg = 'Config schema with an undeclared bad option error'
+        self.assertTupleEqual(received, expected, msg)
+
+    def test_parse_layers(self):
+        """Read layered config -- files, conf.d and environment.
+        """
+        conf_dir = tempfile.mkdtemp()
+        conf_d = os.path.join(conf_dir, 'conf.d')
+        os.makedirs(conf_d)
+        layers = {
+            os.path.join(conf_dir, 'base.conf'):
+                '[ingest]\nthreads: 10\nshards: 10\nthread_sleep: 0.5\n',
+            os.path.join(conf_dir, 'host.conf'):
+                '[ingest]\nthreads: 20\n',
+            os.path.join(conf_d, '01-shard.conf'):
+                '[shard_1]\nhost: host_1\n[ingest]\nshards: 12\n',
+            os.path.join(conf_d, '02-shard.conf'):
+                '[shard_2]\nhost: host_2\n[ingest]\nshards: 14\n',
+        }
+        for filename, content in layers.iteritems():
+            fh = open(filename, 'w')
+            fh.write(content)
+            fh.close()
+
+        os.environ['GEOSUTILSTEST__INGEST__THREAD_SLEEP'] = '0.1'
+        os.environ['GEOSUTILSTEST__NEW_SECTION__KEY'] = 'value'
+        try:
+            conf = geosutils.config.Config()
+            received = conf.parse_layers(
+                [os.path.join(conf_dir, 'base.conf'),
+                 os.path.join(conf_dir, 'host.conf'),
+                 conf_d],
+                env_prefix='GEOSUTILSTEST')
+        finally:
+            del os.environ['GEOSUTILSTEST__INGEST__THREAD_SLEEP']
+            del os.environ['GEOSUTILSTEST__NEW_SECTION__KEY']
+
+        msg = 'Layered config read did not return True'
+        self.assertTrue(received, msg)
+
+        received = dict(conf.items('ingest'))
+        expected = {'threads': '20', 'shards': '14', 'thread_sleep': '0.1'}
+        msg = 'Layered config precedence error'
+        self.assertDictEqual(received, expected, msg)
+
+        received = conf.get('shard_1', 'host')
+        msg = 'Layered config conf.d fragment error'
+        self.assertEqual(received, 'host_1', msg)
+
+        received = conf.get('new_section', 'key')
+        msg = 'Layered config environment override new section error'
+        self.assertEqual(received, 'value', msg)
+
+        # Clean up.
+        shutil.rmtree(conf_dir)
+
+    def test_parse_layers_snapshot_and_reload(self):
+        """Read layered config -- snapshot cache and reload.
+        """
+        cache_dir = tempfile.mkdtemp()
+        conf_dir = tempfile.mkdtemp()
+        fh = open(os.path.join(conf_dir, '01.conf'), 'w')
+        fh.write('[ingest]\nthreads: 10\n')
+        fh.close()
+
+        conf = geosutils.config.Config(cache_dir=cache_dir)
+        conf.parse_layers([conf_dir])
+        conf = geosutils.config.Config(cache_dir=cache_dir)
+        conf.parse_layers([conf_dir])
+        msg = 'Second layered config read should come from the snapshot'
+        self.assertTrue(conf.from_snapshot, msg)
+
+        # A new fragment is picked up by reload.
+        fh = open(os.path.join(conf_dir, '02.conf'), 'w')
+        fh.write('[ingest]\nthreads: 16\n')
+        fh.close()
+        received = conf.reload()
+        expected = {('ingest', 'threads'): ('10', '16')}
+        msg = 'Layered config reload diff error'
+        self.assertDictEqual(received, expected, msg)
+
+        # Clean up.
+        shutil.rmtree(cache_dir)
+        shutil.rmtree(conf_dir)
+
+    def test_parse_layers_no_files(self):
+        """Read layered config -- no files.
+        """
+        received = self._conf.parse_layers([os.path.join('banana', '*')])
+        msg = 'Layered config read with no files should return False'
+        self.assertFalse(received, msg)
+
+    def test_typed_accessors_readfp(self):
+        """Typed, memoized config accessors -- invalidated by readfp().
+        """
+        conf = geosutils.config.Config()
+        conf.readfp(StringIO.StringIO('[ingest]\nthreads: 10\n'))
+        msg = 'Typed accessor after first readfp error'
+        self.assertEqual(conf.get_int('ingest', 'threads'), 10, msg)
+        self.assertEqual(conf.get('ingest', 'threads'), '10', msg)
+
+        conf.readfp(StringIO.StringIO('[ingest]\nthreads: 20\n'))
+        msg = 'Typed accessor after second readfp should not be stale'
+        self.assertEqual(conf.get_int('ingest', 'threads'), 20, msg)
+        self.assertEqual(conf.get('ingest', 'threads'), '20', msg)
+
+    def test_typed_accessors(self):
+        """Typed, memoized config accessors.
+        """
+        conf = geosutils.config.Config()
+        conf.add_section('ingest')
+        conf.set('ingest', 'threads', '10')
+        conf.set('ingest', 'thread_sleep', '0.5')
+        conf.set('ingest', 'enabled', 'yes')
+        conf.set('ingest', 'shards', 'a,b,c')
+        conf.set('ingest', 'poll', '1.5m')
+        conf.set('ingest', 'timeout', '250ms')
+        conf.set('ingest', 'max_size', '2MB')
+        conf.set('ingest', 'base', '/var/tmp')
+        conf.set('ingest', 'inbound_dir', '%(base)s/geoingest')
+
+        msg = 'Typed accessor error'
+        self.assertEqual(conf.get_int('ingest', 'threads'), 10, msg)
+        self.assertEqual(conf.get_float('ingest', 'thread_sleep'), 0.5, msg)
+        self.assertTrue(conf.get_bool('ingest', 'enabled'), msg)
+        self.assertListEqual(conf.get_list('ingest', 'shards'),
+                             ['a', 'b', 'c'],
+                             msg)
+        self.assertEqual(conf.get_duration('ingest', 'poll'), 90.0, msg)
+        self.assertEqual(conf.get_duration('ingest', 'timeout'), 0.25, msg)
+        self.assertEqual(conf.get_duration('ingest', 'thread_sleep'),
+                         0.5,
+                         msg)
+        self.assertEqual(conf.get_bytes('ingest', 'max_size'),
+                         2 * 1024 ** 2,
+                         msg)
+        self.assertEqual(conf.get('ingest', 'inbound_dir'),
+                         '/var/tmp/geoingest',
+                         msg)
+
+        msg = 'Typed accessor default error'
+        self.assertEqual(conf.get_int('ingest', 'missing', default=3),
+                         3,
+                         msg)
+        self.assertRaises(geosutils.config.ConfigParser.NoOptionError,
+                          conf.get_int,
+                          'ingest',
+                          'missing')
+        self.assertRaises(ValueError, conf.get_bytes, 'ingest', 'timeout')
+
+        # Lists are not shared between callers.
+        conf.get_list('ingest', 'shards').append('d')
+        msg = 'Typed accessor list should not be shared'
+        self.assertListEqual(conf.get_list('ingest', 'shards'),
+                             ['a', 'b', 'c'],
+                             msg)
+
+        # Memoized values are invalidated by set().
+        conf.set('ingest', 'threads', '12')
+        conf.set('ingest', 'base', '/data')
+        msg = 'Typed accessor value after set error'
+        self.assertEqual(conf.get_int('ingest', 'threads'), 12, msg)
+        self.assertEqual(conf.get('ingest', 'inbound_dir'),
+                         '/data/geoingest',
+                         msg)
+
+    def test_parse_config_lazy(self):
+        """Read config -- lazy section parsing.
+        """
+        conf = DummyConfig(self._file, lazy=True)
+        received = conf.parse_config()
+        msg = 'Lazy config read did not return True'
+        self.assertTrue(received, msg)
+
+        eager = geosutils.config.Config(self._file)
+        eager.parse_config()
+        received = conf.sections()
+        expected = eager.sections()
+        msg = 'Lazy config sections error'
+        self.assertListEqual(received, expected, msg)
+        msg = 'Lazy config has_section error'
+        self.assertTrue(conf.has_section('spatial'), msg)
+        self.assertFalse(conf.has_section('banana'), msg)
+
+        msg = 'Lazy config should not parse any section up front'
+        self.assertListEqual(conf._sections.loaded(), [], msg)
+
+        received = conf.parse_scalar_config('int_section',
+                                            'int_key',
+                                            cast_type='int')
+        msg = 'Lazy config scalar value error'
+        self.assertEqual(received, 1234, msg)
+        received = conf.parse_dict_config('dummy_dict_as_list',
+                                          is_list=True)
+        expected = {'dict_1': ['list item 1', 'list item 2'],
+                    'dict_2': ['list item 3', 'list item 4']}
+        msg = 'Lazy config dict value error'
+        self.assertDictEqual(received, expected, msg)
+
+        received = conf._sections.loaded()
+        expected = ['int_section', 'dummy_dict_as_list']
+        msg = 'Lazy config should only parse the sections accessed'
+        self.assertListEqual(received, expected, msg)
+
+        for section in eager.sections():
+            received = sorted(conf.items(section))
+            expected = sorted(eager.items(section))
+            msg = 'Lazy config items error for section "%s"' % section
+            self.assertListEqual(received, expected, msg)
+
+    def test_parse_config_lazy_defaults_and_duplicates(self):
+        """Read config -- lazy with DEFAULT and repeated sections.
+        """
+        conf_dir = tempfile.mkdtemp()
+        conf_file = os.path.join(conf_dir, 'lazy.conf')
+        fh = open(conf_file, 'w')
+        fh.write('[DEFAULT]\nbase: /var/tmp\n'
+                 '[ingest]\ninbound_dir: %(base)s/geoingest\n'
+                 '[spatial]\nstripes: 10\n'
+                 '[ingest]\nthreads: 10\n')
+        fh.close()
+
+        conf = geosutils.config.Config(conf_file, lazy=True)
+        conf.parse_config()
+        received = conf.get('ingest', 'inbound_dir')
+        expected = '/var/tmp/geoingest'
+        msg = 'Lazy config DEFAULT interpolation error'
+        self.assertEqual(received, expected, msg)
+        received = conf.get('ingest', 'threads')
+        msg = 'Lazy config repeated section error'
+        self.assertEqual(received, '10', msg)
+
+        # Sections parsed after the file is rewritten in place come
+        # from the file as indexed.
+        fh = open(conf_file, 'w')
+        fh.write('# Rewritten\n[spatial]\nstripes: 20\n')
+        fh.close()
+        received = conf.get('spatial', 'stripes')
+        msg = 'Lazy config section parse after rewrite error'
+        self.assertEqual(received, '10', msg)
+
+        # Clean up.
+        shutil.rmtree(conf_dir)
+
     def tearDown(self):
         self._conf = None
         del self._conf
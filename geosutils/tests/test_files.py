@@ -4,8 +4,11 @@
 """
 import unittest2
 import tempfile
+import shutil
+import time
 import os
 
+import geosutils.files
 from geosutils.files import (load_template,
                              get_directory_files,
                              get_directory_files_list,
@@ -17,7 +20,8 @@ from geosutils.files import (load_template,
                              gen_digest_path,
                              templater,
                              lock_file,
-                             unlock_file)
+                             unlock_file,
+                             RetentionManager)
 
 
 class TestFiles(unittest2.TestCase):
@@ -290,3 +294,153 @@ class TestFiles(unittest2.TestCase):
 
         # Clean up.
         remove_files(filename)
+
+    def test_retention_manager_max_age(self):
+        """Retention sweep -- max age.
+        """
+        directory = tempfile.mkdtemp()
+        now = time.time()
+        for i, age in enumerate([10, 100, 1000]):
+            filename = os.path.join(directory, 'file_%d' % i)
+            fh = open(filename, 'w')
+            fh.write('x' * 10)
+            fh.close()
+            os.utime(filename, (now - age, now - age))
+
+        manager = RetentionManager(directory, max_age=500)
+        received = manager.sweep(now=now)
+        msg = 'Retention sweep (max age) files removed error'
+        self.assertEqual(received['files'], 1, msg)
+        msg = 'Retention sweep (max age) bytes reclaimed error'
+        self.assertEqual(received['bytes'], 10, msg)
+        msg = 'Retention sweep (max age) removed file list error'
+        self.assertListEqual(received['removed'],
+                             [os.path.join(directory, 'file_2')],
+                             msg)
+
+        # A second sweep with nothing expired removes nothing.
+        received = manager.sweep(now=now)
+        msg = 'Retention sweep (max age) repeat sweep error'
+        self.assertEqual(received['files'], 0, msg)
+
+        # Clean up.
+        shutil.rmtree(directory)
+
+    def test_retention_manager_max_bytes_and_files(self):
+        """Retention sweep -- max bytes and max files in a tree.
+        """
+        directory = tempfile.mkdtemp()
+        sub_dir = os.path.join(directory, 'sub')
+        os.makedirs(sub_dir)
+        now = time.time()
+        for i, age in enumerate([40, 30, 20, 10]):
+            filename = os.path.join(sub_dir if i % 2 else directory,
+                                    'file_%d' % i)
+            fh = open(filename, 'w')
+            fh.write('x' * 100)
+            fh.close()
+            os.utime(filename, (now - age, now - age))
+
+        manager = RetentionManager(directory,
+                                   max_bytes=300,
+                                   batch_size=1,
+                                   workers=2)
+        received = manager.sweep(now=now)
+        msg = 'Retention sweep (max bytes) files removed error'
+        self.assertListEqual(received['removed'],
+                             [os.path.join(directory, 'file_0')],
+                             msg)
+
+        manager = RetentionManager(directory, max_files=1)
+        received = manager.sweep(now=now)
+        expected = [os.path.join(sub_dir, 'file_1'),
+                    os.path.join(directory, 'file_2')]
+        msg = 'Retention sweep (max files) files removed error'
+        self.assertListEqual(sorted(received['removed']),
+                             sorted(expected),
+                             msg)
+        msg = 'Retention sweep (max files) remaining file count error'
+        self.assertEqual(manager.total_files, 1, msg)
+
+        # Clean up.
+        shutil.rmtree(directory)
+
+    def test_retention_manager_dry(self):
+        """Retention sweep -- dry run.
+        """
+        directory = tempfile.mkdtemp()
+        filename = os.path.join(directory, 'file_0')
+        open(filename, 'w').close()
+        os.utime(filename, (0, 0))
+
+        manager = RetentionManager(directory, max_age=60)
+        received = manager.sweep(dry=True)
+        msg = 'Retention sweep (dry) should report the expired file'
+        self.assertListEqual(received['removed'], [filename], msg)
+        msg = 'Retention sweep (dry) should not remove the file'
+        self.assertTrue(os.path.exists(filename), msg)
+
+        received = manager.sweep()
+        msg = 'Retention sweep after dry run should remove the file'
+        self.assertListEqual(received['removed'], [filename], msg)
+
+        # Clean up.
+        shutil.rmtree(directory)
+
+    def test_retention_manager_failed_removal(self):
+        """Retention sweep -- failed removal is retried.
+        """
+        directory = tempfile.mkdtemp()
+        filename = os.path.join(directory, 'file_0')
+        open(filename, 'w').close()
+        os.utime(filename, (0, 0))
+
+        manager = RetentionManager(directory, max_age=60)
+        remove_files_orig = geosutils.files.remove_files
+        geosutils.files.remove_files = lambda files: []
+        try:
+            received = manager.sweep()
+        finally:
+            geosutils.files.remove_files = remove_files_orig
+        msg = 'Retention sweep (failed removal) should remove nothing'
+        self.assertListEqual(received['removed'], [], msg)
+        msg = 'Retention sweep (failed removal) file count error'
+        self.assertEqual(manager.total_files, 1, msg)
+
+        received = manager.sweep()
+        msg = 'Retention sweep after failed removal should retry the file'
+        self.assertListEqual(received['removed'], [filename], msg)
+        msg = 'Retention sweep after failed removal file count error'
+        self.assertEqual(manager.total_files, 0, msg)
+
+        # Clean up.
+        shutil.rmtree(directory)
+
+    def test_retention_manager_removed_directory(self):
+        """Retention sweep -- directory tree removed between sweeps.
+        """
+        directory = tempfile.mkdtemp()
+        deep_dir = os.path.join(directory, 'sub', 'deep')
+        os.makedirs(deep_dir)
+        for path in (directory, os.path.join(directory, 'sub'), deep_dir):
+            fh = open(os.path.join(path, 'file'), 'w')
+            fh.write('x' * 10)
+            fh.close()
+
+        manager = RetentionManager(directory, max_age=60)
+        manager.sweep()
+        msg = 'Retention index file count error'
+        self.assertEqual(manager.total_files, 3, msg)
+
+        shutil.rmtree(os.path.join(directory, 'sub'))
+        os.utime(directory, (0, 0))
+        manager.sweep()
+        received = (manager.total_files, manager.total_bytes)
+        expected = (1, 10)
+        msg = 'Removed directory tree should be dropped from the index'
+        self.assertTupleEqual(received, expected, msg)
+        msg = 'Removed directory tree should be dropped from the dirs'
+        self.assertListEqual(manager._dirs.keys(), [directory], msg)
+
+        # Clean up.
+        shutil.rmtree(directory)
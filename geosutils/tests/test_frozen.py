@@ -0,0 +1,156 @@
+# pylint: disable=R0904,W0142,C0103
+""":mod:`geosutils.frozen` tests.
+
+"""
+import unittest2
+import tempfile
+import cPickle
+import shutil
+import os
+import ConfigParser
+
+import geosutils.config
+from geosutils.frozen import (FrozenConfig,
+                              SharedConfig)
+
+
+class CaseConfig(geosutils.config.Config):
+    def optionxform(self, option):
+        return option
+
+
+class TestFrozen(unittest2.TestCase):
+    """:mod:`geosutils.frozen`
+    """
+    @classmethod
+    def setUpClass(cls):
+        cls._file = os.path.join('geosutils',
+                                 'tests',
+                                 'files',
+                                 'dummy.conf')
+
+    def setUp(self):
+        self._conf = geosutils.config.Config(self._file)
+        self._conf.parse_config()
+
+    def test_freeze(self):
+        """Freeze a parsed config.
+        """
+        frozen = self._conf.freeze()
+        msg = 'Config freeze did not return a FrozenConfig'
+        self.assertIsInstance(frozen, FrozenConfig, msg)
+
+        received = frozen.get('ingest', 'threads')
+        msg = 'Frozen config value error'
+        self.assertEqual(received, '10', msg)
+
+        received = frozen.sections()
+        expected = self._conf.sections()
+        msg = 'Frozen config sections error'
+        self.assertListEqual(received, expected, msg)
+
+        received = dict(frozen.items('dummy_dict_section'))
+        expected = {'dict_1': 'dict 1 value', 'dict_2': 'dict 2 value'}
+        msg = 'Frozen config items error'
+        self.assertDictEqual(received, expected, msg)
+
+        msg = 'Frozen config missing option should raise NoOptionError'
+        self.assertRaises(ConfigParser.NoOptionError,
+                          frozen.get,
+                          'ingest',
+                          'banana')
+        msg = 'Frozen config missing section should raise NoSectionError'
+        self.assertRaises(ConfigParser.NoSectionError,
+                          frozen.get,
+                          'banana',
+                          'threads')
+
+    def test_freeze_immutable_and_hashable(self):
+        """Frozen config is immutable and hashable.
+        """
+        frozen = self._conf.freeze()
+        self.assertRaises(TypeError, setattr, frozen, '_index', {})
+
+        other = self._conf.freeze()
+        msg = 'Frozen configs of the same config should be equal'
+        self.assertEqual(frozen, other, msg)
+        self.assertEqual(hash(frozen), hash(other), msg)
+
+        self._conf.set('ingest', 'threads', '20')
+        changed = self._conf.freeze()
+        msg = 'Frozen configs of a changed config should not be equal'
+        self.assertNotEqual(frozen, changed, msg)
+
+        received = cPickle.loads(cPickle.dumps(frozen, 2))
+        msg = 'Pickled frozen config should be equal to the original'
+        self.assertEqual(received, frozen, msg)
+
+    def test_shared_config(self):
+        """Attach to a saved frozen config.
+        """
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'test.frozen')
+        frozen = self._conf.freeze()
+        frozen.save(path)
+
+        shared = SharedConfig(path)
+        for section in frozen.sections():
+            received = shared.items(section)
+            expected = frozen.items(section)
+            msg = 'Shared config items error for section "%s"' % section
+            self.assertListEqual(sorted(received), sorted(expected), msg)
+
+        received = sorted(shared.sections())
+        expected = sorted(frozen.sections())
+        msg = 'Shared config sections error'
+        self.assertListEqual(received, expected, msg)
+
+        msg = 'Shared config has_section/has_option error'
+        self.assertTrue(shared.has_section('spatial'), msg)
+        self.assertFalse(shared.has_section('spatia'), msg)
+        self.assertTrue(shared.has_option('spatial', 'stripes'), msg)
+        self.assertFalse(shared.has_option('spatial', 'banana'), msg)
+
+        self.assertRaises(ConfigParser.NoOptionError,
+                          shared.get,
+                          'spatial',
+                          'banana')
+        self.assertRaises(ConfigParser.NoSectionError,
+                          shared.options,
+                          'banana')
+
+        # Clean up.
+        shared.close()
+        shutil.rmtree(directory)
+
+    def test_freeze_case_preserving(self):
+        """Freeze a config with case preserving option names.
+        """
+        conf = CaseConfig()
+        conf.add_section('ingest')
+        conf.set('ingest', 'Threads', '10')
+        frozen = conf.freeze()
+
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'test.frozen')
+        frozen.save(path)
+        shared = SharedConfig(path)
+
+        for config in (frozen, shared):
+            msg = 'Case preserved option lookup error (%s)' % config
+            self.assertEqual(config.get('ingest', 'Threads'), '10', msg)
+            self.assertTrue(config.has_option('ingest', 'Threads'), msg)
+            self.assertFalse(config.has_option('ingest', 'threads'), msg)
+
+        # Clean up.
+        shared.close()
+        shutil.rmtree(directory)
+
+    def test_shared_config_invalid_file(self):
+        """Attach to an invalid frozen config file.
+        """
+        self.assertRaises(ValueError, SharedConfig, self._file)
+
+    def tearDown(self):
+        self._conf = None
+        del self._conf
@@ -0,0 +1,186 @@
+# pylint: disable=R0904,W0142,C0103
+""":mod:`geosutils.journal` tests.
+
+"""
+import unittest2
+import tempfile
+import shutil
+import json
+import os
+
+from geosutils.journal import Journal
+
+
+class TestJournal(unittest2.TestCase):
+    """:class:`geosutils.journal.Journal`
+    """
+    def setUp(self):
+        self._dir = tempfile.mkdtemp()
+        self._journal_file = os.path.join(self._dir, 'test.journal')
+
+    def _touch(self, name):
+        path = os.path.join(self._dir, name)
+        fh = open(path, 'w')
+        fh.write(name)
+        fh.close()
+
+        return path
+
+    def _write_journal(self, records):
+        fh = open(self._journal_file, 'w')
+        for record in records:
+            fh.write(json.dumps(record) + '\n')
+        fh.close()
+
+    def test_batch(self):
+        """Journaled batch of move and copy operations.
+        """
+        source_1 = self._touch('source_1')
+        source_2 = self._touch('source_2')
+        target_1 = os.path.join(self._dir, 'out', 'target_1')
+        target_2 = os.path.join(self._dir, 'out', 'target_2')
+
+        journal = Journal(self._journal_file, group_size=1)
+        journal.open()
+        with journal.batch() as batch:
+            batch.move_file(source_1, target_1)
+            batch.copy_file(source_2, target_2)
+
+        received = batch.statuses
+        expected = [True, True]
+        msg = 'Journaled batch status error'
+        self.assertListEqual(received, expected, msg)
+
+        msg = 'Journaled batch target files should exist'
+        self.assertTrue(os.path.exists(target_1), msg)
+        self.assertTrue(os.path.exists(target_2), msg)
+        msg = 'Journaled batch moved source file should not exist'
+        self.assertFalse(os.path.exists(source_1), msg)
+
+        kinds = [json.loads(l)['kind'] for l in open(self._journal_file)]
+        expected = ['begin', 'intent', 'intent', 'done', 'done', 'commit']
+        msg = 'Journal record sequence error'
+        self.assertListEqual(kinds, expected, msg)
+
+        journal.close()
+        msg = 'Closed journal with no batches in flight should be empty'
+        self.assertEqual(os.path.getsize(self._journal_file), 0, msg)
+
+    def test_batch_exception_does_not_execute(self):
+        """Journaled batch -- exception within the batch block.
+        """
+        source = self._touch('source')
+        target = os.path.join(self._dir, 'target')
+
+        journal = Journal(self._journal_file)
+        journal.open()
+
+        def failing_batch():
+            with journal.batch() as batch:
+                batch.move_file(source, target)
+                raise RuntimeError('Abandon batch')
+
+        self.assertRaises(RuntimeError, failing_batch)
+        msg = 'Abandoned batch should not move the source'
+        self.assertTrue(os.path.exists(source), msg)
+
+        journal.close()
+
+    def test_recover_replay(self):
+        """Recover an incomplete batch -- replay.
+        """
+        source_1 = self._touch('source_1')
+        source_2 = self._touch('source_2')
+        target_1 = os.path.join(self._dir, 'target_1')
+        target_2 = os.path.join(self._dir, 'target_2')
+
+        # Simulate a crash after the first move completed.
+        os.rename(source_1, target_1)
+        self._write_journal([
+            {'kind': 'begin', 'batch': 1},
+            {'kind': 'intent', 'batch': 1, 'seq': 0, 'op': 'move',
+             'source': source_1, 'target': target_1, 'existed': False},
+            {'kind': 'intent', 'batch': 1, 'seq': 1, 'op': 'move',
+             'source': source_2, 'target': target_2, 'existed': False},
+            {'kind': 'done', 'batch': 1, 'seq': 0},
+        ])
+
+        journal = Journal(self._journal_file)
+        received = journal.open()
+        expected = {'batches': 1, 'operations': 2}
+        msg = 'Journal replay recovery summary error'
+        self.assertDictEqual(received, expected, msg)
+
+        msg = 'Journal replay should complete the outstanding move'
+        self.assertTrue(os.path.exists(target_2), msg)
+        self.assertFalse(os.path.exists(source_2), msg)
+        msg = 'Journal replay should leave the completed move alone'
+        self.assertTrue(os.path.exists(target_1), msg)
+
+        journal.close()
+
+    def test_recover_rollback(self):
+        """Recover an incomplete batch -- rollback.
+        """
+        source_1 = self._touch('source_1')
+        source_2 = self._touch('source_2')
+        target_1 = os.path.join(self._dir, 'target_1')
+        target_2 = os.path.join(self._dir, 'target_2')
+
+        # Simulate a crash after the move and copy completed but
+        # before the commit (with a torn trailing record).
+        os.rename(source_1, target_1)
+        shutil.copyfile(source_2, target_2)
+        self._write_journal([
+            {'kind': 'begin', 'batch': 1},
+            {'kind': 'intent', 'batch': 1, 'seq': 0, 'op': 'move',
+             'source': source_1, 'target': target_1, 'existed': False},
+            {'kind': 'intent', 'batch': 1, 'seq': 1, 'op': 'copy',
+             'source': source_2, 'target': target_2, 'existed': False},
+        ])
+        fh = open(self._journal_file, 'a')
+        fh.write('{"kind": "do')
+        fh.close()
+
+        journal = Journal(self._journal_file, recovery_mode='rollback')
+        journal.open()
+
+        msg = 'Journal rollback should reverse the move'
+        self.assertTrue(os.path.exists(source_1), msg)
+        self.assertFalse(os.path.exists(target_1), msg)
+        msg = 'Journal rollback should remove the copy'
+        self.assertFalse(os.path.exists(target_2), msg)
+
+        journal.close()
+
+    def test_recover_committed_batch(self):
+        """Recover -- committed batches are not touched.
+        """
+        source = self._touch('source')
+        target = os.path.join(self._dir, 'target')
+        self._write_journal([
+            {'kind': 'begin', 'batch': 1},
+            {'kind': 'intent', 'batch': 1, 'seq': 0, 'op': 'move',
+             'source': source, 'target': target, 'existed': False},
+            {'kind': 'commit', 'batch': 1},
+        ])
+
+        journal = Journal(self._journal_file)
+        received = journal.open()
+        expected = {'batches': 0, 'operations': 0}
+        msg = 'Committed batch should not be recovered'
+        self.assertDictEqual(received, expected, msg)
+        self.assertTrue(os.path.exists(source), msg)
+
+        journal.close()
+
+    def test_invalid_recovery_mode(self):
+        """Journal initialisation -- invalid recovery mode.
+        """
+        self.assertRaises(ValueError,
+                          Journal,
+                          self._journal_file,
+                          recovery_mode='banana')
+
+    def tearDown(self):
+        shutil.rmtree(self._dir)
@@ -0,0 +1,384 @@
+# pylint: disable=R0904,C0103
+""":mod:`geosutils.log` tests.
+
+"""
+import unittest2
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import tempfile
+import threading
+import subprocess
+import StringIO
+
+import geosutils.log
+from geosutils.files import copy_file
+from geosutils.log import (log,
+                           configure,
+                           lazy,
+                           autolog,
+                           set_autolog_sampling,
+                           RateLimitFilter,
+                           enable_rate_limiting,
+                           disable_rate_limiting,
+                           metrics,
+                           JSONFormatter,
+                           BufferedJSONHandler,
+                           enable_async_logging,
+                           disable_async_logging)
+
+
+class TestLog(unittest2.TestCase):
+    """:mod:`geosutils.log`
+    """
+    def test_import_is_lazy(self):
+        """Import geosutils without configuring logging.
+        """
+        script = ('import sys, geosutils.files, geosutils.log; '
+                  'print geosutils.log._configured, '
+                  '"logging.config" in sys.modules, '
+                  '"inspect" in sys.modules')
+        received = subprocess.check_output([sys.executable, '-c', script])
+        expected = 'False False False\n'
+        msg = 'Importing geosutils should not configure logging'
+        self.assertEqual(received, expected, msg)
+
+    def test_configure(self):
+        """Configure the logger.
+        """
+        logger = configure()
+
+        msg = 'Repeated configure should be a no-op'
+        self.assertIs(configure(), logger, msg)
+
+        msg = 'Logger proxy should forward to the configured logger'
+        self.assertIs(log.handlers, logger.handlers, msg)
+
+        old_level = logger.level
+        log.level = logging.WARNING
+        try:
+            received = log.isEnabledFor(logging.INFO)
+        finally:
+            log.level = old_level
+        msg = 'Logger proxy should forward attribute assignment'
+        self.assertFalse(received, msg)
+
+    def test_script_name(self):
+        """Identify the calling script name.
+        """
+        argv = sys.argv
+        try:
+            sys.argv = ['/usr/local/bin/geoingest.py', '--dry']
+            received = geosutils.log._script_name()
+            sys.argv = ['-c']
+            received_cmd = geosutils.log._script_name()
+        finally:
+            sys.argv = argv
+
+        msg = 'Script name error'
+        self.assertEqual(received, 'geoingest.py', msg)
+        msg = 'Script name error (python -c)'
+        self.assertIsNone(received_cmd, msg)
+
+    def test_async_logging(self):
+        """Log via the queue listener thread.
+        """
+        logger, handler = self._capture_logger('geosutils.tests.async')
+        enable_async_logging(logger=logger)
+        for index in range(100):
+            logger.info('Record %d', index)
+        disable_async_logging(logger=logger)
+
+        received = [r.getMessage() for r in handler.records]
+        expected = ['Record %d' % i for i in range(100)]
+        msg = 'Async logging should deliver every record in order'
+        self.assertListEqual(received, expected, msg)
+
+        msg = 'Async logging should restore the original handlers'
+        self.assertListEqual(logger.handlers, [handler], msg)
+
+    def test_async_logging_drop(self):
+        """Log via the queue listener thread -- drop policy.
+        """
+        logger, handler = self._capture_logger('geosutils.tests.drop')
+        handler.release_event = threading.Event()
+        queue_handler = enable_async_logging(maxsize=1,
+                                             policy='drop',
+                                             logger=logger)
+        for index in range(10):
+            logger.info('Record %d', index)
+        handler.release_event.set()
+        dropped = queue_handler.dropped
+        disable_async_logging(logger=logger)
+
+        msg = 'Full queue should drop records'
+        self.assertGreater(dropped, 0, msg)
+
+        received = handler.records[-1].getMessage()
+        expected = 'Async logging dropped %d records' % dropped
+        msg = 'Dropped record summary error'
+        self.assertEqual(received, expected, msg)
+
+    def test_lazy(self):
+        """Defer log message arguments until emitted.
+        """
+        logger, handler = self._capture_logger('geosutils.tests.lazy')
+        calls = []
+
+        def expensive(value):
+            calls.append(value)
+            return value * 2
+
+        logger.setLevel(logging.INFO)
+        logger.debug('Filtered: %s', lazy(expensive, 'a'))
+        msg = 'Filtered lazy message should not be built'
+        self.assertListEqual(calls, [], msg)
+
+        logger.info('Emitted: %s', lazy(expensive, 'b'))
+        received = handler.records[0].getMessage()
+        expected = 'Emitted: bb'
+        msg = 'Lazy message error'
+        self.assertEqual(received, expected, msg)
+
+        handler.records[0].getMessage()
+        msg = 'Lazy message should only be built once'
+        self.assertListEqual(calls, ['b'], msg)
+
+    def test_autolog(self):
+        """Log the calling function details.
+        """
+        logger = configure()
+        handler = _CaptureHandler()
+        old_level = logger.level
+        logger.addHandler(handler)
+        logger.setLevel(logging.DEBUG)
+        geosutils.log._call_sites.clear()
+        try:
+            for _ in range(5):
+                autolog('Verbose')
+            for _ in range(5):
+                autolog('Sampled', sample=2)
+            set_autolog_sampling(5)
+            for _ in range(10):
+                autolog('Default sampled')
+        finally:
+            set_autolog_sampling()
+            logger.removeHandler(handler)
+            logger.setLevel(old_level)
+
+        messages = [r.getMessage() for r in handler.records]
+        received = messages[0]
+        expected = ('Verbose: test_autolog in %s:' %
+                    sys.modules[__name__].__file__.replace('.pyc', '.py'))
+        msg = 'Autolog call site error'
+        self.assertTrue(received.startswith(expected), msg)
+
+        received = [m.split(':')[0] for m in messages]
+        expected = ['Verbose'] * 5 + ['Sampled'] * 3 + ['Default sampled'] * 2
+        msg = 'Autolog sampling error'
+        self.assertListEqual(received, expected, msg)
+
+    def test_rate_limiting(self):
+        """Rate limit records per call site.
+        """
+        logger, handler = self._capture_logger('geosutils.tests.limit')
+        limiter = enable_rate_limiting(rate=2, per=3600.0, logger=logger)
+        limiter.set_limit('Removing file "%s"', rate=None, sample=3)
+        try:
+            for index in range(10):
+                logger.info('Moving "%s" to "%s"', index, index + 1)
+                logger.info('Removing file "%s"', index)
+            logger.error('Not limited')
+            logger.error('Not limited')
+        finally:
+            disable_rate_limiting(logger=logger)
+
+        received = [r.getMessage() for r in handler.records]
+        expected = ['Moving "0" to "1"',
+                    'Removing file "0"',
+                    'Moving "1" to "2"',
+                    'Removing file "3"',
+                    'Removing file "6"',
+                    'Removing file "9"',
+                    'Not limited',
+                    'Not limited']
+        msg = 'Rate limited records error'
+        self.assertListEqual(received[:-2], expected, msg)
+
+        received = sorted(m.split(' in the last')[0]
+                          for m in received[-2:])
+        expected = ['Suppressed 6 messages like "Removing file "%s""',
+                    'Suppressed 8 messages like "Moving "%s" to "%s""']
+        msg = 'Rate limit summary error'
+        self.assertListEqual(received, expected, msg)
+
+    def test_rate_limiting_interval(self):
+        """Rate limit records per call site -- new interval.
+        """
+        logger, handler = self._capture_logger('geosutils.tests.interval')
+        limiter = RateLimitFilter(rate=1, per=60.0)
+        received = []
+        for lineno, msg, created in ((1, 'Record at %d', 0.0),
+                                     (2, 'Burst at %d', 0.5),
+                                     (1, 'Record at %d', 1.0),
+                                     (2, 'Burst at %d', 1.5),
+                                     (1, 'Record at %d', 2.0),
+                                     (1, 'Record at %d', 61.0)):
+            record = logger.makeRecord(logger.name, logging.INFO, 'x.py',
+                                       lineno, msg, (created,), None)
+            record.created = created
+            received.append(limiter.filter(record))
+
+        msg = 'Rate limit interval error'
+        self.assertListEqual(received,
+                             [True, True, False, False, False, True],
+                             msg)
+
+        # The quiet call site (line 2) is summarised as well.
+        received = sorted(r.getMessage() for r in handler.records)
+        expected = ['Suppressed 1 messages like "Burst at %d" '
+                    'in the last 60.5 sec',
+                    'Suppressed 2 messages like "Record at %d" '
+                    'in the last 61.0 sec']
+        msg = 'Rate limit interval summary error'
+        self.assertListEqual(received, expected, msg)
+
+        limiter.flush()
+        msg = 'Rate limit flush should not repeat summaries'
+        self.assertEqual(len(handler.records), 2, msg)
+
+    def test_json_formatter(self):
+        """Format a record as JSON.
+        """
+        logger, handler = self._capture_logger('geosutils.tests.json')
+        logger.info('Moving "%s" to "%s"', 'a.dat', 'b.dat',
+                    extra=metrics('move',
+                                  'a.dat',
+                                  nbytes=1024L,
+                                  duration=0.0125,
+                                  target='b.dat'))
+
+        received = json.loads(JSONFormatter().format(handler.records[0]))
+        received.pop('time')
+        expected = {'level': 'INFO',
+                    'logger': 'geosutils.tests.json',
+                    'message': 'Moving "a.dat" to "b.dat"',
+                    'op': 'move',
+                    'path': 'a.dat',
+                    'target': 'b.dat',
+                    'bytes': 1024,
+                    'duration_ms': 12.5}
+        msg = 'JSON formatted record error'
+        self.assertDictEqual(received, expected, msg)
+
+    def test_buffered_json_handler(self):
+        """Write JSON records in batches.
+        """
+        logger = logging.getLogger('geosutils.tests.buffered')
+        logger.propagate = False
+        logger.setLevel(logging.DEBUG)
+        stream = StringIO.StringIO()
+        handler = BufferedJSONHandler(stream=stream,
+                                      capacity=3,
+                                      flush_interval=None)
+        logger.handlers = [handler]
+
+        logger.info('Record 1')
+        logger.info('Record 2')
+        msg = 'Records should be buffered until capacity'
+        self.assertEqual(stream.getvalue(), '', msg)
+
+        logger.info('Record 3')
+        logger.info('Record 4')
+        received = [json.loads(l)['message']
+                    for l in stream.getvalue().splitlines()]
+        expected = ['Record 1', 'Record 2', 'Record 3']
+        msg = 'Records should be written once at capacity'
+        self.assertListEqual(received, expected, msg)
+
+        handler.close()
+        logger.handlers = []
+        received = len(stream.getvalue().splitlines())
+        msg = 'Close should flush buffered records'
+        self.assertEqual(received, 4, msg)
+
+    def test_buffered_json_handler_interval(self):
+        """Write JSON records in batches -- flush interval.
+        """
+        logger = logging.getLogger('geosutils.tests.interval_json')
+        logger.propagate = False
+        logger.setLevel(logging.DEBUG)
+        stream = StringIO.StringIO()
+        handler = BufferedJSONHandler(stream=stream,
+                                      capacity=1000,
+                                      flush_interval=0.05)
+        logger.handlers = [handler]
+        try:
+            logger.info('Record 1')
+            time.sleep(0.3)
+            received = len(stream.getvalue().splitlines())
+        finally:
+            handler.close()
+            logger.handlers = []
+
+        msg = 'Records should be written after the flush interval'
+        self.assertEqual(received, 1, msg)
+
+    def test_copy_file_metrics(self):
+        """Attach metrics to file operation log records.
+        """
+        logger = configure()
+        handler = _CaptureHandler()
+        old_level = logger.level
+        logger.addHandler(handler)
+        logger.setLevel(logging.DEBUG)
+        directory = tempfile.mkdtemp()
+        try:
+            source = os.path.join(directory, 'source.dat')
+            target = os.path.join(directory, 'target.dat')
+            file_h = open(source, 'w')
+            file_h.write('x' * 100)
+            file_h.close()
+            copy_file(source, target)
+        finally:
+            logger.removeHandler(handler)
+            logger.setLevel(old_level)
+            shutil.rmtree(directory)
+
+        fields = [r.fields for r in handler.records if hasattr(r, 'fields')]
+        received = dict((k, fields[-1][k])
+                        for k in ('op', 'path', 'target', 'bytes'))
+        expected = {'op': 'copy',
+                    'path': source,
+                    'target': target,
+                    'bytes': 100}
+        msg = 'Copy file metrics error'
+        self.assertDictEqual(received, expected, msg)
+
+        msg = 'Copy file metrics should include the duration'
+        self.assertIsInstance(fields[-1]['duration_ms'], float, msg)
+
+    def _capture_logger(self, name):
+        logger = logging.getLogger(name)
+        logger.propagate = False
+        logger.setLevel(logging.DEBUG)
+        handler = _CaptureHandler()
+        logger.handlers = [handler]
+
+        return logger, handler
+
+
+class _CaptureHandler(logging.Handler):
+    release_event = None
+
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.records = []
+
+    def emit(self, record):
+        if self.release_event is not None:
+            self.release_event.wait()
+        self.records.append(record)
@@ -0,0 +1,152 @@
+# pylint: disable=R0904,C0103
+""":mod:`geosutils.rowkey` tests.
+
+"""
+import unittest2
+
+import geosutils.rowkey
+from geosutils.config import Config
+from geosutils.utils import get_reverse_timestamp
+from geosutils.rowkey import (RowKeyBuilder,
+                              geohash_encode,
+                              geohash_encode_many)
+
+
+class TestRowKey(unittest2.TestCase):
+    """:mod:`geosutils.rowkey`
+    """
+    @classmethod
+    def setUpClass(cls):
+        cls._latitudes = [57.64911, 42.6, -37.8136, -90.0, 90.0, 0.0]
+        cls._longitudes = [10.40744, -5.6, 144.9631, -180.0, 180.0, 0.0]
+        cls._utc_times = ['19961217102630',
+                          '20130101000000',
+                          '19700101000000',
+                          '20991231235959',
+                          '19991231235959',
+                          '20000101000000']
+
+    def test_geohash_encode(self):
+        """Geohash encoding.
+        """
+        received = geohash_encode(57.64911, 10.40744, 11)
+        expected = 'u4pruydqqvj'
+        msg = 'Geohash encoding error'
+        self.assertEqual(received, expected, msg)
+
+        received = geohash_encode(42.6, -5.6, 5)
+        expected = 'ezs42'
+        msg = 'Geohash encoding error (precision 5)'
+        self.assertEqual(received, expected, msg)
+
+        received = geohash_encode(90.0, 180.0)
+        expected = 'zzzzzzzzzzzz'
+        msg = 'Geohash encoding error (upper bounds)'
+        self.assertEqual(received, expected, msg)
+
+    def test_geohash_encode_many(self):
+        """Batch geohash encoding.
+        """
+        expected = [geohash_encode(lat, lon)
+                    for lat, lon in zip(self._latitudes, self._longitudes)]
+        received = geohash_encode_many(self._latitudes, self._longitudes)
+        msg = 'Batch geohash encoding error'
+        self.assertListEqual(received, expected, msg)
+
+    def test_geohash_encode_many_python(self):
+        """Batch geohash encoding -- without numpy.
+        """
+        numpy = geosutils.rowkey.numpy
+        geosutils.rowkey.numpy = None
+        try:
+            received = geohash_encode_many(self._latitudes,
+                                           self._longitudes,
+                                           precision=7)
+        finally:
+            geosutils.rowkey.numpy = numpy
+        expected = [geohash_encode(lat, lon, 7)
+                    for lat, lon in zip(self._latitudes, self._longitudes)]
+        msg = 'Batch geohash encoding error (pure Python)'
+        self.assertListEqual(received, expected, msg)
+
+    def test_build(self):
+        """Build a row key.
+        """
+        builder = RowKeyBuilder(stripes=10)
+        received = builder.build(-37.8136, 144.9631, '19961217102630',
+                                 'item-1')
+        expected = ('r1r0fsnzv41c' +
+                    get_reverse_timestamp('19961217102630') +
+                    '9')
+        msg = 'Row key build error'
+        self.assertEqual(received, expected, msg)
+
+    def test_build_ordering(self):
+        """Build a row key -- custom ordering.
+        """
+        builder = RowKeyBuilder('stripe, geohash',
+                                stripes=100,
+                                precision=6,
+                                separator='|')
+        received = builder.build(-37.8136, 144.9631, None, 'item-1')
+        expected = '79|r1r0fs'
+        msg = 'Row key build error (custom ordering)'
+        self.assertEqual(received, expected, msg)
+
+    def test_build_unknown_component(self):
+        """Build a row key -- unknown component.
+        """
+        self.assertRaises(ValueError, RowKeyBuilder, 'geohash,banana')
+
+    def test_build_many(self):
+        """Batch build of row keys.
+        """
+        stripe_keys = ['item-%d' % i for i in range(len(self._latitudes))]
+        for order in ('geohash,reverse_time,stripe',
+                      'stripe,reverse_time,geohash',
+                      'geohash,stripe'):
+            builder = RowKeyBuilder(order, stripes=16, separator=':')
+            expected = [builder.build(*args)
+                        for args in zip(self._latitudes,
+                                        self._longitudes,
+                                        self._utc_times,
+                                        stripe_keys)]
+            received = builder.build_many(self._latitudes,
+                                          self._longitudes,
+                                          self._utc_times,
+                                          stripe_keys)
+            msg = 'Batch row key build error (%s)' % order
+            self.assertListEqual(received, expected, msg)
+
+    def test_build_invalid_time(self):
+        """Build row keys -- unsupported UTC time.
+        """
+        for order in ('geohash,reverse_time,stripe',
+                      'reverse_time,geohash'):
+            builder = RowKeyBuilder(order)
+            for utc_time in ('bad', '19961317102630', '00000101000000'):
+                received = builder.build(1, 2, utc_time)
+                msg = ('Invalid time "%s" row key should be None (%s)' %
+                       (utc_time, order))
+                self.assertIsNone(received, msg)
+
+            received = builder.build_many([1, 3], [2, 4],
+                                          ['bad', '19961217102630'])
+            expected = [None, builder.build(3, 4, '19961217102630')]
+            msg = 'Invalid time batch row key error (%s)' % order
+            self.assertListEqual(received, expected, msg)
+            self.assertIsNotNone(received[1], msg)
+
+    def test_from_config(self):
+        """Build a row key builder from the spatial config.
+        """
+        conf = Config()
+        conf.add_section('spatial')
+        conf.set('spatial', 'order', 'stripe,geohash,reverse_time')
+        conf.set('spatial', 'stripes', '5')
+
+        builder = RowKeyBuilder.from_config(conf)
+        received = (builder.order, builder.stripes)
+        expected = (('stripe', 'geohash', 'reverse_time'), 5)
+        msg = 'Row key builder config error'
+        self.assertTupleEqual(received, expected, msg)
@@ -3,13 +3,25 @@
 
 """
 import unittest2
+import time
 import datetime
+import collections
 
+import geosutils.setter
 from geosutils.setter import (set_scalar,
                               set_date,
                               set_tuple,
                               set_list,
-                              set_dict)
+                              set_dict,
+                              ScalarAttribute,
+                              DateAttribute,
+                              TupleAttribute,
+                              ListAttribute,
+                              DictAttribute,
+                              parse_date,
+                              parse_dates,
+                              set_date_policy,
+                              assign)
 
 
 class Bogus(object):
@@ -67,6 +79,54 @@ class Bogus(object):
         return self.__class__.__name__
 
 
+class OldStyleBogus:
+    _bogus_scalar = None
+
+    @set_scalar
+    def set_bogus_scalar(self, value):
+        pass
+
+
+class SlottedBogus(object):
+    __slots__ = ['_bogus_scalar',
+                 '_bogus_date',
+                 '_bogus_tuple',
+                 '_bogus_list',
+                 '_bogus_dict',
+                 '_bogus_trusted']
+
+    bogus_scalar = ScalarAttribute('bogus_scalar')
+    bogus_date = DateAttribute('bogus_date')
+    bogus_tuple = TupleAttribute('bogus_tuple')
+    bogus_list = ListAttribute('bogus_list')
+    bogus_dict = DictAttribute('bogus_dict')
+    bogus_trusted = ListAttribute('bogus_trusted', validate=False)
+    bogus_missing = ScalarAttribute('bogus_missing')
+
+
+class CountingBogus(Bogus):
+    _calls = 0
+
+    @set_scalar
+    def set_calls(self, value):
+        self.counted = value
+
+
+class CheckedBogus(Bogus):
+    _checked = None
+    _noted = None
+
+    @set_scalar
+    def set_checked(self, value):
+        if value < 0:
+            raise ValueError('Negative value %s' % value)
+
+    @set_scalar
+    def set_noted(self, value):
+        """Setter with only a docstring.
+        """
+
+
 class TestSetter(unittest2.TestCase):
 
     @classmethod
@@ -107,6 +167,37 @@ class TestSetter(unittest2.TestCase):
         # Clean up.
         self._bogus.set_bogus_date(old_bogus_value)
 
+    def test_set_date_leap_second(self):
+        """Set a date value -- leap second.
+        """
+        old_bogus_value = self._bogus.bogus_date
+
+        value = '2012-06-30 23:59:60'
+        self._bogus.set_bogus_date(value)
+
+        # ... and check the attribute value.
+        received = self._bogus.bogus_date
+        expected = datetime.datetime(2012, 7, 1, 0, 0)
+        msg = 'Attribute bogus_date leap second set error'
+        self.assertEqual(received, expected, msg)
+
+        # Clean up.
+        self._bogus.set_bogus_date(old_bogus_value)
+
+    def test_parse_date_naive_leap_second(self):
+        """Parse a date string -- naive timezone policy leap second.
+        """
+        set_date_policy('naive')
+        try:
+            received = [parse_date('2012-06-30 23:59:60'),
+                        parse_dates(['2012-06-30 23:59:60'])[0]]
+        finally:
+            set_date_policy('local', cache_size=4096)
+
+        expected = [datetime.datetime(2012, 7, 1, 0, 0)] * 2
+        msg = 'Naive leap second date parse error'
+        self.assertListEqual(received, expected, msg)
+
     def test_set_date_with_real_dt(self):
         """Set a date value (datetime object).
         """
@@ -260,6 +351,234 @@ class TestSetter(unittest2.TestCase):
         msg = 'Attribute bogus_scalar set error'
         self.assertIsNone(received, msg)
 
+    def test_set_scalar_old_style_class(self):
+        """Set a scalar value -- old-style class.
+        """
+        bogus = OldStyleBogus()
+        bogus.set_bogus_scalar(1)
+
+        received = bogus._bogus_scalar
+        expected = 1
+        msg = 'Old-style class attribute set error'
+        self.assertEqual(received, expected, msg)
+
+    def test_set_scalar_instance_attr(self):
+        """Set a scalar value -- attribute defined on the instance only.
+        """
+        class InstanceBogus(object):
+            def __init__(self, define=True):
+                if define:
+                    self._bogus_scalar = None
+
+            @set_scalar
+            def set_bogus_scalar(self, value):
+                pass
+
+        bogus = InstanceBogus()
+        bogus.set_bogus_scalar('Bogus Value')
+        received = bogus._bogus_scalar
+        expected = 'Bogus Value'
+        msg = 'Instance attribute set error'
+        self.assertEqual(received, expected, msg)
+
+        # The check is not cached for attributes the class lacks.
+        self.assertRaises(AttributeError,
+                          InstanceBogus(define=False).set_bogus_scalar,
+                          'Bogus Value')
+
+    def test_typed_attributes(self):
+        """Set descriptor based typed attributes.
+        """
+        bogus = SlottedBogus()
+
+        received = (bogus.bogus_scalar, bogus.bogus_tuple)
+        expected = (None, ())
+        msg = 'Typed attribute default error'
+        self.assertTupleEqual(received, expected, msg)
+
+        bogus.bogus_scalar = 'Bogus Value'
+        bogus.bogus_date = '2013-10-09 00:00:00'
+        bogus.bogus_tuple = ('tuple item 1', 'tuple item 2')
+        bogus.bogus_list = None
+        bogus.bogus_dict = {'dict item 1': 1}
+
+        received = (bogus.bogus_scalar,
+                    bogus.bogus_date,
+                    bogus.bogus_tuple,
+                    bogus.bogus_list,
+                    bogus.bogus_dict)
+        expected = ('Bogus Value',
+                    datetime.datetime(2013, 10, 9, 0, 0),
+                    ('tuple item 1', 'tuple item 2'),
+                    [],
+                    {'dict item 1': 1})
+        msg = 'Typed attribute set error'
+        self.assertTupleEqual(received, expected, msg)
+
+        msg = 'Slotted typed attributes should not need a __dict__'
+        self.assertFalse(hasattr(bogus, '__dict__'), msg)
+
+    def test_typed_attributes_invalid(self):
+        """Set descriptor based typed attributes -- invalid values.
+        """
+        bogus = SlottedBogus()
+        self.assertRaisesRegexp(TypeError,
+                                "\"\['Bogus Value'\]\" is not a scalar",
+                                setattr,
+                                bogus,
+                                'bogus_scalar',
+                                ['Bogus Value'])
+        self.assertRaises(TypeError, setattr, bogus, 'bogus_list', ())
+        self.assertRaises(AttributeError,
+                          setattr,
+                          bogus,
+                          'bogus_missing',
+                          'Bogus Value')
+
+        msg = 'Typed attribute changed by invalid value'
+        self.assertIsNone(bogus.bogus_scalar, msg)
+
+    def test_typed_attributes_no_validation(self):
+        """Set descriptor based typed attributes -- no validation.
+        """
+        bogus = SlottedBogus()
+        bogus.bogus_trusted = ('not', 'a', 'list')
+
+        received = bogus.bogus_trusted
+        expected = ('not', 'a', 'list')
+        msg = 'Unvalidated typed attribute set error'
+        self.assertTupleEqual(received, expected, msg)
+
+    def test_parse_date(self):
+        """Parse a date string.
+        """
+        value = '2013-10-09 12:34:56'
+        received = parse_date(value)
+        tmp_t = time.strptime(value, '%Y-%m-%d %H:%M:%S')
+        expected = datetime.datetime.fromtimestamp(time.mktime(tmp_t))
+        msg = 'Date parse error'
+        self.assertEqual(received, expected, msg)
+
+        msg = 'Repeated date parse should be memoised'
+        self.assertIs(parse_date(value), received, msg)
+
+        self.assertRaises(ValueError, parse_date, '2013-13-09 12:34:56')
+        self.assertRaises(ValueError, parse_date, '2013-02-30 12:34:56')
+        self.assertRaises(ValueError, parse_date, '2013-10-09T12:34:56')
+
+    def test_parse_date_policy(self):
+        """Parse a date string -- naive timezone policy.
+        """
+        set_date_policy('naive', cache_size=2)
+        try:
+            received = parse_dates(['2013-10-09 12:34:56',
+                                    None,
+                                    '2013-10-10 00:00:00',
+                                    '2013-10-09 12:34:56'])
+            for value in ('2013-10-11 00:00:00',
+                          '2013-10-12 00:00:00',
+                          '2013-10-13 00:00:00'):
+                parse_date(value)
+            cache_size = len(geosutils.setter._date_cache)
+        finally:
+            set_date_policy('local', cache_size=4096)
+
+        expected = [datetime.datetime(2013, 10, 9, 12, 34, 56),
+                    None,
+                    datetime.datetime(2013, 10, 10, 0, 0),
+                    datetime.datetime(2013, 10, 9, 12, 34, 56)]
+        msg = 'Batch date parse error (naive policy)'
+        self.assertListEqual(received, expected, msg)
+
+        msg = 'Date memo should be bounded'
+        self.assertEqual(cache_size, 2, msg)
+
+        self.assertRaises(ValueError, set_date_policy, 'banana')
+
+    def test_assign(self):
+        """Bulk assign typed attributes.
+        """
+        bogus = Bogus()
+        assign(bogus, {'bogus_scalar': 'Bogus Value',
+                       'bogus_date': '2013-10-09 00:00:00',
+                       'bogus_list': None,
+                       'bogus_dict': {'dict item 1': 1}})
+
+        received = (bogus.bogus_scalar,
+                    bogus.bogus_date,
+                    bogus.bogus_list,
+                    bogus.bogus_dict)
+        expected = ('Bogus Value',
+                    datetime.datetime(2013, 10, 9, 0, 0),
+                    [],
+                    {'dict item 1': 1})
+        msg = 'Bulk attribute assignment error'
+        self.assertTupleEqual(received, expected, msg)
+
+        slotted = SlottedBogus()
+        assign(slotted, {'bogus_scalar': 1, 'bogus_tuple': None})
+        received = (slotted.bogus_scalar, slotted.bogus_tuple)
+        expected = (1, ())
+        msg = 'Bulk descriptor assignment error'
+        self.assertTupleEqual(received, expected, msg)
+
+    def test_assign_setter_body(self):
+        """Bulk assign typed attributes -- setter with a body.
+        """
+        bogus = CountingBogus()
+        assign(bogus, {'calls': 3})
+
+        received = (bogus._calls, bogus.counted)
+        expected = (3, 3)
+        msg = 'Bulk assignment should call the setter body'
+        self.assertTupleEqual(received, expected, msg)
+
+    def test_assign_is_transactional(self):
+        """Bulk assign typed attributes -- invalid values.
+        """
+        bogus = Bogus()
+        values = {'bogus_scalar': 'Bogus Value',
+                  'bogus_list': 'not a list'}
+        self.assertRaises(TypeError, assign, bogus, values)
+
+        values = {'bogus_scalar': 'Bogus Value', 'missing_attr': 1}
+        self.assertRaises(AttributeError, assign, bogus, values)
+
+        values = {'bogus_scalar': 'Bogus Value', 'banana': 1}
+        self.assertRaisesRegexp(AttributeError,
+                                "no typed attribute 'banana'",
+                                assign,
+                                bogus,
+                                values)
+
+        msg = 'Failed bulk assignment should not change attributes'
+        self.assertIsNone(bogus.bogus_scalar, msg)
+
+    def test_assign_rollback(self):
+        """Bulk assign typed attributes -- setter body raises.
+        """
+        bogus = CheckedBogus()
+        bogus.set_bogus_scalar('Old Value')
+        values = collections.OrderedDict([('bogus_scalar', 'Bogus Value'),
+                                          ('bogus_list', ['item 1']),
+                                          ('checked', -1)])
+        self.assertRaises(ValueError, assign, bogus, values)
+
+        received = (bogus.bogus_scalar, bogus.bogus_list, bogus._checked)
+        expected = ('Old Value', [], None)
+        msg = 'Failed setter body should roll back applied attributes'
+        self.assertTupleEqual(received, expected, msg)
+
+    def test_setter_docstring_only_body(self):
+        """Setter with a docstring only body is a no-op.
+        """
+        msg = 'Docstring only setter body should be skipped'
+        self.assertIsNone(CheckedBogus.set_noted.setter_body, msg)
+        msg = 'Setter with a body should not be skipped'
+        self.assertIsNotNone(CheckedBogus.set_checked.setter_body, msg)
+        msg = 'Pass only setter body should be skipped'
+        self.assertIsNone(Bogus.set_bogus_scalar.setter_body, msg)
+
     @classmethod
     def tearDownClass(cls):
         cls._bogus = None
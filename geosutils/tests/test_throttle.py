@@ -0,0 +1,105 @@
+# pylint: disable=R0904,W0142,C0103
+""":mod:`geosutils.throttle` tests.
+
+"""
+import unittest2
+import tempfile
+import shutil
+import time
+import os
+
+from geosutils.throttle import (TokenBucket,
+                                IOThrottle)
+from geosutils.files import (copy_file,
+                             move_file)
+
+
+class TestThrottle(unittest2.TestCase):
+    """:mod:`geosutils.throttle`
+    """
+    def test_token_bucket_unlimited(self):
+        """Token bucket -- unlimited rate.
+        """
+        bucket = TokenBucket()
+        received = bucket.delay(10 ** 9)
+        msg = 'Unlimited token bucket should not delay'
+        self.assertEqual(received, 0.0, msg)
+
+    def test_token_bucket_limited(self):
+        """Token bucket -- limited rate.
+        """
+        bucket = TokenBucket(rate=100)
+
+        received = bucket.delay(100)
+        msg = 'Full token bucket should allow a burst without delay'
+        self.assertEqual(received, 0.0, msg)
+
+        received = bucket.delay(50)
+        msg = 'Empty token bucket should delay for the debt'
+        self.assertAlmostEqual(received, 0.5, delta=0.05, msg=msg)
+
+    def test_token_bucket_set_rate(self):
+        """Token bucket -- adjust the rate at runtime.
+        """
+        bucket = TokenBucket(rate=1)
+        bucket.delay(1)
+        bucket.set_rate(None)
+
+        received = bucket.delay(1000)
+        msg = 'Token bucket with limit removed should not delay'
+        self.assertEqual(received, 0.0, msg)
+
+    def test_token_bucket_invalid_rate(self):
+        """Token bucket -- zero or negative rate.
+        """
+        self.assertRaises(ValueError, TokenBucket, rate=0)
+        self.assertRaises(ValueError, TokenBucket, rate=10, burst=0)
+
+        bucket = TokenBucket(rate=100)
+        self.assertRaises(ValueError, bucket.set_rate, -1)
+        msg = 'Rejected rate should leave the bucket unchanged'
+        self.assertEqual(bucket.rate, 100, msg)
+
+        throttle = IOThrottle()
+        self.assertRaises(ValueError,
+                          throttle.set_limits,
+                          bytes_per_sec=1024,
+                          ops_per_sec=0)
+        msg = 'Rejected limits should not be partially applied'
+        self.assertIsNone(throttle.bytes_per_sec, msg)
+
+    def test_io_throttle_copy_file(self):
+        """Throttled copy of a file.
+        """
+        directory = tempfile.mkdtemp()
+        source = os.path.join(directory, 'source')
+        fh = open(source, 'w')
+        fh.write('x' * 2000)
+        fh.close()
+        target = os.path.join(directory, 'target')
+
+        throttle = IOThrottle()
+        throttle.set_filesystem_limits(directory, bytes_per_sec=10000)
+        received = throttle.chunk_size(target)
+        msg = 'Throttle chunk size should not exceed the byte burst'
+        self.assertEqual(received, 10000, msg)
+
+        # Drain the bucket so the copy has to wait.
+        throttle.throttle(target, nbytes=10000)
+        start = time.time()
+        received = copy_file(source, target, throttle=throttle)
+        msg = 'Throttled copy should succeed'
+        self.assertTrue(received, msg)
+        msg = 'Throttled copy target content error'
+        self.assertEqual(open(target).read(), 'x' * 2000, msg)
+        msg = 'Throttled copy should be paced by the byte limit'
+        self.assertGreaterEqual(time.time() - start, 0.15, msg)
+
+        received = move_file(target,
+                             os.path.join(directory, 'moved'),
+                             throttle=throttle)
+        msg = 'Throttled move should succeed'
+        self.assertTrue(received, msg)
+
+        # Clean up.
+        shutil.rmtree(directory)
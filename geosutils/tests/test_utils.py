@@ -3,9 +3,16 @@
 
 """
 import unittest2
+import datetime
 
+import geosutils.utils
 from geosutils.utils import (hashcode,
-                             get_reverse_timestamp)
+                             hashcodes,
+                             HashRing,
+                             get_reverse_timestamp,
+                             get_reverse_timestamps,
+                             decode_reverse_timestamp,
+                             get_reverse_timestamp_range)
 
 
 class TestUtils(unittest2.TestCase):
@@ -20,6 +27,106 @@ class TestUtils(unittest2.TestCase):
         msg = 'Hash code generation error'
         self.assertEqual(received, expected, msg)
 
+    def test_hashcodes(self):
+        """Batch hash code generation.
+        """
+        sources = ['b4c937e3ca5c78d1f7a3fc47dc727e78',
+                   '',
+                   'a',
+                   'trailing null\x00',
+                   '\xff\xfe high bytes',
+                   12345,
+                   'x' * 100]
+        expected = [hashcode(s) for s in sources]
+
+        received = list(hashcodes(sources, use_numpy=False))
+        msg = 'Batch hash code generation error (pure Python)'
+        self.assertListEqual(received, expected, msg)
+
+        received = list(hashcodes(iter(sources)))
+        msg = 'Batch hash code generation error (iterable)'
+        self.assertListEqual(received, expected, msg)
+
+        received = list(hashcodes([]))
+        msg = 'Batch hash code generation error (empty)'
+        self.assertListEqual(received, [], msg)
+
+    @unittest2.skipIf(geosutils.utils.numpy is None, 'numpy not available')
+    def test_hashcodes_numpy(self):
+        """Batch hash code generation -- numpy.
+        """
+        numpy = geosutils.utils.numpy
+        sources = numpy.array(['b4c937e3ca5c78d1f7a3fc47dc727e78',
+                               'abc',
+                               ''])
+        received = hashcodes(sources)
+        msg = 'Batch hash code (numpy) should be an int32 array'
+        self.assertEqual(received.dtype, numpy.int32, msg)
+
+        expected = [hashcode(s) for s in sources]
+        msg = 'Batch hash code generation error (numpy)'
+        self.assertListEqual(list(received), expected, msg)
+
+    def test_hash_ring(self):
+        """Consistent hash ring lookups.
+        """
+        ring = HashRing(range(10))
+        keys = ['key_%d' % i for i in range(2000)]
+
+        received = ring.get_nodes(keys)
+        expected = [ring.get_node(k) for k in keys]
+        msg = 'Hash ring batch lookup error'
+        self.assertListEqual(received, expected, msg)
+
+        msg = 'Hash ring should use every node'
+        self.assertSetEqual(set(received), set(range(10)), msg)
+
+        received = HashRing().get_node('key')
+        msg = 'Empty hash ring lookup should return None'
+        self.assertIsNone(received, msg)
+
+    def test_hash_ring_add_remove_node(self):
+        """Consistent hash ring -- add and remove nodes.
+        """
+        ring = HashRing(range(10))
+        keys = ['key_%d' % i for i in range(2000)]
+        before = ring.get_nodes(keys)
+
+        moved = ring.add_node(10)
+        after = ring.get_nodes(keys)
+        changed = [(b, a) for b, a in zip(before, after) if b != a]
+        msg = 'Hash ring add node should only move keys to the new node'
+        self.assertTrue(all(a == 10 for _, a in changed), msg)
+        msg = 'Hash ring add node should move roughly 1/n of the keys'
+        self.assertLess(len(changed), len(keys) / 5, msg)
+
+        msg = 'Hash ring moved ranges should all go to the new node'
+        self.assertTrue(moved, msg)
+        self.assertTrue(all(m[3] == 10 for m in moved), msg)
+
+        # Every changed key lies in a reported moved range.
+        positions = [ring._hash_func(k) for k in keys]
+        for position, (b, a) in zip(positions, zip(before, after)):
+            in_range = any(start < position <= end and old == b
+                           for start, end, old, _ in moved)
+            msg = 'Hash ring moved range report error'
+            self.assertEqual(in_range, b != a, msg)
+
+        moved = ring.remove_node(10)
+        msg = 'Hash ring remove node should restore the assignment'
+        self.assertListEqual(ring.get_nodes(keys), before, msg)
+        msg = 'Hash ring removed node ranges should come from the node'
+        self.assertTrue(all(m[2] == 10 for m in moved), msg)
+
+    def test_hash_ring_weights(self):
+        """Consistent hash ring -- node weights.
+        """
+        ring = HashRing({'small': 1, 'big': 3})
+        keys = ['key_%d' % i for i in range(4000)]
+        received = ring.get_nodes(keys).count('big')
+        msg = 'Hash ring weighted node should receive more keys'
+        self.assertGreater(received, 2 * len(keys) / 4 + 500, msg)
+
     def test_get_reverse_timestamp(self):
         """Generate reverse timestamp.
         """
@@ -52,3 +159,104 @@ class TestUtils(unittest2.TestCase):
         received = get_reverse_timestamp('1996121710--')
         msg = 'Reverse timestamp error: invalid source (unknown delim)'
         self.assertIsNone(received, msg)
+
+    def test_get_reverse_timestamps(self):
+        """Generate reverse timestamps in bulk.
+        """
+        utc_times = ['19961217102630',
+                     '19971217102630',
+                     '19961217000000',
+                     '20000229235959',
+                     '19000101000000',
+                     '20121231235960',
+                     '199612171026',
+                     '1996121710--']
+        expected = [get_reverse_timestamp(t) for t in utc_times]
+
+        received = get_reverse_timestamps(utc_times)
+        msg = 'Bulk reverse timestamp error'
+        self.assertListEqual(received, expected, msg)
+
+        received = get_reverse_timestamps(iter(utc_times), use_numpy=False)
+        msg = 'Bulk reverse timestamp error (pure Python)'
+        self.assertListEqual(received, expected, msg)
+
+    def test_get_reverse_timestamps_invalid_date(self):
+        """Generate reverse timestamps in bulk -- invalid date.
+        """
+        utc_times = ['19960230102630',
+                     'abcdefghijklmn',
+                     '19961317102630',
+                     '00000101000000',
+                     '19961217102630']
+        for use_numpy in (True, False):
+            received = get_reverse_timestamps(utc_times, use_numpy=use_numpy)
+            expected = [None, None, None, None,
+                        get_reverse_timestamp('19961217102630')]
+            msg = 'Bulk reverse timestamp invalid date error (numpy: %s)'
+            self.assertListEqual(received, expected, msg % use_numpy)
+
+        received = get_reverse_timestamp('19961317102630')
+        msg = 'Reverse timestamp error: invalid month'
+        self.assertIsNone(received, msg)
+
+    def test_decode_reverse_timestamp(self):
+        """Decode a reverse timestamp.
+        """
+        reverse_ts = get_reverse_timestamp('19961217102630')
+
+        received = decode_reverse_timestamp(reverse_ts)
+        expected = 850818390.0
+        msg = 'Reverse timestamp decode error'
+        self.assertEqual(received, expected, msg)
+
+        received = decode_reverse_timestamp(reverse_ts, as_datetime=True)
+        expected = datetime.datetime(1996, 12, 17, 10, 26, 30)
+        msg = 'Reverse timestamp decode error (datetime)'
+        self.assertEqual(received, expected, msg)
+
+        received = decode_reverse_timestamp('banana')
+        msg = 'Reverse timestamp decode error (invalid)'
+        self.assertIsNone(received, msg)
+
+    def test_get_reverse_timestamp_range(self):
+        """Reverse timestamp range scan bounds.
+        """
+        start_key, stop_key = get_reverse_timestamp_range(
+            '19961217000000',
+            datetime.datetime(1996, 12, 18))
+
+        utc_times = {'19961216235959': False,
+                     '19961217000000': True,
+                     '19961217102630': True,
+                     '19961217235959': True,
+                     '19961218000000': False}
+        for utc_time, expected in utc_times.iteritems():
+            reverse_ts = get_reverse_timestamp(utc_time)
+            received = start_key <= reverse_ts < stop_key
+            msg = 'Reverse timestamp range error for %s' % utc_time
+            self.assertEqual(received, expected, msg)
+
+        received = get_reverse_timestamp_range(850780800, 'banana')
+        msg = 'Reverse timestamp range error (invalid end)'
+        self.assertIsNone(received, msg)
+
+    def test_get_reverse_timestamp_range_truncated(self):
+        """Reverse timestamp range scan bounds -- truncated prefixes.
+        """
+        start = '19961217000000'
+        end = '19961218000000'
+        full_start, full_stop = get_reverse_timestamp_range(start, end)
+
+        received = get_reverse_timestamp_range(start,
+                                               end,
+                                               digits=12,
+                                               key_prefix='r3gx2f|')
+        expected = ('r3gx2f|092225211696', 'r3gx2f|092225212561')
+        msg = 'Truncated reverse timestamp range error'
+        self.assertTupleEqual(received, expected, msg)
+
+        start_key, stop_key = [k[len('r3gx2f|'):] for k in received]
+        msg = 'Truncated range should cover the full range'
+        self.assertLessEqual(start_key, full_start[:12], msg)
+        self.assertGreaterEqual(stop_key, full_stop[:12], msg)
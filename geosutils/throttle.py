@@ -0,0 +1,246 @@
+"""Token bucket based I/O bandwidth throttling.
+
+An :class:`IOThrottle` can be passed to the
+:func:`geosutils.files.copy_file` and :func:`geosutils.files.move_file`
+functions to cap the bytes-per-second and operations-per-second that
+they consume.  Limits can apply process-wide and/or per target
+filesystem and can be adjusted at runtime::
+
+    >>> from geosutils.throttle import io_throttle
+    >>> from geosutils.files import copy_file
+    >>> # Peak ingest -- cap bulk copies at 20 MB/s, 200 ops/s.
+    >>> io_throttle.set_limits(bytes_per_sec=20 * 1024 ** 2,
+    ...                        ops_per_sec=200)
+    >>> copy_file(source, target, throttle=io_throttle)
+    >>> # Off-peak -- full speed.
+    >>> io_throttle.set_limits()
+
+"""
+__all__ = [
+    "TokenBucket",
+    "IOThrottle",
+    "io_throttle",
+]
+import os
+import time
+import threading
+
+
+class TokenBucket(object):
+    """Thread-safe token bucket.
+
+    Tokens accrue at *rate* per second up to a maximum of *burst*.
+    A *rate* of ``None`` means unlimited.
+
+    """
+    def __init__(self, rate=None, burst=None):
+        """:class:`TokenBucket` initialisation.
+        """
+        self._lock = threading.Lock()
+        self._rate = None
+        self._burst = None
+        self._tokens = 0.0
+        self._stamp = time.time()
+        self.set_rate(rate, burst)
+
+    @property
+    def rate(self):
+        return self._rate
+
+    @property
+    def burst(self):
+        return self._burst
+
+    def set_rate(self, rate=None, burst=None):
+        """Adjust the bucket *rate* (tokens per second) and *burst*
+        (defaults to one second's worth of tokens).
+
+        **Raises:**
+            :class:`ValueError` if *rate* or *burst* is not positive
+
+        """
+        _check_positive('rate', rate)
+        _check_positive('burst', burst)
+
+        with self._lock:
+            self._refill()
+            was_unlimited = self._rate is None
+            self._rate = rate
+            if rate is not None and burst is None:
+                burst = rate
+            self._burst = burst
+            if burst is None:
+                self._tokens = 0.0
+            elif was_unlimited:
+                # A newly limited bucket starts full.
+                self._tokens = float(burst)
+            else:
+                self._tokens = min(self._tokens, burst)
+
+    def delay(self, amount=1):
+        """Take *amount* tokens from the bucket, going into debt if
+        there are not enough.
+
+        **Returns:**
+            the number of seconds the caller must wait before the
+            debt is repaid
+
+        """
+        with self._lock:
+            if self._rate is None:
+                return 0.0
+
+            self._refill()
+            self._tokens -= amount
+            wait = 0.0
+            if self._tokens < 0:
+                wait = -self._tokens / float(self._rate)
+
+            return wait
+
+    def consume(self, amount=1):
+        """Take *amount* tokens from the bucket, blocking until the
+        bucket can afford them.
+
+        """
+        wait = self.delay(amount)
+        if wait > 0:
+            time.sleep(wait)
+
+    def _refill(self):
+        now = time.time()
+        if self._rate is not None:
+            self._tokens = min(self._burst,
+                               self._tokens +
+                               (now - self._stamp) * self._rate)
+        self._stamp = now
+
+
+class IOThrottle(object):
+    """Byte and operation rate limits shared across the file APIs.
+
+    Process-wide limits are set via :meth:`set_limits`.  Limits for
+    the filesystem that holds a given path are set via
+    :meth:`set_filesystem_limits`.  When both apply, the caller waits
+    for the slower of the two.
+
+    """
+    def __init__(self, bytes_per_sec=None, ops_per_sec=None):
+        """:class:`IOThrottle` initialisation.
+        """
+        self._lock = threading.Lock()
+        self._bytes = TokenBucket(bytes_per_sec)
+        self._ops = TokenBucket(ops_per_sec)
+        self._fs_buckets = {}
+
+    @property
+    def bytes_per_sec(self):
+        return self._bytes.rate
+
+    @property
+    def ops_per_sec(self):
+        return self._ops.rate
+
+    def set_limits(self, bytes_per_sec=None, ops_per_sec=None):
+        """Set the process-wide limits.  ``None`` removes the limit.
+        """
+        _check_positive('bytes_per_sec', bytes_per_sec)
+        _check_positive('ops_per_sec', ops_per_sec)
+
+        self._bytes.set_rate(bytes_per_sec)
+        self._ops.set_rate(ops_per_sec)
+
+    def set_filesystem_limits(self,
+                              path,
+                              bytes_per_sec=None,
+                              ops_per_sec=None):
+        """Set the limits for the filesystem that holds *path*.
+        ``None`` removes the limit.
+
+        """
+        _check_positive('bytes_per_sec', bytes_per_sec)
+        _check_positive('ops_per_sec', ops_per_sec)
+
+        device = filesystem_id(path)
+        with self._lock:
+            buckets = self._fs_buckets.get(device)
+            if buckets is None:
+                buckets = (TokenBucket(), TokenBucket())
+                self._fs_buckets[device] = buckets
+
+        buckets[0].set_rate(bytes_per_sec)
+        buckets[1].set_rate(ops_per_sec)
+
+    def chunk_size(self, path, default=1024 * 1024):
+        """Size of the I/O chunk that a throttled copy to *path* should
+        use, so that a single chunk does not exceed the burst allowance.
+
+        """
+        sizes = [default]
+        for bucket in self._byte_buckets(path):
+            if bucket.burst is not None:
+                sizes.append(max(1, int(bucket.burst)))
+
+        return min(sizes)
+
+    def throttle(self, path, nbytes=0, ops=0):
+        """Account for *nbytes* and *ops* against *path*, blocking until
+        all of the applicable limits allow it.
+
+        """
+        wait = 0.0
+        if nbytes:
+            for bucket in self._byte_buckets(path):
+                wait = max(wait, bucket.delay(nbytes))
+        if ops:
+            for bucket in self._op_buckets(path):
+                wait = max(wait, bucket.delay(ops))
+
+        if wait > 0:
+            time.sleep(wait)
+
+    def _byte_buckets(self, path):
+        buckets = [self._bytes]
+        if self._fs_buckets:
+            fs_buckets = self._fs_buckets.get(filesystem_id(path))
+            if fs_buckets is not None:
+                buckets.append(fs_buckets[0])
+
+        return buckets
+
+    def _op_buckets(self, path):
+        buckets = [self._ops]
+        if self._fs_buckets:
+            fs_buckets = self._fs_buckets.get(filesystem_id(path))
+            if fs_buckets is not None:
+                buckets.append(fs_buckets[1])
+
+        return buckets
+
+
+def _check_positive(name, value):
+    """Reject a limit *value* that is neither ``None`` (unlimited) nor
+    positive.  Use ``None`` rather than ``0`` to remove a limit.
+
+    """
+    if value is not None and not value > 0:
+        raise ValueError('%s must be positive or None: %r' % (name, value))
+
+
+def filesystem_id(path):
+    """Identify the filesystem that holds *path* (or would hold it, if
+    it does not exist yet) by its device number.
+
+    """
+    path = os.path.abspath(path)
+    while True:
+        try:
+            return os.stat(path).st_dev
+        except OSError:
+            parent = os.path.dirname(path)
+            if parent == path:
+                return None
+            path = parent
+
+
+io_throttle = IOThrottle()
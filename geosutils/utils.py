@@ -2,14 +2,41 @@
 
 """
 __all__ = ['hashcode',
-           'get_reverse_timestamp']
+           'hashcodes',
+           'HashRing',
+           'ring_hash',
+           'get_reverse_timestamp',
+           'get_reverse_timestamps',
+           'decode_reverse_timestamp',
+           'get_reverse_timestamp_range']
 
 import sys
 import time
+import array
+import bisect
+import struct
+import hashlib
 import calendar
+import datetime
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 from geosutils.log import log
 
+# Multiplicative inverse of 31 modulo 2**32.  Used to undo the effect of
+# the zero padding in the vectorised hashcodes().
+HASH_INV_31 = 31
+for _ in range(5):
+    HASH_INV_31 = (HASH_INV_31 * (2 - 31 * HASH_INV_31)) & 0xFFFFFFFF
+
+# Number of strings hashed per vectorised chunk.
+HASH_CHUNK_SIZE = 65536
+
+EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+
 
 def hashcode(source):
     """Will convert the variable length *source* string into a hash code.
@@ -28,14 +55,306 @@ def hashcode(source):
         integer representation
 
     """
-    code = 0
-    for char_seq in str(source):
-        code = (31 * code + ord(char_seq)) & 0xFFFFFFFF
+    code = _hashcode(source)
+
+    log.debug('Hash code for source "%s": %d', source, code & 0xFFFFFFFF)
 
-    log.debug('Hash code for source "%s": %d' % (source, code))
+    return code
+
+
+def _hashcode(source):
+    """Silent equivalent of :func:`hashcode`.
+    """
+    code = 0
+    for char_seq in bytearray(str(source)):
+        code = (31 * code + char_seq) & 0xFFFFFFFF
 
     return ((code + 0x80000000) & 0xFFFFFFFF) - 0x80000000
 
+
+def hashcodes(sources, use_numpy=True):
+    """Batch variant of :func:`hashcode` that converts every string in
+    *sources* into its hash code.
+
+    Results are identical to calling :func:`hashcode` on each item.  If
+    :mod:`numpy` is available, the strings are hashed in chunks as
+    fixed-width byte arrays with vectorised 32-bit arithmetic.
+    Otherwise, a pure Python loop is used.  No logging is performed
+    per item.
+
+    **Args:**
+        *sources*: iterable (or :mod:`numpy` array) of strings
+
+    **Kwargs:**
+        *use_numpy*: set to ``False`` to force the pure Python
+        implementation
+
+    **Returns:**
+        packed signed 32-bit integers -- a :mod:`numpy` ``int32`` array
+        if :mod:`numpy` is used.  Otherwise, an :mod:`array` of type
+        ``'i'``
+
+    """
+    if numpy is not None and use_numpy:
+        return _hashcodes_numpy(sources)
+
+    return _hashcodes_python(sources)
+
+
+def _hashcodes_python(sources):
+    codes = array.array('i')
+    append = codes.append
+    for source in sources:
+        code = 0
+        for char_seq in bytearray(str(source)):
+            code = (31 * code + char_seq) & 0xFFFFFFFF
+        if code & 0x80000000:
+            code -= 0x100000000
+        append(code)
+
+    return codes
+
+
+def _hashcodes_numpy(sources):
+    """Hash each chunk of *sources* as a zero padded ``(n, width)``
+    ``uint8`` matrix, one column at a time.  The trailing padding
+    multiplies each hash by ``31 ** padding`` which is then undone with
+    the modular inverse of 31.
+
+    """
+    if not isinstance(sources, (list, tuple, numpy.ndarray)):
+        sources = list(sources)
+
+    chunks = []
+    for start in range(0, len(sources), HASH_CHUNK_SIZE):
+        chunk = [str(s) for s in sources[start:start + HASH_CHUNK_SIZE]]
+        lengths = numpy.fromiter((len(s) for s in chunk),
+                                 dtype=numpy.intp,
+                                 count=len(chunk))
+        width = int(lengths.max()) if len(chunk) else 0
+
+        codes = numpy.zeros(len(chunk), dtype=numpy.uint32)
+        if width:
+            matrix = numpy.array(chunk, dtype='S%d' % width)
+            matrix = matrix.view(numpy.uint8).reshape(len(chunk), width)
+            multiplier = numpy.uint32(31)
+            for column in range(width):
+                codes *= multiplier
+                codes += matrix[:, column]
+
+            # Powers of the inverse of 31 for each possible padding.
+            inv_powers = numpy.empty(width + 1, dtype=numpy.uint32)
+            power = 1
+            for padding in range(width + 1):
+                inv_powers[padding] = power
+                power = (power * HASH_INV_31) & 0xFFFFFFFF
+            codes *= inv_powers[width - lengths]
+
+        chunks.append(codes.view(numpy.int32))
+
+    if not chunks:
+        return numpy.zeros(0, dtype=numpy.int32)
+
+    return numpy.concatenate(chunks)
+
+
+class HashRing(object):
+    """Consistent hash ring that maps keys to nodes (shards, stripes,
+    workers, etc).
+
+    Each node is placed on a 32-bit ring at a number of virtual node
+    positions proportional to its weight.  A key belongs to the first
+    virtual node at or after the key's position, wrapping around at the
+    end of the ring.  Unlike ``hashcode(key) % n``, adding or removing a
+    node only moves the keys in the ranges that the node gains or
+    loses -- roughly ``1/n`` of them.
+
+    For example, to assign keys to the ``[ingest] shards``::
+
+        >>> from geosutils.utils import HashRing
+        >>> ring = HashRing(range(10))
+        >>> ring.get_node('b4c937e3ca5c78d1f7a3fc47dc727e78')
+        8
+        >>> moved = ring.add_node(10)
+
+    .. attribute:: *vnodes*
+
+        number of virtual nodes for a node of weight 1
+
+    .. attribute:: *nodes*
+
+        dictionary of the node weights on the ring
+
+    """
+    def __init__(self, nodes=None, vnodes=100, hash_func=None):
+        """:class:`HashRing` initialisation.
+
+        **Kwargs:**
+            *nodes*: iterable of nodes (each of weight 1) or a
+            dictionary of node weights
+
+            *vnodes*: number of virtual nodes for a node of weight 1
+
+            *hash_func*: function that maps a string to an unsigned
+            32-bit ring position.  Defaults to the leading 32 bits of
+            the string's MD5 digest
+
+        """
+        self._vnodes = vnodes
+        self._hash_func = hash_func or ring_hash
+        self._weights = {}
+        self._positions = []
+        self._owners = []
+        self._np_positions = None
+
+        if nodes is not None:
+            if not isinstance(nodes, dict):
+                nodes = dict((node, 1) for node in nodes)
+            self._weights.update(nodes)
+        self._build()
+
+    @property
+    def vnodes(self):
+        return self._vnodes
+
+    @property
+    def nodes(self):
+        return dict(self._weights)
+
+    def __len__(self):
+        return len(self._weights)
+
+    def add_node(self, node, weight=1):
+        """Add *node* (or change its weight) on the ring.
+
+        **Returns:**
+            the key ranges that move as per :meth:`moved_ranges`
+
+        """
+        old = self._copy()
+        self._weights[node] = weight
+        self._build()
+
+        return old.moved_ranges(self)
+
+    def remove_node(self, node):
+        """Remove *node* from the ring.
+
+        **Returns:**
+            the key ranges that move as per :meth:`moved_ranges`
+
+        """
+        old = self._copy()
+        del self._weights[node]
+        self._build()
+
+        return old.moved_ranges(self)
+
+    def get_node(self, key):
+        """Node that *key* belongs to, or ``None`` if the ring is empty.
+        """
+        return self.get_node_for_position(self._hash_func(str(key)))
+
+    def get_node_for_position(self, position):
+        if not self._positions:
+            return None
+
+        index = bisect.bisect_left(self._positions, position)
+        if index == len(self._positions):
+            index = 0
+
+        return self._owners[index]
+
+    def get_nodes(self, keys):
+        """Batch variant of :meth:`get_node`.
+
+        If :mod:`numpy` is available, the ring lookups are vectorised.
+
+        **Returns:**
+            list of nodes, one for each of *keys*
+
+        """
+        if not self._positions:
+            return [None for _ in keys]
+
+        hash_func = self._hash_func
+        positions = [hash_func(str(key)) for key in keys]
+
+        if numpy is not None:
+            if self._np_positions is None:
+                self._np_positions = numpy.array(self._positions,
+                                                 dtype=numpy.uint32)
+            indexes = numpy.searchsorted(self._np_positions,
+                                         numpy.array(positions,
+                                                     dtype=numpy.uint32),
+                                         side='left')
+            indexes[indexes == len(self._positions)] = 0
+            owners = self._owners
+
+            return [owners[i] for i in indexes.tolist()]
+
+        return [self.get_node_for_position(p) for p in positions]
+
+    def moved_ranges(self, other):
+        """Compare this ring with *other*.
+
+        **Returns:**
+            list of ``(start, end, old_node, new_node)`` tuples in ring
+            order.  Each tuple covers the key positions greater than
+            *start* and up to and including *end*, whose node is
+            *old_node* in this ring and *new_node* in *other*.  A
+            *start* of ``-1`` denotes the start of the ring
+
+        """
+        boundaries = sorted(set(self._positions) | set(other._positions))
+        if not boundaries or boundaries[-1] != 0xFFFFFFFF:
+            boundaries.append(0xFFFFFFFF)
+
+        moved = []
+        start = -1
+        for end in boundaries:
+            old_node = self.get_node_for_position(end)
+            new_node = other.get_node_for_position(end)
+            if old_node != new_node:
+                if (moved and moved[-1][1] == start and
+                   moved[-1][2:] == (old_node, new_node)):
+                    moved[-1] = (moved[-1][0], end, old_node, new_node)
+                else:
+                    moved.append((start, end, old_node, new_node))
+            start = end
+
+        return moved
+
+    def _copy(self):
+        ring = HashRing(vnodes=self._vnodes, hash_func=self._hash_func)
+        ring._weights = dict(self._weights)
+        ring._positions = self._positions
+        ring._owners = self._owners
+
+        return ring
+
+    def _build(self):
+        points = {}
+        for node, weight in self._weights.iteritems():
+            for vnode in range(int(round(self._vnodes * weight))):
+                position = self._hash_func('%s#%d' % (node, vnode))
+                # Resolve (unlikely) collisions deterministically.
+                if position not in points or node < points[position]:
+                    points[position] = node
+
+        self._positions = sorted(points)
+        self._owners = [points[p] for p in self._positions]
+        self._np_positions = None
+
+
+def ring_hash(source):
+    """Unsigned 32-bit :class:`HashRing` position of the string
+    *source* (the leading 32 bits of its MD5 digest).
+
+    """
+    return struct.unpack('>I', hashlib.md5(source).digest()[:4])[0]
+
+
 def get_reverse_timestamp(utc_time=None):
     """Converts a string representation of time denoted by *utc_time*
     into a reverse timestamp.
@@ -72,24 +391,320 @@ def get_reverse_timestamp(utc_time=None):
         if the conversion fails
 
     """
-    log.debug('Generating reverse timestamp for UTC string "%s"' %
-                utc_time)
+    log.debug('Generating reverse timestamp for UTC string "%s"', utc_time)
     reverse_ts = None
     secs_since_epoch = None
 
+    secs_since_epoch = _utc_seconds(utc_time)
+    if secs_since_epoch is None:
+        log.error('Unsupported UTC time: "%s"', utc_time)
+
+    if secs_since_epoch is not None:
+        reverse_ts = sys.maxint - int(secs_since_epoch * 10 ** 6)
+        reverse_ts = str(reverse_ts).zfill(20)
+
+    log.info('Source UTC|Reverse timestring: "%s|%s"', utc_time, reverse_ts)
+
+    return reverse_ts
+
+
+def get_reverse_timestamps(utc_times, use_numpy=True):
+    """Batch variant of :func:`get_reverse_timestamp` that converts
+    every ``CCYYMMDDhhmmss`` string in *utc_times*.
+
+    Well-formed values are converted with a fixed-width parser --
+    vectorised with :mod:`numpy` if available.  Otherwise, the date
+    prefix of each value is memoized so repeated dates are only
+    validated once.  Anything else goes through the same conversion as
+    :func:`get_reverse_timestamp`, so the results are identical.  No
+    logging is performed per item.
+
+    **Args:**
+        *utc_times*: iterable (or :mod:`numpy` array) of UTC time
+        strings.  ``None`` items convert the current time
+
+    **Kwargs:**
+        *use_numpy*: set to ``False`` to force the pure Python
+        implementation
+
+    **Returns:**
+        list of 20 character reverse timestamp strings (``None`` for
+        each unsupported value)
+
+    """
+    if numpy is not None and use_numpy:
+        reverse_ts = _reverse_timestamps_numpy(utc_times)
+    else:
+        reverse_ts = _reverse_timestamps_python(utc_times)
+
+    unsupported = reverse_ts.count(None)
+    if unsupported:
+        log.error('Unsupported UTC times in batch: %d', unsupported)
+
+    return reverse_ts
+
+
+def decode_reverse_timestamp(reverse_ts, as_datetime=False):
+    """Inverse of :func:`get_reverse_timestamp`.
+
+    **Args:**
+        *reverse_ts*: the reverse timestamp string (or integer)
+
+    **Kwargs:**
+        *as_datetime*: return a naive UTC :class:`datetime.datetime`
+        rather than seconds since epoch
+
+    **Returns:**
+        UTC seconds since epoch as a float (or a
+        :class:`datetime.datetime`) or ``None`` if *reverse_ts* cannot
+        be decoded
+
+    """
+    try:
+        micros = sys.maxint - int(reverse_ts)
+    except (TypeError, ValueError):
+        log.error('Unsupported reverse timestamp: "%s"', reverse_ts)
+        return None
+
+    if as_datetime:
+        return (datetime.datetime(1970, 1, 1) +
+                datetime.timedelta(microseconds=micros))
+
+    return micros / 1000000.0
+
+
+def get_reverse_timestamp_range(start, end, digits=None, key_prefix=''):
+    """Row key bounds for a range scan over the UTC window
+    [*start*, *end*).
+
+    As newer times have smaller reverse timestamps, the bounds are
+    swapped relative to the window: the scan starts at the reverse
+    timestamp of (just before) *end* and stops after the reverse
+    timestamp of *start*.
+
+    **Args:**
+        *start*: inclusive start of the window as a ``CCYYMMDDhhmmss``
+        string, a naive UTC :class:`datetime.datetime` or UTC seconds
+        since epoch
+
+        *end*: exclusive end of the window (as per *start*)
+
+    **Kwargs:**
+        *digits*: truncate the bounds to the leading *digits*
+        characters of the 20 character reverse timestamp to scan
+        coarser, bucket-aligned key prefixes.  The truncated range
+        covers the whole window, widened to the bucket boundaries
+
+        *key_prefix*: string to prepend to both bounds (for example,
+        the leading components of a composite row key)
+
+    **Returns:**
+        tuple of (*start_key*, *stop_key*) where *start_key* is
+        inclusive and *stop_key* exclusive.  ``None`` if either of
+        *start* or *end* is not supported
+
+    """
+    start_micros = _utc_micros(start)
+    end_micros = _utc_micros(end)
+    if start_micros is None or end_micros is None:
+        log.error('Unsupported reverse timestamp range: "%s" to "%s"',
+                  start, end)
+        return None
+
+    # Window times t where start <= t < end have reverse timestamps r
+    # where maxint - end < r <= maxint - start.
+    start_key = str(sys.maxint - end_micros + 1).zfill(20)
+    stop_key = str(sys.maxint - start_micros + 1).zfill(20)
+
+    if digits is not None:
+        start_key = start_key[:digits]
+        if stop_key[digits:].strip('0'):
+            stop_key = str(int(stop_key[:digits]) + 1).zfill(digits)
+        else:
+            stop_key = stop_key[:digits]
+
+    return (key_prefix + start_key, key_prefix + stop_key)
+
+
+def _utc_micros(value):
+    """Microseconds since epoch of a ``CCYYMMDDhhmmss`` string, naive
+    UTC :class:`datetime.datetime` or UTC seconds *value*.
+
+    """
+    if isinstance(value, datetime.datetime):
+        return (calendar.timegm(value.utctimetuple()) * 1000000 +
+                value.microsecond)
+    elif isinstance(value, (int, long, float)):
+        return int(round(value * 1000000))
+    elif isinstance(value, basestring):
+        secs = _utc_seconds(value)
+        if secs is not None:
+            return int(secs) * 1000000
+
+    return None
+
+
+def _utc_seconds(utc_time):
+    """Seconds since epoch of the ``CCYYMMDDhhmmss`` *utc_time* (or
+    the current time if ``None``).  ``None`` if *utc_time* is not
+    supported.
+
+    """
+    secs_since_epoch = None
+
     if utc_time is None:
         secs_since_epoch = time.time()
     elif len(utc_time) == 14 and '-' not in utc_time:
-        utc_struct_time = time.strptime(utc_time, '%Y%m%d%H%M%S')
+        try:
+            utc_struct_time = time.strptime(utc_time, '%Y%m%d%H%M%S')
+        except ValueError:
+            return None
         secs_since_epoch = calendar.timegm(utc_struct_time)
-    else:
-        log.error('Unsupported UTC time: "%s"' % utc_time)
 
+    return secs_since_epoch
+
+
+def _reverse_timestamp(utc_time):
+    """Silent equivalent of :func:`get_reverse_timestamp`.
+
+    Well-formed ``CCYYMMDDhhmmss`` values are converted with the same
+    fixed-width parser as :func:`get_reverse_timestamps`, bypassing
+    :func:`time.strptime`.
+
+    """
+    if (isinstance(utc_time, str) and
+       len(utc_time) == 14 and
+       utc_time.isdigit()):
+        base = _day_seconds(utc_time[:8])
+        hours = int(utc_time[8:10])
+        minutes = int(utc_time[10:12])
+        seconds = int(utc_time[12:14])
+        if (base is not None and
+           hours < 24 and
+           minutes < 60 and
+           seconds < 62):
+            secs = base + hours * 3600 + minutes * 60 + seconds
+            return '%020d' % (sys.maxint - secs * 1000000)
+
+    reverse_ts = None
+
+    secs_since_epoch = _utc_seconds(utc_time)
     if secs_since_epoch is not None:
         reverse_ts = sys.maxint - int(secs_since_epoch * 10 ** 6)
         reverse_ts = str(reverse_ts).zfill(20)
 
-    log.info('Source UTC|Reverse timestring: "%s|%s"' %
-                (utc_time, reverse_ts))
+    return reverse_ts
+
+
+def _day_seconds(date_prefix):
+    """Seconds since epoch at the start of the ``CCYYMMDD``
+    *date_prefix*, or ``None`` if it is not a valid date.
+
+    """
+    try:
+        date = datetime.date(int(date_prefix[0:4]),
+                             int(date_prefix[4:6]),
+                             int(date_prefix[6:8]))
+    except ValueError:
+        return None
+
+    return (date.toordinal() - EPOCH_ORDINAL) * 86400
+
+
+def _reverse_timestamps_python(utc_times):
+    maxint = sys.maxint
+    day_seconds = {}
+    reverse_ts = []
+    append = reverse_ts.append
+
+    for utc_time in utc_times:
+        if (isinstance(utc_time, str) and
+           len(utc_time) == 14 and
+           utc_time.isdigit()):
+            prefix = utc_time[:8]
+            try:
+                base = day_seconds[prefix]
+            except KeyError:
+                base = day_seconds[prefix] = _day_seconds(prefix)
+
+            hours = int(utc_time[8:10])
+            minutes = int(utc_time[10:12])
+            seconds = int(utc_time[12:14])
+            if (base is not None and
+               hours < 24 and
+               minutes < 60 and
+               seconds < 62):
+                secs = base + hours * 3600 + minutes * 60 + seconds
+                append('%020d' % (maxint - secs * 1000000))
+                continue
+
+        append(_reverse_timestamp(utc_time))
 
     return reverse_ts
+
+
+def _reverse_timestamps_numpy(utc_times):
+    """Parse the well-formed values of *utc_times* as a ``(n, 14)``
+    matrix of digits and convert the dates to days since epoch with
+    integer civil calendar arithmetic.
+
+    """
+    utc_times = list(utc_times)
+    fast = numpy.fromiter((isinstance(t, str) and
+                           len(t) == 14 and
+                           t.isdigit() for t in utc_times),
+                          dtype=bool,
+                          count=len(utc_times))
+    if not len(utc_times):
+        return []
+
+    values = numpy.array([t if ok else '0' * 14
+                          for t, ok in zip(utc_times, fast)],
+                         dtype='S14')
+    digits = values.view(numpy.uint8).reshape(len(utc_times), 14)
+    digits = digits.astype(numpy.int64) - ord('0')
+
+    def field(start, end):
+        value = numpy.zeros(len(utc_times), dtype=numpy.int64)
+        for column in range(start, end):
+            value = value * 10 + digits[:, column]
+        return value
+
+    year = field(0, 4)
+    month = field(4, 6)
+    day = field(6, 8)
+    hours = field(8, 10)
+    minutes = field(10, 12)
+    seconds = field(12, 14)
+
+    leap = (year % 4 == 0) & ((year % 100 != 0) | (year % 400 == 0))
+    month_days = numpy.array([0, 31, 28, 31, 30, 31, 30,
+                              31, 31, 30, 31, 30, 31])
+    days_in_month = (month_days[numpy.clip(month, 0, 12)] +
+                     ((month == 2) & leap))
+    fast &= ((year >= 1) &
+             (month >= 1) & (month <= 12) &
+             (day >= 1) & (day <= days_in_month) &
+             (hours < 24) & (minutes < 60) & (seconds < 62))
+
+    # Days since epoch from the civil date.
+    shifted = year - (month <= 2)
+    era = shifted // 400
+    year_of_era = shifted - era * 400
+    day_of_year = ((153 * (month + numpy.where(month > 2, -3, 9)) + 2) // 5 +
+                   day - 1)
+    day_of_era = (year_of_era * 365 + year_of_era // 4 -
+                  year_of_era // 100 + day_of_year)
+    days = era * 146097 + day_of_era - 719468
+
+    secs = days * 86400 + hours * 3600 + minutes * 60 + seconds
+
+    # Pre-epoch reverse timestamps do not fit in an int64.
+    fast &= secs >= 0
+    reverse = sys.maxint - numpy.where(fast, secs, 0) * 1000000
+    reverse = numpy.char.zfill(reverse.astype('S20'), 20).tolist()
+
+    for index in numpy.flatnonzero(~fast).tolist():
+        reverse[index] = _reverse_timestamp(utc_times[index])
+
+    return reverse